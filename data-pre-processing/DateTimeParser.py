@@ -0,0 +1,126 @@
+import datetime as dt
+import pandas as pd
+import numpy as np
+
+class DateTimeParser:
+    """
+    Timestamp parsing shared by all the loaders.
+    The format of a source is detected once among the formats used in the project and
+    cached, so every later call parses with an explicit format instead of inferring it.
+    When the values of a source stop matching its cached format, e.g. after a firmware
+    change, the format is detected again.
+    """
+
+    KNOWN_FORMATS = ['%d/%m/%Y %H:%M:%S',
+                     '%Y-%m-%d %H:%M:%S',
+                     '%Y-%m-%dT%H:%M:%S',
+                     '%Y-%m-%dT%H:%M:%S.%f',
+                     '%Y-%m-%dT%H:%M:%S.%fZ',
+                     '%Y-%m-%dT%H:%M:%SZ',
+                     '%d/%m/%Y %H:%M',
+                     '%Y-%m-%d %H:%M',
+                     '%Y-%m-%d']
+    # Character positions of year, month, day, hour, minute and second in zero padded formats
+    FIXED_WIDTH_FIELDS = {'%d/%m/%Y %H:%M:%S': [(6, 10), (3, 5), (0, 2), (11, 13), (14, 16), (17, 19)],
+                          '%Y-%m-%d %H:%M:%S': [(0, 4), (5, 7), (8, 10), (11, 13), (14, 16), (17, 19)],
+                          '%Y-%m-%dT%H:%M:%S': [(0, 4), (5, 7), (8, 10), (11, 13), (14, 16), (17, 19)]}
+    DATE_TIME_COLUMNS = ['Year', 'Month', 'Day', 'Hour', 'Minute', 'Second']
+    FORMAT_CACHE = {}
+
+    def detect_format(values, sample_size=20):
+        """
+        Returns the first known format that parses a sample of the values, or None
+        """
+        sample = pd.Series(values).dropna().astype(str)
+        if sample.empty: return None
+        sample = pd.concat([sample.head(sample_size), sample.tail(sample_size)])
+        for date_format in DateTimeParser.KNOWN_FORMATS:
+            try:
+                for value in sample: dt.datetime.strptime(value, date_format)
+            except ValueError:
+                continue
+            return date_format
+        return None
+
+    def parse(values, source=None):
+        """
+        Parses timestamps written as text
+        Parameters
+        ----------
+        values : array like
+            The timestamps. Values that are already datetimes are returned unchanged.
+        source: String
+            The name of the source of the values, e.g. an endpoint or a file path.
+            The detected format is cached under this name.
+
+        Returns
+        -------
+        date_time : Pandas Series or DatetimeIndex
+            The parsed timestamps, with the same kind of container pandas returns for the values
+        """
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values
+        cached_format = DateTimeParser.FORMAT_CACHE.get(source) if source is not None else None
+        if cached_format is not None:
+            try:
+                return DateTimeParser.__parse_with_format__(values, cached_format)
+            except ValueError:
+                # The format of the source changed, so it is detected again below
+                DateTimeParser.FORMAT_CACHE.pop(source, None)
+        date_format = DateTimeParser.detect_format(values)
+        if source is not None and date_format is not None:
+            DateTimeParser.FORMAT_CACHE[source] = date_format
+        if date_format is None:
+            return pd.to_datetime(values)
+        return DateTimeParser.__parse_with_format__(values, date_format)
+
+    def __parse_with_format__(values, date_format):
+        if date_format in DateTimeParser.FIXED_WIDTH_FIELDS:
+            date_time = DateTimeParser.__parse_fixed_width__(values, date_format)
+            if date_time is not None:
+                if isinstance(values, pd.Series): return pd.Series(date_time, index=values.index, name=values.name)
+                return pd.DatetimeIndex(date_time)
+        date_time = pd.to_datetime(values, format=date_format)
+        if date_format.endswith('Z'):
+            # UTC designator, as pandas gives when it infers the format
+            date_time = date_time.dt.tz_localize('UTC') if isinstance(date_time, pd.Series) else date_time.tz_localize('UTC')
+        return date_time
+
+    def from_components(dataframe, columns=DATE_TIME_COLUMNS):
+        """
+        Assembles timestamps from integer Year, Month, Day, Hour, Minute and Second columns
+        with array arithmetic, without going through text. Rows with out of range
+        components are returned as NaT.
+        """
+        components = [dataframe[column].to_numpy(dtype=np.int64) for column in columns]
+        return pd.Series(DateTimeParser.__assemble__(*components), index=dataframe.index)
+
+    def __assemble__(year, month, day, hour, minute, second):
+        months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+        days_in_month = ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(np.int64)
+        seconds = hour * 3600 + minute * 60 + second
+        date_time = (months.astype('datetime64[D]') + (day - 1)).astype('datetime64[ns]') + seconds.astype('timedelta64[s]')
+        is_valid = ((month >= 1) & (month <= 12) & (day >= 1) & (day <= days_in_month) &
+                    (hour >= 0) & (hour <= 23) & (minute >= 0) & (minute <= 59) & (second >= 0) & (second <= 59))
+        date_time[~is_valid] = np.datetime64('NaT')
+        return date_time
+
+    def __parse_fixed_width__(values, date_format):
+        """
+        Reads the digits of zero padded timestamps straight from their bytes.
+        Returns None when any value does not have the exact layout of the format.
+        """
+        fields = DateTimeParser.FIXED_WIDTH_FIELDS[date_format]
+        width = fields[-1][1]
+        try:
+            text = np.asarray(values, dtype='S' + str(width + 1))
+        except (UnicodeEncodeError, ValueError):
+            return None
+        characters = text.view(np.uint8).reshape(-1, width + 1)
+        if not (characters[:, width] == 0).all(): return None
+        components = []
+        for start, end in fields:
+            digits = characters[:, start:end].astype(np.int64) - ord('0')
+            if ((digits < 0) | (digits > 9)).any(): return None
+            components.append(digits @ (10 ** np.arange(end - start - 1, -1, -1)))
+        return DateTimeParser.__assemble__(*components)
@@ -0,0 +1,266 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+class DriftDetector:
+    """
+    Change point and temperature drift detection over the valid samples of a sensor, run
+    after SensorData.tag_and_prepare_data.
+    The series is modeled as a constant baseline level per segment plus a linear effect of
+    the temperature shared by all the segments:
+
+        measuring = level[segment] + beta * (temperature - mean temperature) + noise
+
+    The change points are found by binary segmentation with the squared error cost, whose
+    best split of a segment is computed for every position at once from cumulative sums,
+    so the search is O(n log n). A split is kept when it reduces the cost by more than the
+    penalty, penalty * log(n) * scale ** 2, where scale is the typical spread of the samples
+    within a day. beta is the pooled within segment least squares slope, computed in O(n)
+    from per segment sums.
+    With a state path the change points and the median absolute deviation of each day are kept
+    between runs. A later run only computes the deviations of the new days and only searches
+    the samples after the second to last change point, so new data does not repeat the search
+    over the whole history. While fewer than two change points are known no segment is settled
+    and the whole series is searched. The change points found this way can differ from the
+    ones of a search over the whole series at once; deleting the state file starts the search over.
+    Each update is still O(n) in the valid samples: beta changes with every update, so the
+    slope and the segment levels are computed again over all the samples, and the returned
+    drift_dataframe covers the whole history.
+    """
+
+    DAY = pd.Timedelta('1D').value
+
+    def __init__(self, penalty=30, min_size=96, iterations=2, reference_segment=0, state_path=None) -> None:
+        """
+        Parameters
+        ----------
+        penalty : Double
+            The penalty of a change point, in units of log(n) * scale ** 2
+        min_size: int
+            The minimum number of valid samples of a segment, one day of 15 mins samples by default
+        iterations: int
+            The number of times the change points and beta are estimated on a first run, each
+            search being done on the series corrected with the previous beta
+        reference_segment: int
+            The segment whose level is kept by the corrected series, the first one by default
+            and the last one with -1
+        state_path: String
+            Optional JSON file where the change points and the per day deviations are kept between runs
+        """
+        self.__penalty = penalty
+        self.__min_size = min_size
+        self.__iterations = iterations
+        self.__reference_segment = reference_segment
+        self.__state_path = state_path
+        self.beta = 0.0
+        self.change_points = pd.DatetimeIndex([])
+
+    def update(self, sensor_dataframe, temperature=None):
+        """
+        Parameters
+        ----------
+        sensor_dataframe : Pandas Dataframe
+            The tagged dataframe of the sensor, with DatetimeIndex and the 'measuring' and 'Tag' columns
+        temperature: Pandas Series
+            Optional temperature on the same timeline, e.g. the 'measuring' of the chamber_temp
+            sensor_dataframe. Samples without temperature are corrected for the change points only.
+
+        Returns
+        -------
+        drift_dataframe : Pandas Dataframe
+            The valid samples with the 'measuring', 'temperature', 'Segment', 'baseline',
+            'measuring no Temp', 'measuring no changepoint' and 'measuring corrected' columns.
+            The corrected series keep the level of the reference segment.
+        segments : Pandas Dataframe
+            One row per segment with its 'start', 'end', 'count', 'mean', 'std', temperature
+            corrected 'level' and 'offset' from the level of the reference segment
+        """
+        valid_dataframe = sensor_dataframe[sensor_dataframe['Tag'] == 'VALID']
+        values = valid_dataframe['measuring'].to_numpy(dtype=np.float64)
+        is_present = ~np.isnan(values)
+        index, values = valid_dataframe.index[is_present], values[is_present]
+        temperatures = (np.full(len(values), np.nan) if temperature is None
+                        else temperature.reindex(index).to_numpy(dtype=np.float64))
+        if len(values) == 0:
+            raise ValueError('The sensor has no valid samples')
+
+        state = self.__load_state__()
+        day_deviations = self.__get_day_deviations__(values, index, state)
+        scale = DriftDetector.get_scale(values, index, day_deviations)
+        if state is None:
+            change_points = np.empty(0, dtype=np.int64)
+            for _ in range(max(self.__iterations, 1)):
+                corrected = values - self.__get_temperature_effect__(temperatures)
+                change_points = self.__search__(corrected, 0, scale)
+                self.beta = DriftDetector.get_temperature_slope(values, temperatures, change_points)
+        else:
+            self.beta = state['beta']
+            change_points = np.searchsorted(index.asi8, pd.DatetimeIndex(state['change_points']).asi8)
+            corrected = values - self.__get_temperature_effect__(temperatures)
+            # The last change point was found with the data of the previous run, so the search
+            # starts again from the one before it and the last one can move with the new data
+            settled = change_points[:-1]
+            search_start = int(settled[-1]) if len(settled) else 0
+            change_points = np.concatenate([settled, self.__search__(corrected, search_start, scale)])
+            self.beta = DriftDetector.get_temperature_slope(values, temperatures, change_points)
+
+        self.change_points = index[change_points]
+        drift_dataframe, segments = self.__correct__(index, values, temperatures, change_points)
+        self.__save_state__({'change_points': [timestamp.isoformat() for timestamp in self.change_points],
+                             'beta': float(self.beta),
+                             'day_deviations': {'days': day_deviations[0].tolist(), 'mads': day_deviations[1].tolist(),
+                                                'last_day': int(index.asi8[-1] // DriftDetector.DAY)},
+                             'segments': json.loads(segments.to_json(orient='records', date_format='iso'))})
+        return drift_dataframe, segments
+
+    def get_scale(values, index, day_deviations=None):
+        """
+        The median over the days of the robust standard deviation (1.4826 times the median
+        absolute deviation) of the samples of each day. day_deviations are the days and median
+        absolute deviations of get_day_deviations, when already known.
+        """
+        if len(values) == 0: return 1.0
+        _, mads = day_deviations if day_deviations is not None else DriftDetector.get_day_deviations(values, index)
+        scale = 1.4826 * np.median(mads) if len(mads) else 0.0
+        return float(scale) if scale > 0 else float(np.std(values)) or 1.0
+
+    def get_day_deviations(values, index):
+        """
+        Returns the days, as days since the epoch, and the median absolute deviation of the
+        samples of each day with more than one sample
+        """
+        days = index.asi8 // DriftDetector.DAY
+        order = np.lexsort((values, days))
+        days, sorted_values = days[order], values[order]
+        unique_days, starts, counts = np.unique(days, return_index=True, return_counts=True)
+        day_of_sample = np.repeat(np.arange(len(starts)), counts)
+        medians = (sorted_values[starts + (counts - 1) // 2] + sorted_values[starts + counts // 2]) / 2
+        deviations = np.abs(sorted_values - medians[day_of_sample])
+        order = np.lexsort((deviations, day_of_sample))
+        deviations = deviations[order]
+        mads = (deviations[starts + (counts - 1) // 2] + deviations[starts + counts // 2]) / 2
+        return unique_days[counts > 1], mads[counts > 1]
+
+    def get_temperature_slope(values, temperatures, change_points):
+        """
+        Least squares slope of the values on the temperature with a separate intercept per
+        segment, from the per segment sums of the samples with temperature
+        """
+        has_temperature = ~np.isnan(temperatures)
+        if has_temperature.sum() < 2: return 0.0
+        segment = np.searchsorted(change_points, np.arange(len(values)), side='right')[has_temperature]
+        x, y = temperatures[has_temperature], values[has_temperature]
+        segment_count = len(change_points) + 1
+        counts = np.bincount(segment, minlength=segment_count)
+        sum_x = np.bincount(segment, weights=x, minlength=segment_count)
+        sum_y = np.bincount(segment, weights=y, minlength=segment_count)
+        mean_x = np.divide(sum_x, counts, out=np.zeros(segment_count), where=counts > 0)
+        mean_y = np.divide(sum_y, counts, out=np.zeros(segment_count), where=counts > 0)
+        # Centered on the segment means, so the sums of the products are numerically stable
+        centered_x = x - mean_x[segment]
+        covariance = (centered_x * (y - mean_y[segment])).sum()
+        variance = (centered_x ** 2).sum()
+        return float(covariance / variance) if variance > 0 else 0.0
+
+    def __get_day_deviations__(self, values, index, state):
+        """
+        The per day deviations of get_day_deviations. With a state only the days from the last
+        day of the previous run on are computed, the previous days being read from the state.
+        """
+        if state is None or 'day_deviations' not in state:
+            return DriftDetector.get_day_deviations(values, index)
+        stored = state['day_deviations']
+        stored_days = np.array(stored['days'], dtype=np.int64)
+        stored_mads = np.array(stored['mads'], dtype=np.float64)
+        # The last day of the previous run can have had only part of its samples
+        is_settled = stored_days < stored['last_day']
+        first_new = np.searchsorted(index.asi8, stored['last_day'] * DriftDetector.DAY)
+        new_days, new_mads = DriftDetector.get_day_deviations(values[first_new:], index[first_new:])
+        return (np.concatenate([stored_days[is_settled], new_days]),
+                np.concatenate([stored_mads[is_settled], new_mads]))
+
+    def __search__(self, values, start, scale):
+        """
+        Binary segmentation of values[start:]. Returns the sorted change points, as the
+        positions of the first sample of each new segment.
+        """
+        # The penalty depends on the length of the whole series, also when only the last segment is searched
+        penalty = self.__penalty * np.log(max(len(values), 2)) * scale ** 2
+        # Centered, so the cumulative sums of the squares do not lose precision
+        centered = values[start:] - (values[start:].mean() if len(values) > start else 0.0)
+        sums = np.concatenate([[0.0], np.cumsum(centered)])
+        squares = np.concatenate([[0.0], np.cumsum(centered ** 2)])
+
+        def cost(first, last):
+            return squares[last] - squares[first] - (sums[last] - sums[first]) ** 2 / (last - first)
+
+        change_points = []
+        segments = [(0, len(centered))]
+        while segments:
+            first, last = segments.pop()
+            if last - first < 2 * self.__min_size: continue
+            splits = np.arange(first + self.__min_size, last - self.__min_size + 1)
+            left = squares[splits] - squares[first] - (sums[splits] - sums[first]) ** 2 / (splits - first)
+            right = squares[last] - squares[splits] - (sums[last] - sums[splits]) ** 2 / (last - splits)
+            gains = cost(first, last) - left - right
+            best = int(np.argmax(gains))
+            if gains[best] <= penalty: continue
+            change_points.append(int(splits[best]))
+            segments += [(first, int(splits[best])), (int(splits[best]), last)]
+        return np.array(sorted(change_points), dtype=np.int64) + start
+
+    def __get_temperature_effect__(self, temperatures):
+        """
+        beta times the deviation of the temperature from its mean, 0 for the samples without temperature
+        """
+        has_temperature = ~np.isnan(temperatures)
+        temperature_effect = np.zeros(len(temperatures))
+        if has_temperature.any():
+            temperature_effect[has_temperature] = self.beta * (temperatures[has_temperature] - temperatures[has_temperature].mean())
+        return temperature_effect
+
+    def __correct__(self, index, values, temperatures, change_points):
+        segment = np.searchsorted(change_points, np.arange(len(values)), side='right')
+        no_temperature = values - self.__get_temperature_effect__(temperatures)
+
+        segment_count = len(change_points) + 1
+        starts = np.concatenate([[0], change_points]).astype(np.int64)
+        ends = np.concatenate([change_points, [len(values)]]).astype(np.int64)
+        counts = ends - starts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.bincount(segment, weights=values, minlength=segment_count) / counts
+            levels = np.bincount(segment, weights=no_temperature, minlength=segment_count) / counts
+            variances = (np.bincount(segment, weights=(values - means[segment]) ** 2, minlength=segment_count)
+                         / (counts - 1))
+        offsets = levels - levels[self.__reference_segment]
+
+        drift_dataframe = pd.DataFrame({'measuring': values,
+                                        'temperature': temperatures,
+                                        'Segment': segment,
+                                        'baseline': levels[segment] + values - no_temperature,
+                                        'measuring no Temp': np.where(np.isnan(temperatures), np.nan, no_temperature),
+                                        'measuring no changepoint': values - offsets[segment],
+                                        'measuring corrected': no_temperature - offsets[segment]}, index=index)
+        segments = pd.DataFrame({'start': index[starts],
+                                 'end': index[ends - 1],
+                                 'count': counts,
+                                 'mean': means,
+                                 'std': np.sqrt(variances),
+                                 'level': levels,
+                                 'offset': offsets},
+                                index=pd.RangeIndex(segment_count, name='Segment'))
+        return drift_dataframe, segments
+
+    def __load_state__(self):
+        if self.__state_path is None or not os.path.exists(self.__state_path): return None
+        with open(self.__state_path) as state_file:
+            return json.load(state_file)
+
+    def __save_state__(self, state):
+        if self.__state_path is None: return
+        state_dir = os.path.dirname(self.__state_path)
+        if state_dir and not os.path.exists(state_dir):
+            os.makedirs(state_dir)
+        with open(self.__state_path, 'w') as state_file:
+            json.dump(state, state_file)
@@ -1,25 +1,100 @@
 import requests
 import pandas as pd
+import numpy as np
 import datetime as dt
 import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from DateTimeParser import DateTimeParser
+from PipelineProfiler import PipelineProfiler
+from RawLogLoader import RawLogLoader
 
 class GetSensorDataService:
-    def __init__(self, host, port) -> None:
+    def __init__(self, host, port, timeout=30, retries=3, backoff_factor=0.5, pool_size=10, profiler=None) -> None:
+        """
+        profiler is an optional PipelineProfiler that records every request and the parsing of the responses
+        """
         self.__host = 'http://' + host + ':' + str(port)
+        self.__timeout = timeout
+        self.__session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=backoff_factor,
+                      status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET'])
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.__session.mount('http://', adapter)
+        self.__session.mount('https://', adapter)
+        self.request_timings = []
+        self.__profiler = profiler
 
-    def get_data_from_file(self, filename, sensor_name):
-        df = pd.read_csv(filename)
-        date_time_col = ['Year','Month','Day','Hour','Minute','Second']
-        df['DateTime'] = (pd.to_datetime(df[date_time_col], infer_datetime_format=False, format='%d/%m/%Y/%H/%M/%S'))
-        df = df.drop(columns=date_time_col)
-        df = df.drop(columns=['Altitude', 'Device', 'DeviceSt', ' SensorID'])
-        df = df.rename(columns={'Value': 'measuring', 'Latitude': 'latitude', 'Longitude': 'longitude'})
-        df = (df.where(df['DateTime'] > dt.datetime(2020, 1, 1, 0, 0, 0))
-                .where(df['DateTime'] <= dt.datetime.now()).dropna())
-        path = "data/input/"
-        df.to_csv(path + sensor_name + 'web_dataframe.csv') 
+    def get_data_from_file(self, filename, sensor_name, storage=None):
+        """
+        Loads a raw log file and saves it as the web dataframe of the sensor, in storage when given
+        or else in data/input/<sensor_name>web_dataframe.csv. When the raw file was served by the
+        RawLogLoader cache and the CSV is newer than the raw file, the CSV already holds these
+        samples and is not written again.
+        """
+        loader = RawLogLoader()
+        with PipelineProfiler.profile(self.__profiler, 'load_raw_file') as stage:
+            df = loader.load(filename, start_date=dt.datetime(2020, 1, 1, 0, 0, 0), end_date=dt.datetime.now(),
+                             value_dtype=np.float64)
+            df = df.rename(columns={'Value': 'measuring', 'Latitude': 'latitude', 'Longitude': 'longitude'})
+            stage['rows'] = len(df)
+        with PipelineProfiler.profile(self.__profiler, 'save_web_dataframe', rows=len(df)):
+            if storage is not None:
+                storage.save(df.set_index('DateTime'), 'web_dataframe', sensor_name)
+            else:
+                path = "data/input/" + sensor_name + 'web_dataframe.csv'
+                is_saved = (loader.cache_hit and os.path.exists(path)
+                            and os.path.getmtime(path) >= os.path.getmtime(filename))
+                if not is_saved:
+                    df.to_csv(path)
         return df
     
+    def get_samples_by_sensors(self, sensor_ranges, max_workers=4):
+        """
+        Fetches several sensors concurrently over the pooled session
+        Parameters
+        ----------
+        sensor_ranges : list
+            A list of (sensor_id, start_date, end_date) tuples. The dates have the format YYYY-MM-DD;
+            when they are None all data points of the sensor are fetched.
+        max_workers: int
+            The maximum number of requests running at the same time.
+
+        Returns
+        -------
+        dataframes : dict
+            One dataframe per sensor id, as returned by get_samples_by_sensor_in_range
+        """
+        def fetch(sensor_range):
+            sensor_id, start_date, end_date = sensor_range
+            if start_date is None or end_date is None:
+                return self.get_samples_by_sensor(sensor_id)
+            return self.get_samples_by_sensor_in_range(sensor_id, start_date, end_date)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            dataframes = list(executor.map(fetch, sensor_ranges))
+        return {sensor_range[0]: dataframe for sensor_range, dataframe in zip(sensor_ranges, dataframes)}
+
+    def __get__(self, request):
+        """
+        GET over the pooled session, with timeout and retries. The time taken by each request
+        is appended to request_timings.
+        """
+        start = time.perf_counter()
+        response = self.__session.get(request, timeout=self.__timeout)
+        seconds = time.perf_counter() - start
+        self.request_timings.append({'request': request,
+                                     'status': response.status_code,
+                                     'seconds': seconds,
+                                     'bytes': len(response.content)})
+        if self.__profiler is not None:
+            self.__profiler.record_request(request, response.status_code, seconds, len(response.content))
+        response.raise_for_status()
+        return response
+
     def get_samples_by_sensor(self, sensor_id):
         """
         Returns all data points in a sensor
@@ -39,12 +114,14 @@ class GetSensorDataService:
 
         ENDPOINT = "/sample/sensor/all/"
         REQUEST = self.__host + ENDPOINT
-        response_json = requests.get(REQUEST + str(sensor_id))
-        response_dict = json.loads(response_json.content)
-        response_dataframe = pd.DataFrame.from_dict(response_dict)
-        return self.__prepare_date_time_dataframe__(response_dataframe[["date","measuring"]])
+        response_json = self.__get__(REQUEST + str(sensor_id))
+        with PipelineProfiler.profile(self.__profiler, 'parse_response') as stage:
+            response_dict = json.loads(response_json.content)
+            response_dataframe = pd.DataFrame.from_dict(response_dict)
+            stage['rows'] = len(response_dataframe)
+            return self.__prepare_date_time_dataframe__(response_dataframe[["date","measuring"]])
 
-    def get_samples_by_sensor_in_range(self, sensor_id, start_date, end_date):
+    def get_samples_by_sensor_in_range(self, sensor_id, start_date, end_date, page_days=31, coordinates=False):
         """
         Returns all data points in a sensor within a date range
         Parameters
@@ -55,6 +132,12 @@ class GetSensorDataService:
             The start date with the format YYYY-MM-DD
         end_date: String
             The end date with the format YYYY-MM-DD
+        page_days: int
+            Long ranges are requested in pages of this many days. Each page is parsed into
+            numpy arrays as soon as it arrives, so the peak memory is bounded by the page size.
+        coordinates: Boolean
+            Also returns the 'latitude' and 'longitude' of the samples, NaN when the API
+            does not send them
 
         Returns
         -------
@@ -62,18 +145,46 @@ class GetSensorDataService:
             A pandas dataframe with Datetime indexes containing all the data points of the sensor.
             
             index='date'- Datetime indexes
-            columns='measuring'
+            columns='measuring', plus 'latitude' and 'longitude' with coordinates=True
         """
 
+        columns = ['measuring', 'latitude', 'longitude'] if coordinates else ['measuring']
+        page_starts = pd.date_range(start_date, end_date, freq=str(page_days) + 'D')
+        date_buffers = []
+        value_buffers = []
+        for page_start in page_starts:
+            page_end = page_start + pd.Timedelta(days=page_days)
+            if page_end >= pd.Timestamp(end_date):
+                dates, values = self.__get_range_page__(sensor_id, page_start.strftime('%Y-%m-%d'), end_date, columns)
+            else:
+                dates, values = self.__get_range_page__(sensor_id, page_start.strftime('%Y-%m-%d'),
+                                                        page_end.strftime('%Y-%m-%d'), columns)
+                # Samples on the page end date are requested again by the next page
+                in_page = dates < page_end.to_datetime64()
+                dates, values = dates[in_page], values[in_page]
+            date_buffers.append(dates)
+            value_buffers.append(values)
+
+        values = np.concatenate(value_buffers or [np.empty((0, len(columns)))])
+        measuring_dataframe = pd.DataFrame(dict(zip(columns, values.T)))
+        measuring_dataframe['date'] = np.concatenate(date_buffers or [np.empty(0, dtype='datetime64[ns]')])
+        return self.__prepare_date_time_dataframe__(measuring_dataframe)
+
+    def __get_range_page__(self, sensor_id, start_date, end_date, columns=('measuring',)):
+        """
+        Requests one page of the range endpoint and returns its dates and a (sample, column)
+        array of the columns as numpy arrays. Missing columns are NaN.
+        """
         ENDPOINT = "/sample/sensor/range/?sensorID=" + str(sensor_id) + "&startDate=" + start_date + "&endDate=" + end_date
         REQUEST = self.__host + ENDPOINT 
-        response_json = requests.get(REQUEST)
-        response_dict = json.loads(response_json.content)
-        content = response_dict['content']
-        measuring_list = [item['measuring'] for item in content]
-        date_list = [item['date'] for item in content]
-        measuring_dataframe = pd.DataFrame({'measuring': measuring_list, 'date': date_list})
-        return self.__prepare_date_time_dataframe__(measuring_dataframe)
+        response_json = self.__get__(REQUEST)
+        with PipelineProfiler.profile(self.__profiler, 'parse_response') as stage:
+            content = json.loads(response_json.content)['content']
+            stage['rows'] = len(content)
+            values = np.column_stack([np.array([item.get(column) for item in content], dtype=np.float64) for column in columns])
+            dates = DateTimeParser.parse([item['date'] for item in content], source=self.__host + '/sample/sensor/range/')
+            dates = dates.to_numpy(dtype='datetime64[ns]')
+            return dates, values
     
     def __prepare_date_time_dataframe__(self, dataframe):
         """
@@ -81,7 +192,7 @@ class GetSensorDataService:
         Returns dataframe with DateTime indexes and resampled to a period of 15 mins
         """
         measuring_dataframe = dataframe
-        measuring_dataframe['date'] = (pd.to_datetime(measuring_dataframe['date'], infer_datetime_format=True))
+        measuring_dataframe['date'] = DateTimeParser.parse(measuring_dataframe['date'], source=self.__host + '/sample/sensor/all/')
 
         # Resample data with 15 mins period and create sensor dataframe
         measuring_dataframe = measuring_dataframe.sort_values(by='date', ascending=True).reset_index().drop(columns='index')
@@ -108,7 +219,7 @@ class GetSensorDataService:
 
         ENDPOINT = "/sample/sensor/last/" + str(sensor_id)
         REQUEST = self.__host + ENDPOINT 
-        response_json = requests.get(REQUEST)
+        response_json = self.__get__(REQUEST)
         response_dict = json.loads(response_json.content)
         measuring = response_dict['measuring']
         date = response_dict['date']
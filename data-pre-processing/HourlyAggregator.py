@@ -0,0 +1,84 @@
+import pandas as pd
+import numpy as np
+from TaggingEngine import TaggingEngine
+
+class HourlyAggregator:
+    """
+    Hourly statistics computed in a single grouped pass.
+    Every sample is assigned to its hour bucket by integer division of its timestamp and the
+    count and sum of all the columns are reduced at once with np.bincount. The Std of
+    'measuring' takes a second np.bincount over the squared deviations from the mean of
+    each hour, so hours with a constant value get a Std of exactly 0.
+    """
+
+    HOUR = pd.Timedelta('1 hour')
+
+    def get_hour_statistics(valid_dataframe, original_freq, min_valid_percentage=75):
+        """
+        Parameters
+        ----------
+        valid_dataframe : Pandas Dataframe
+            The valid samples, with DatetimeIndex and a 'measuring' column.
+        original_freq: DateOffset
+            The sampling period of the samples, used for the percentage of valid samples per hour.
+        min_valid_percentage: Double
+            Hours with a lower percentage of valid samples are tagged as 'LOWSAMPLES'
+
+        Returns
+        -------
+        resampled_dataframe : Pandas Dataframe
+            The mean of every column per hour plus the 'Hour', 'Count', 'Std', '% valid' and 'Tag'
+            columns. The indexes are at the middle of each hour (HH:30).
+        """
+        columns = list(valid_dataframe.columns)
+        if len(valid_dataframe) == 0:
+            return pd.DataFrame(columns=columns + ['Hour', 'Count', 'Std', '% valid', 'Tag'],
+                                index=pd.DatetimeIndex([], name=valid_dataframe.index.name))
+
+        # Hour bucket of every sample, counted from the first hour
+        timestamps = valid_dataframe.index.asi8
+        hour_ns = HourlyAggregator.HOUR.value
+        first_hour = timestamps.min() // hour_ns
+        buckets = timestamps // hour_ns - first_hour
+        bucket_count = int(buckets.max()) + 1
+
+        values = valid_dataframe.to_numpy(dtype=np.float64)
+        is_present = ~np.isnan(values)
+        # Centering on the column means keeps the sum of squares numerically stable
+        present_counts = is_present.sum(axis=0)
+        centers = np.where(present_counts > 0, np.where(is_present, values, 0.0).sum(axis=0) / np.maximum(present_counts, 1), 0.0)
+        centered = np.where(is_present, values - centers, 0.0)
+
+        # One reduction over all columns at once: bucket * n_columns + column
+        flat_buckets = (buckets[:, None] * len(columns) + np.arange(len(columns))).ravel()
+        length = bucket_count * len(columns)
+        counts = np.bincount(flat_buckets, weights=is_present.ravel(), minlength=length).reshape(bucket_count, -1)
+        sums = np.bincount(flat_buckets, weights=centered.ravel(), minlength=length).reshape(bucket_count, -1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts > 0, sums / counts + centers, np.nan)
+
+        # Second pass over the deviations of 'measuring' from the mean of its hour. The samples
+        # are shifted by a sample of their hour first, so a constant hour has no deviation at all
+        measuring = columns.index('measuring')
+        is_measured = is_present[:, measuring]
+        measured_buckets = buckets[is_measured]
+        shifts = np.zeros(bucket_count)
+        shifts[measured_buckets] = values[is_measured, measuring]
+        shifted = values[is_measured, measuring] - shifts[measured_buckets]
+        measured_counts = counts[:, measuring]
+        shifted_means = np.bincount(measured_buckets, weights=shifted, minlength=bucket_count) / np.maximum(measured_counts, 1)
+        squares = np.bincount(measured_buckets, weights=(shifted - shifted_means[measured_buckets]) ** 2, minlength=bucket_count)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variances = np.where(measured_counts > 1, squares / (measured_counts - 1), np.nan)
+
+        hours = pd.DatetimeIndex(first_hour * hour_ns + np.arange(bucket_count) * hour_ns, name=valid_dataframe.index.name)
+        resampled_dataframe = pd.DataFrame(means, index=hours, columns=columns)
+        resampled_dataframe['Hour'] = hours.hour
+        resampled_dataframe['Count'] = counts[:, measuring].astype(np.int64)
+        resampled_dataframe['Std'] = np.sqrt(variances)
+        resampled_dataframe['% valid'] = resampled_dataframe['Count'] / (HourlyAggregator.HOUR / original_freq) * 100
+        tag_codes = np.where(resampled_dataframe['% valid'] >= min_valid_percentage,
+                             TaggingEngine.get_tag_code('VALID'), TaggingEngine.get_tag_code('LOWSAMPLES'))
+        resampled_dataframe['Tag'] = TaggingEngine.to_categorical(tag_codes, index=hours)
+        resampled_dataframe.index = pd.DatetimeIndex(hours + pd.Timedelta(minutes=30), name=hours.name, freq=None)
+        return resampled_dataframe
@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree, KDTree
+from HourlyAggregator import HourlyAggregator
+
+class HourlyImputer:
+    """
+    KNN gap filling of the hourly statistics (sensor_dataframe_1hr) of the sensors of a station.
+    The hours of a sensor tagged as 'MISSING' or 'LOWSAMPLES' are filled with the mean of
+    the k valid hours of the same sensor that are nearest in the feature space of:
+      - the valid hourly means of the co-located sensors, temperature included, standardized
+      - the hour of the day, as a point on the unit circle
+      - the time, so that among similar hours the closest days are preferred
+    A gap hour only uses the co-located sensors that are valid at that hour. The gap hours
+    are grouped by the set of sensors they have, and each group is answered with one
+    batched query of a KD-tree (or ball tree) built over the valid hours with the same
+    sensors; the rare sets of sensors with a few gap hours are compared with all the valid
+    hours instead. The features are standardized over the whole station and the time is
+    counted from its first hour, so new hours change every feature and a tree is built for
+    each call rather than kept between runs.
+    """
+
+    IMPUTED_TAGS = ['MISSING', 'LOWSAMPLES']
+    TREES = {'kd_tree': KDTree, 'ball_tree': BallTree}
+
+    def __init__(self, n_neighbors=5, algorithm='kd_tree', leaf_size=40, weights='uniform', hour_weight=1.0,
+                 time_scale_days=30, min_donors=None, tree_min_queries=64) -> None:
+        """
+        Parameters
+        ----------
+        n_neighbors : int
+            The number of valid hours averaged for each gap hour
+        algorithm: String
+            'kd_tree' or 'ball_tree'
+        weights: String
+            'uniform' averages the neighbors equally, 'distance' by the inverse of their distance
+        hour_weight: Double
+            The scale of the hour of the day features, relative to one standard deviation of a sensor
+        time_scale_days: Double
+            The number of days that counts as much as one standard deviation of a sensor
+        min_donors: int
+            Groups of gap hours with fewer valid hours to learn from are not filled.
+            Defaults to n_neighbors.
+        tree_min_queries: int
+            Groups with fewer gap hours are answered by a brute force search, as building
+            a tree costs more than comparing a few hours with all the valid ones
+        """
+        if algorithm not in HourlyImputer.TREES:
+            raise ValueError('Unknown algorithm ' + algorithm)
+        if weights not in ['uniform', 'distance']:
+            raise ValueError('Unknown weights ' + weights)
+        self.__n_neighbors = n_neighbors
+        self.__algorithm = algorithm
+        self.__leaf_size = leaf_size
+        self.__weights = weights
+        self.__hour_weight = hour_weight
+        self.__time_scale_hours = time_scale_days * 24
+        self.__min_donors = n_neighbors if min_donors is None else min_donors
+        self.__tree_min_queries = tree_min_queries
+
+    def impute(self, hourly_dataframes, targets=None, columns=['measuring', 'value']):
+        """
+        Parameters
+        ----------
+        hourly_dataframes : dict
+            The sensor_dataframe_1hr of every sensor of the station, by sensor name. All the
+            sensors are features of the others.
+        targets: list
+            The sensors to fill. All of them if None.
+        columns: list
+            The columns filled for the gap hours, with the same neighbors. Columns missing
+            from a dataframe are ignored.
+
+        Returns
+        -------
+        imputed_dataframes : dict
+            A copy of the sensor_dataframe_1hr of each target with the columns filled for the
+            gap hours that had enough valid hours to learn from, and an 'Imputed' column
+            marking them. The 'Tag' of the filled hours is kept.
+        """
+        names = list(hourly_dataframes)
+        targets = names if targets is None else list(targets)
+        first_hour, sensor_features, time_features = self.__get_features__(hourly_dataframes, names)
+        is_available = ~np.isnan(sensor_features)
+        imputed_dataframes = {}
+        for target in targets:
+            position = names.index(target)
+            dataframe = hourly_dataframes[target].copy()
+            rows = HourlyImputer.__get_rows__(dataframe, first_hour)
+            target_columns = [column for column in columns if column in dataframe.columns]
+            donor_values = np.full((len(sensor_features), len(target_columns)), np.nan)
+            is_valid = (dataframe['Tag'] == 'VALID').to_numpy()
+            donor_values[rows[is_valid]] = dataframe[target_columns].to_numpy(dtype=np.float64)[is_valid]
+            is_donor = ~np.isnan(donor_values[:, 0]) if target_columns else np.zeros(len(sensor_features), dtype=bool)
+
+            is_gap = dataframe['Tag'].isin(HourlyImputer.IMPUTED_TAGS).to_numpy()
+            others = np.delete(np.arange(len(names)), position)
+            filled = self.__fill__(rows[is_gap], is_donor, donor_values, sensor_features[:, others],
+                                   is_available[:, others], time_features)
+            is_filled = np.zeros(len(dataframe), dtype=bool)
+            is_filled[is_gap] = ~np.isnan(filled[:, 0]) if target_columns else False
+            for column_position, column in enumerate(target_columns):
+                values = dataframe[column].to_numpy(copy=True)
+                values[is_filled] = filled[~np.isnan(filled[:, 0]), column_position]
+                dataframe[column] = values
+            dataframe['Imputed'] = is_filled
+            imputed_dataframes[target] = dataframe
+        return imputed_dataframes
+
+    def __fill__(self, gap_rows, is_donor, donor_values, sensor_features, is_available, time_features):
+        """
+        Returns the (gap hour, column) imputed values, NaN for the gap hours that were not filled
+        """
+        filled = np.full((len(gap_rows), donor_values.shape[1]), np.nan)
+        if len(gap_rows) == 0 or donor_values.shape[1] == 0:
+            return filled
+        # The set of available sensors of every hour as the bits of an integer
+        sensor_count = is_available.shape[1]
+        patterns = is_available.astype(np.int64) @ (np.int64(1) << np.arange(sensor_count, dtype=np.int64))
+        gap_patterns = patterns[gap_rows]
+        all_donor_rows = np.flatnonzero(is_donor)
+        donor_patterns = patterns[all_donor_rows]
+        features = np.hstack([sensor_features, time_features])
+        time_columns = np.arange(sensor_count, features.shape[1])
+        for pattern in np.unique(gap_patterns):
+            # The donors valid for a set of sensors are the ones having at least these sensors
+            donor_rows = all_donor_rows[(donor_patterns & pattern) == pattern]
+            if len(donor_rows) < max(self.__min_donors, 1): continue
+            is_query = gap_patterns == pattern
+            query_rows = gap_rows[is_query]
+
+            columns = np.concatenate([np.flatnonzero((pattern >> np.arange(sensor_count, dtype=np.int64)) & 1), time_columns])
+            donor_features = features[np.ix_(donor_rows, columns)]
+            query_features = features[np.ix_(query_rows, columns)]
+            k = min(self.__n_neighbors, len(donor_rows))
+            if len(query_rows) >= self.__tree_min_queries:
+                tree = HourlyImputer.TREES[self.__algorithm](donor_features, leaf_size=self.__leaf_size)
+                distances, neighbors = tree.query(query_features, k=k)
+            else:
+                distances, neighbors = HourlyImputer.query_brute_force(donor_features, query_features, k)
+            neighbor_values = donor_values[donor_rows[neighbors]]
+            if self.__weights == 'distance':
+                # Exact matches take all the weight, as in sklearn
+                with np.errstate(divide='ignore'):
+                    weights = 1 / distances
+                is_exact = np.isinf(weights)
+                weights = np.where(is_exact.any(axis=1, keepdims=True), is_exact, weights)
+            else:
+                weights = np.ones(distances.shape)
+            filled[is_query] = (neighbor_values * weights[:, :, None]).sum(axis=1) / weights.sum(axis=1, keepdims=True)
+        return filled
+
+    def query_brute_force(donor_features, query_features, k, chunk_size=2 ** 22):
+        """
+        Returns the distances and positions of the k nearest donors of each query, sorted by
+        distance as in a tree query. The distances are computed in chunks of queries of at
+        most chunk_size elements.
+        """
+        donor_norms = (donor_features ** 2).sum(axis=1)
+        distances = np.empty((len(query_features), k))
+        neighbors = np.empty((len(query_features), k), dtype=np.int64)
+        step = max(chunk_size // max(len(donor_features), 1), 1)
+        for start in range(0, len(query_features), step):
+            queries = query_features[start:start + step]
+            squared = np.maximum((queries ** 2).sum(axis=1)[:, None] - 2 * queries @ donor_features.T + donor_norms, 0.0)
+            nearest = np.argpartition(squared, k - 1, axis=1)[:, :k] if k < len(donor_features) else \
+                np.tile(np.arange(len(donor_features)), (len(queries), 1))
+            nearest_squared = np.take_along_axis(squared, nearest, axis=1)
+            order = np.argsort(nearest_squared, axis=1, kind='stable')
+            neighbors[start:start + step] = np.take_along_axis(nearest, order, axis=1)
+            distances[start:start + step] = np.sqrt(np.take_along_axis(nearest_squared, order, axis=1))
+        return distances, neighbors
+
+    def __get_features__(self, hourly_dataframes, names):
+        """
+        Returns the first hour of the station grid, the (hour, sensor) standardized valid means
+        and the (hour, 3) hour of the day and time features, on a dense grid of hours from
+        the first to the last hour of any sensor
+        """
+        hour_ns = HourlyAggregator.HOUR.value
+        hours = [dataframe.index.asi8 // hour_ns for dataframe in hourly_dataframes.values() if len(dataframe) > 0]
+        if not hours:
+            return 0, np.empty((0, len(names))), np.empty((0, 3))
+        first_hour = min(sensor_hours.min() for sensor_hours in hours)
+        hour_count = int(max(sensor_hours.max() for sensor_hours in hours) - first_hour) + 1
+
+        sensor_features = np.full((hour_count, len(names)), np.nan)
+        for position, name in enumerate(names):
+            dataframe = hourly_dataframes[name]
+            is_valid = (dataframe['Tag'] == 'VALID').to_numpy()
+            rows = HourlyImputer.__get_rows__(dataframe, first_hour)
+            sensor_features[rows[is_valid], position] = dataframe['measuring'].to_numpy(dtype=np.float64)[is_valid]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.nanmean(np.where(np.isnan(sensor_features).all(axis=0), 0.0, sensor_features), axis=0)
+            stds = np.nanstd(np.where(np.isnan(sensor_features).all(axis=0), 0.0, sensor_features), axis=0)
+        sensor_features = (sensor_features - means) / np.where(stds > 0, stds, 1.0)
+
+        grid_hours = first_hour + np.arange(hour_count)
+        angle = 2 * np.pi * (grid_hours % 24) / 24
+        time_features = np.column_stack([self.__hour_weight * np.sin(angle), self.__hour_weight * np.cos(angle),
+                                         np.arange(hour_count) / self.__time_scale_hours])
+        return first_hour, sensor_features, time_features
+
+    def __get_rows__(dataframe, first_hour):
+        return dataframe.index.asi8 // HourlyAggregator.HOUR.value - first_hour
@@ -0,0 +1,312 @@
+import asyncio
+import collections
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from DateTimeParser import DateTimeParser
+from HourlyAggregator import HourlyAggregator
+from TaggingEngine import TaggingEngine
+
+class RingBuffer:
+    """
+    Fixed size columnar buffer keeping the last capacity rows. Appending a row is O(1) and
+    the oldest row is overwritten once the buffer is full.
+    """
+
+    def __init__(self, capacity, dtypes) -> None:
+        """
+        dtypes is a dict of {column: numpy dtype}. The 'DateTime' column, int64 nanoseconds,
+        is always present.
+        """
+        self.capacity = capacity
+        self.__columns = {'DateTime': np.zeros(capacity, dtype=np.int64)}
+        self.__columns.update({column: np.zeros(capacity, dtype=dtype) for column, dtype in dtypes.items()})
+        self.__next = 0
+        self.__length = 0
+
+    def __len__(self):
+        return self.__length
+
+    def append(self, row):
+        for column, values in self.__columns.items():
+            values[self.__next] = row[column]
+        self.__next = (self.__next + 1) % self.capacity
+        self.__length = min(self.__length + 1, self.capacity)
+
+    def to_dataframe(self):
+        """
+        Returns the rows in time order, indexed by 'DateTime'. An int8 'Tag' column is
+        returned as the categorical tag column.
+        """
+        order = (np.arange(self.__length) + self.__next - self.__length) % self.capacity
+        data = {column: values[order] for column, values in self.__columns.items() if column != 'DateTime'}
+        index = pd.DatetimeIndex(self.__columns['DateTime'][order], name='DateTime')
+        if 'Tag' in data: data['Tag'] = TaggingEngine.to_categorical(data['Tag'], index=index)
+        return pd.DataFrame(data, index=index)
+
+
+class LiveSensorState:
+    """
+    The QC state of one monitored sensor. Each new sample is handled in O(1): the limit rule
+    and the derivative against the previous sample tag it as soon as it arrives, and it is
+    added to the running sum of its 15 mins bucket. When a sample of a later bucket arrives
+    the bucket is closed with the same rules as SensorData.tag_and_prepare_data and its
+    valid mean is added to the running statistics of its hour, which are closed in turn as
+    HourlyAggregator.get_hour_statistics does.
+    """
+
+    BUCKET_DTYPES = {'measuring': np.float64, 'Count': np.int32, 'Tag': np.int8}
+    HOUR_DTYPES = {'measuring': np.float64, 'Count': np.int32, 'Std': np.float64, '% valid': np.float64, 'Tag': np.int8}
+
+    def __init__(self, sensor, sampling_period, min_valid_percentage=75, bucket_capacity=4 * 24 * 7,
+                 hour_capacity=24 * 30) -> None:
+        """
+        Parameters
+        ----------
+        sensor : dict
+            A sensor of SensorRegistry.SENSORS, or any dict with the 'sensor_id', 'sensor_name',
+            'lower_limit', 'upper_limit', 't_90' and 't_90_value' keys
+        sampling_period: int
+            The period of the buckets in seconds, 15 mins for the monitoring stations
+        bucket_capacity, hour_capacity: int
+            The number of closed buckets and hours kept in the ring buffers
+        """
+        self.sensor_id = sensor['sensor_id']
+        self.sensor_name = sensor['sensor_name']
+        self.lower_limit = sensor['lower_limit']
+        self.upper_limit = sensor['upper_limit']
+        # The same maximum derivative as SensorData, whose t_90 is half of the registered one
+        self.max_rate = sensor['t_90_value'] / (sensor['t_90'] / 2)
+        self.max_diff_value = sampling_period * self.max_rate
+        self.bucket_ns = pd.Timedelta(seconds=sampling_period).value
+        self.buckets_per_hour = HourlyAggregator.HOUR.value // self.bucket_ns
+        self.min_valid_percentage = min_valid_percentage
+        self.buckets = RingBuffer(bucket_capacity, LiveSensorState.BUCKET_DTYPES)
+        self.hours = RingBuffer(hour_capacity, LiveSensorState.HOUR_DTYPES)
+
+        self.last_timestamp = None
+        self.last_value = np.nan
+        self.last_received = None
+        self.is_stale = False
+        # Running sum of the open bucket and mean of the last closed one, for its derivative
+        self.bucket = None
+        self.bucket_count = 0
+        self.bucket_sum = 0.0
+        self.previous_bucket_value = np.nan
+        # Running mean and sum of squared deviations (Welford) of the valid buckets of the open hour
+        self.hour = None
+        self.hour_count = 0
+        self.hour_mean = 0.0
+        self.hour_m2 = 0.0
+
+    def add_sample(self, timestamp, measuring):
+        """
+        Parameters
+        ----------
+        timestamp : int
+            The time of the sample in nanoseconds
+        measuring: Double
+            The value of the sample
+
+        Returns
+        -------
+        records : list
+            The tagged records produced by the sample: the sample itself ('period' 'sample')
+            followed by the buckets ('15min') and hours ('1hr') it closed. Samples not newer
+            than the last one, as the same last sample polled twice, produce no records.
+        """
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return []
+        measuring = np.nan if measuring is None else float(measuring)
+        elapsed = np.nan if self.last_timestamp is None else (timestamp - self.last_timestamp) / 1e9
+        values = np.array([measuring])
+        codes = TaggingEngine.get_tags_from_values(values, self.lower_limit, self.upper_limit)
+        codes = TaggingEngine.tag_data_with_diff(codes, values - self.last_value, elapsed * self.max_rate)
+        records = [self.__get_record__('sample', timestamp, measuring, codes[0])]
+        self.last_timestamp = timestamp
+        self.last_value = np.nan if codes[0] == TaggingEngine.get_tag_code('MISSING') else measuring
+
+        bucket = timestamp // self.bucket_ns * self.bucket_ns
+        if self.bucket is None:
+            self.bucket = bucket
+            self.hour = bucket // HourlyAggregator.HOUR.value * HourlyAggregator.HOUR.value
+        # Every bucket up to the one of the sample is closed in order, the skipped ones as 'MISSING'
+        while self.bucket < bucket:
+            records += self.__close_bucket__()
+        # As in the resampling of the batch pipeline, every non null sample is part of the bucket mean
+        if not np.isnan(measuring):
+            self.bucket_count += 1
+            self.bucket_sum += measuring
+        return records
+
+    def __close_bucket__(self):
+        mean = self.bucket_sum / self.bucket_count if self.bucket_count else np.nan
+        values = np.array([mean])
+        codes = TaggingEngine.get_tags_from_values(values, self.lower_limit, self.upper_limit)
+        codes = TaggingEngine.tag_data_with_diff(codes, values - self.previous_bucket_value, self.max_diff_value)
+        self.buckets.append({'DateTime': self.bucket, 'measuring': mean, 'Count': self.bucket_count, 'Tag': codes[0]})
+        records = [self.__get_record__('15min', self.bucket, mean, codes[0], Count=self.bucket_count)]
+        if codes[0] == TaggingEngine.get_tag_code('VALID'):
+            self.hour_count += 1
+            delta = mean - self.hour_mean
+            self.hour_mean += delta / self.hour_count
+            self.hour_m2 += delta * (mean - self.hour_mean)
+
+        self.previous_bucket_value = mean
+        self.bucket += self.bucket_ns
+        self.bucket_count, self.bucket_sum = 0, 0.0
+        if self.bucket % HourlyAggregator.HOUR.value == 0:
+            records.append(self.__close_hour__())
+        return records
+
+    def __close_hour__(self):
+        count = self.hour_count
+        mean = self.hour_mean if count else np.nan
+        std = np.sqrt(max(self.hour_m2 / (count - 1), 0.0)) if count > 1 else np.nan
+        valid_percentage = count / self.buckets_per_hour * 100
+        tag = 'VALID' if valid_percentage >= self.min_valid_percentage else 'LOWSAMPLES'
+        # Indexed at the middle of the hour, as the hourly statistics
+        timestamp = self.hour + HourlyAggregator.HOUR.value // 2
+        self.hours.append({'DateTime': timestamp, 'measuring': mean, 'Count': count, 'Std': std,
+                           '% valid': valid_percentage, 'Tag': TaggingEngine.get_tag_code(tag)})
+        self.hour += HourlyAggregator.HOUR.value
+        self.hour_count, self.hour_mean, self.hour_m2 = 0, 0.0, 0.0
+        return self.__get_record__('1hr', timestamp, mean, TaggingEngine.get_tag_code(tag), Count=count, Std=std,
+                                   **{'% valid': valid_percentage})
+
+    def __get_record__(self, period, timestamp, measuring, code, **columns):
+        record = {'sensor_id': self.sensor_id, 'sensor_name': self.sensor_name, 'period': period,
+                  'DateTime': pd.Timestamp(timestamp), 'measuring': measuring, 'Tag': TaggingEngine.TAGS[code]}
+        record.update(columns)
+        return record
+
+
+class LiveMonitor:
+    """
+    Live monitoring of many sensors through the last sample endpoint of the Renovar API.
+    Every poll interval the last sample of all the sensors is requested concurrently, the
+    blocking requests running on a thread pool, and each new sample is tagged incrementally
+    by the LiveSensorState of its sensor. The tagged records and the alerts are passed to
+    the on_record and on_alert callbacks as soon as the poll of the sensor returns, and the
+    closed 15 mins and hourly aggregates stay available in ring buffers.
+    A poll that does not return within timeout is given up, so a slow sensor delays neither
+    the other sensors nor the next cycle.
+    """
+
+    ALERT_TAGS = ['LTLL', 'GTUL', 'BADSPIKE']
+    LAST_SAMPLE_SOURCE = '/sample/sensor/last/'
+
+    def __init__(self, get_service, sensors, poll_interval=60, timeout=10, max_workers=8, stale_after=30 * 60,
+                 sampling_period=15 * 60, on_record=None, on_alert=None, alert_history=1000, **state_options) -> None:
+        """
+        Parameters
+        ----------
+        get_service : GetSensorDataService
+            The service whose get_last_sample_of_sensor is polled
+        sensors: list
+            The sensors to monitor, e.g. SensorRegistry.get_sensors(station='Diamante')
+        poll_interval: Double
+            The seconds between the start of two polls
+        timeout: Double
+            The maximum seconds waited for the last sample of a sensor
+        max_workers: int
+            The maximum number of requests running at the same time
+        stale_after: Double
+            Seconds without a new sample after which a sensor gets a 'STALE' alert
+        on_record, on_alert: function
+            Optional callbacks receiving each record and each alert as a dict
+        state_options:
+            Passed to every LiveSensorState, e.g. bucket_capacity and hour_capacity
+        """
+        self.__get_service = get_service
+        self.__poll_interval = poll_interval
+        self.__timeout = timeout
+        self.__max_workers = max_workers
+        self.__stale_after = stale_after
+        self.__on_record = on_record
+        self.__on_alert = on_alert
+        self.__stop = None
+        self.states = {sensor['sensor_name']: LiveSensorState(sensor, sampling_period, **state_options) for sensor in sensors}
+        self.alerts = collections.deque(maxlen=alert_history)
+        self.latencies = collections.deque(maxlen=alert_history)
+
+    async def run(self, cycles=None):
+        """
+        Polls the sensors every poll_interval until stop is called or, if given, for cycles polls.
+        The schedule is kept on fixed deadlines, so a slow cycle does not shift the next ones;
+        deadlines missed by a cycle longer than the interval are skipped.
+        """
+        loop = asyncio.get_running_loop()
+        self.__stop = asyncio.Event()
+        deadline = loop.time()
+        cycle = 0
+        executor = ThreadPoolExecutor(max_workers=self.__max_workers)
+        try:
+            while not self.__stop.is_set() and (cycles is None or cycle < cycles):
+                await self.poll(executor)
+                cycle += 1
+                deadline = max(deadline + self.__poll_interval, loop.time())
+                if cycles is not None and cycle >= cycles: break
+                try:
+                    await asyncio.wait_for(self.__stop.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Requests that timed out may still be running, they are not waited for
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        if self.__stop is not None: self.__stop.set()
+
+    async def poll(self, executor=None):
+        """
+        Polls all the sensors once, concurrently
+        """
+        await asyncio.gather(*(self.__poll_sensor__(state, executor) for state in self.states.values()))
+
+    def get_aggregates(self, sensor_name, period='15min'):
+        """
+        Returns the closed 15 mins ('15min') or hourly ('1hr') aggregates of a sensor kept in its ring buffer
+        """
+        state = self.states[sensor_name]
+        return state.buckets.to_dataframe() if period == '15min' else state.hours.to_dataframe()
+
+    async def __poll_sensor__(self, state, executor):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            date, measuring = await asyncio.wait_for(
+                loop.run_in_executor(executor, self.__get_service.get_last_sample_of_sensor, state.sensor_id), self.__timeout)
+            # A malformed response of one sensor is reported without stopping the monitoring of the others
+            date_time = DateTimeParser.parse(pd.Series([date]), source=LiveMonitor.LAST_SAMPLE_SOURCE).iloc[0]
+            if pd.isna(date_time):
+                raise ValueError('Invalid date ' + repr(date))
+            measuring = np.nan if measuring is None else float(measuring)
+        except Exception as error:
+            self.__alert__(state, 'ERROR', None, repr(error))
+            return
+
+        now = time.time()
+        records = state.add_sample(date_time.value, measuring)
+        if records:
+            state.last_received = now
+            state.is_stale = False
+        elif state.last_received is not None and now - state.last_received > self.__stale_after and not state.is_stale:
+            state.is_stale = True
+            self.__alert__(state, 'STALE', pd.Timestamp(state.last_timestamp),
+                           'No new sample for ' + str(round(now - state.last_received)) + ' s')
+
+        for record in records:
+            if record['period'] == 'sample' and record['Tag'] in LiveMonitor.ALERT_TAGS:
+                self.__alert__(state, record['Tag'], record['DateTime'], 'Sample of ' + str(record['measuring']))
+            elif record['period'] == '1hr' and record['Tag'] == 'LOWSAMPLES':
+                self.__alert__(state, 'LOWSAMPLES', record['DateTime'], str(round(record['% valid'])) + ' % valid')
+            if self.__on_record is not None: self.__on_record(record)
+        if records: self.latencies.append(time.perf_counter() - start)
+
+    def __alert__(self, state, alert, date_time, message):
+        alert = {'sensor_id': state.sensor_id, 'sensor_name': state.sensor_name, 'alert': alert,
+                 'DateTime': date_time, 'message': message}
+        self.alerts.append(alert)
+        if self.__on_alert is not None: self.__on_alert(alert)
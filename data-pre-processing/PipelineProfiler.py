@@ -0,0 +1,120 @@
+import contextlib
+import datetime as dt
+import json
+import threading
+import time
+import tracemalloc
+import pandas as pd
+
+class PipelineProfiler:
+    """
+    Opt-in instrumentation of the pipeline.
+    Records the wall time, the rows processed and the peak memory of every stage, and the
+    time and size of every HTTP request, in a run report that can be saved as JSON or
+    summarized as a table. Objects given no profiler record nothing.
+    The peak memory is measured with tracemalloc and only counts memory allocated through
+    python, which includes numpy and pandas buffers. Tracing is started by the first stage
+    and, if the profiler started it, stopped when the last open stage exits, so it does not
+    slow down the rest of the process. The tracemalloc peak is global to the process, so
+    the stages that run while a stage of another thread is open, e.g. in the worker threads
+    of get_samples_by_sensors, get a None 'peak_bytes'.
+    """
+
+    def __init__(self, trace_memory=True) -> None:
+        self.__trace_memory = trace_memory
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        # The open stage frames of all the threads, to detect concurrent stages
+        self.__open_frames = []
+        self.__started_tracing = False
+        self.started = dt.datetime.now().isoformat()
+        self.stages = []
+        self.requests = []
+
+    def profile(profiler, stage, rows=None):
+        """
+        Returns the context manager of a stage, or one that records nothing if profiler is None.
+        The context manager gives the record of the stage, so 'rows' can be set inside it.
+        """
+        if profiler is None: return contextlib.nullcontext({})
+        return profiler.stage(stage, rows)
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        record = {'stage': name, 'start': dt.datetime.now().isoformat(), 'rows': rows}
+        stack = self.__get_stack__()
+        frame = {'thread': threading.get_ident(), 'current': 0, 'peak': 0, 'concurrent': False}
+        with self.__lock:
+            if self.__trace_memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self.__started_tracing = True
+                if any(open_frame['thread'] != frame['thread'] for open_frame in self.__open_frames):
+                    for open_frame in self.__open_frames + [frame]: open_frame['concurrent'] = True
+                if not frame['concurrent']:
+                    # The peak is global, so the peak of the enclosing stage is saved before resetting it
+                    current, peak = tracemalloc.get_traced_memory()
+                    if stack: stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+                    tracemalloc.reset_peak()
+                    frame['current'], frame['peak'] = current, current
+            self.__open_frames.append(frame)
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            stack.pop()
+            with self.__lock:
+                self.__open_frames.remove(frame)
+                if self.__trace_memory and not frame['concurrent']:
+                    peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                    record['peak_bytes'] = peak - frame['current']
+                    if stack: stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+                else:
+                    record['peak_bytes'] = None
+                if not self.__open_frames and self.__started_tracing:
+                    tracemalloc.stop()
+                    self.__started_tracing = False
+                self.stages.append(record)
+
+    def record_request(self, request, status, seconds, size):
+        with self.__lock:
+            self.requests.append({'request': request, 'status': status, 'seconds': seconds, 'bytes': size,
+                                  'start': dt.datetime.now().isoformat()})
+
+    def get_summary(self):
+        """
+        Returns a table with the number of calls, the total and mean seconds, the rows,
+        the rows per second and the largest peak memory of each stage, plus one line with
+        the count and total seconds of the HTTP requests
+        """
+        columns = ['calls', 'seconds', 'mean seconds', 'rows', 'rows/s', 'peak MB']
+        records = pd.DataFrame(self.stages, columns=['stage', 'seconds', 'rows', 'peak_bytes'])
+        records['rows'] = pd.to_numeric(records['rows'])
+        records['peak_bytes'] = pd.to_numeric(records['peak_bytes'])
+        summary = records.groupby('stage', sort=False).agg(calls=('seconds', 'size'), seconds=('seconds', 'sum'),
+                                                           rows=('rows', 'sum'), peak_bytes=('peak_bytes', 'max'))
+        if self.requests:
+            requests = pd.DataFrame(self.requests)
+            summary.loc['HTTP requests'] = [len(requests), requests['seconds'].sum(), None, None]
+            summary['calls'] = summary['calls'].astype(int)
+        summary['mean seconds'] = summary['seconds'] / summary['calls']
+        summary['rows/s'] = summary['rows'] / summary['seconds']
+        summary['peak MB'] = summary['peak_bytes'] / 1024 ** 2
+        return summary[columns]
+
+    def get_report(self):
+        summary = self.get_summary().astype(object).where(lambda table: table.notna(), None)
+        return {'started': self.started,
+                'stages': self.stages,
+                'requests': self.requests,
+                'summary': summary.reset_index().to_dict(orient='records')}
+
+    def save_report(self, path):
+        with open(path, 'w') as report_file:
+            json.dump(self.get_report(), report_file, indent=2, default=str)
+
+    def __get_stack__(self):
+        if not hasattr(self.__local, 'stack'): self.__local.stack = []
+        return self.__local.stack
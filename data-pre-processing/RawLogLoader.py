@@ -0,0 +1,112 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from DateTimeParser import DateTimeParser
+
+class RawLogLoader:
+    """
+    Loader of the raw monitoring logs (CO_LOG.CSV, ISB_CO.CSV, RH_LOG.CSV...).
+    The text file is read in chunks, with only the needed columns and compact dtypes.
+    The parsed columns are cached as .npy files in a '<file>.cache' directory next to
+    the raw file, so later loads memory-map them instead of parsing the text again.
+    cache_hit tells whether the last load was served by the cache.
+    """
+
+    DATE_TIME_DTYPES = {'Year': np.int16, 'Month': np.int8, 'Day': np.int8,
+                        'Hour': np.int8, 'Minute': np.int8, 'Second': np.int8}
+    VALUE_COLUMNS = ['Latitude', 'Longitude', 'Value']
+
+    def __init__(self, chunk_size=100000, use_cache=True) -> None:
+        self.__chunk_size = chunk_size
+        self.__use_cache = use_cache
+        self.cache_hit = False
+
+    def load(self, filename, start_date=None, end_date=None, columns=VALUE_COLUMNS, value_dtype=np.float32):
+        """
+        Loads a raw log file
+        Parameters
+        ----------
+        filename : String
+            The path of the raw log file.
+        start_date: datetime
+            Only samples after this date are kept.
+        end_date: datetime
+            Only samples up to this date (inclusive) are kept.
+        columns: list
+            The value columns to load besides the timestamp.
+        value_dtype: numpy dtype
+            The dtype of the 'Value' column. The other columns keep the precision of the file.
+
+        Returns
+        -------
+        dataframe : Pandas Dataframe
+            The samples in the date window with a 'DateTime' column. The index holds the
+            row numbers of the samples in the file. Rows with missing values are dropped.
+        """
+        filename = str(filename)
+        if self.__use_cache:
+            arrays = self.__load_cache__(filename, columns)
+            self.cache_hit = arrays is not None
+            if arrays is None:
+                self.__write_cache__(filename, self.__read_text__(filename, columns, None, None))
+                arrays = self.__load_cache__(filename, columns)
+            positions = np.flatnonzero(self.__get_window_mask__(arrays['DateTime'], start_date, end_date))
+            arrays = {name: np.asarray(array[positions]) for name, array in arrays.items()}
+        else:
+            self.cache_hit = False
+            arrays = self.__read_text__(filename, columns, start_date, end_date)
+
+        dataframe = pd.DataFrame({column: arrays[column] for column in columns}, index=arrays['row'])
+        dataframe['DateTime'] = arrays['DateTime']
+        if 'Value' in dataframe.columns:
+            dataframe['Value'] = dataframe['Value'].astype(value_dtype)
+        return dataframe.dropna()
+
+    def __read_text__(self, filename, columns, start_date, end_date):
+        arrays = {name: [] for name in ['row', 'DateTime'] + list(columns)}
+        dtypes = dict(RawLogLoader.DATE_TIME_DTYPES, **{column: np.float64 for column in columns})
+        reader = pd.read_csv(filename, usecols=list(dtypes.keys()), dtype=dtypes, chunksize=self.__chunk_size)
+        for chunk in reader:
+            date_time = DateTimeParser.from_components(chunk).to_numpy()
+            mask = self.__get_window_mask__(date_time, start_date, end_date)
+            arrays['row'].append(chunk.index.to_numpy()[mask])
+            arrays['DateTime'].append(date_time[mask])
+            for column in columns:
+                arrays[column].append(chunk[column].to_numpy()[mask])
+        return {name: np.concatenate(chunks) for name, chunks in arrays.items()}
+
+    def __get_window_mask__(self, date_time, start_date, end_date):
+        mask = ~np.isnat(date_time)
+        if start_date is not None: mask &= date_time > np.datetime64(pd.Timestamp(start_date))
+        if end_date is not None: mask &= date_time <= np.datetime64(pd.Timestamp(end_date))
+        return mask
+
+    def __get_cache_path__(self, filename):
+        return filename + '.cache'
+
+    def __get_source_stamp__(self, filename):
+        status = os.stat(filename)
+        return {'size': status.st_size, 'mtime': status.st_mtime}
+
+    def __load_cache__(self, filename, columns):
+        cache_path = self.__get_cache_path__(filename)
+        stamp_path = os.path.join(cache_path, 'source.json')
+        if not os.path.exists(stamp_path): return None
+        with open(stamp_path) as stamp_file:
+            if json.load(stamp_file) != self.__get_source_stamp__(filename): return None
+        arrays = {}
+        for name in ['row', 'DateTime'] + list(columns):
+            array_path = os.path.join(cache_path, name + '.npy')
+            if not os.path.exists(array_path): return None
+            arrays[name] = np.load(array_path, mmap_mode='r')
+        return arrays
+
+    def __write_cache__(self, filename, arrays):
+        cache_path = self.__get_cache_path__(filename)
+        if not os.path.exists(cache_path):
+            os.makedirs(cache_path)
+        for name, array in arrays.items():
+            np.save(os.path.join(cache_path, name + '.npy'), array)
+        with open(os.path.join(cache_path, 'source.json'), 'w') as stamp_file:
+            json.dump(self.__get_source_stamp__(filename), stamp_file)
@@ -2,10 +2,25 @@ import json
 import pandas as pd
 import numpy as np
 import os
+from DateTimeParser import DateTimeParser
+from HourlyAggregator import HourlyAggregator
+from PipelineProfiler import PipelineProfiler
+from SensorDataStorage import SensorDataStorage
+from StageCache import StageCache
+from TaggingEngine import TaggingEngine, TaggingPipeline, LimitRule, DiffRule, QuantileRule
 
 class SensorData:
     def __init__(self, sensor_id, sensor_name, lower_limit, upper_limit, t_90, t_90_value, sampling_period, get_service,
-                 molar_mass) -> None:
+                 molar_mass, stage_cache=None, profiler=None, compact=False) -> None:
+        """
+        stage_cache is an optional StageCache. With it, get_samples and tag_and_prepare_data
+        reuse the results of the stages whose inputs and parameters did not change.
+        profiler is an optional PipelineProfiler recording the time, rows and peak memory of every stage.
+        compact keeps the dataframes small enough to hold a whole station in memory: the
+        measurements are float32, constant coordinates are kept once in coordinates instead of
+        on every row, and valid_series and valid_differential_series are selected from
+        sensor_dataframe with valid_mask when read instead of being stored as copies.
+        """
         self.__sensor_id = sensor_id
         self.__sensor_name = sensor_name
         self.__get_service = get_service
@@ -15,52 +30,284 @@ class SensorData:
         self.__t_90_value = t_90_value
         self.__sampling_period = sampling_period
         self.__molar_mass__ = molar_mass
+        self.__stage_cache = stage_cache
+        self.__profiler = profiler
+        self.__compact = compact
         self.web_dataframe = []
         self.sensor_dataframe = []
         self.sensor_dataframe_1hr = []
         self.raw_series = []
         self.valid_series = []
         self.valid_differential_series = []
+        self.valid_mask = None
+        self.coordinates = None
+
+    @property
+    def valid_series(self):
+        if self.valid_mask is not None: return self.sensor_dataframe['measuring'][self.valid_mask]
+        return self.__valid_series
+
+    @valid_series.setter
+    def valid_series(self, valid_series):
+        self.__valid_series = valid_series
+
+    @property
+    def valid_differential_series(self):
+        if self.valid_mask is not None: return self.sensor_dataframe['Diff'][self.valid_mask]
+        return self.__valid_differential_series
+
+    @valid_differential_series.setter
+    def valid_differential_series(self, valid_differential_series):
+        self.__valid_differential_series = valid_differential_series
 
     def get_samples(self):
-        response_json = self.__get_service.get_json_data_from_sensor_id(self.__sensor_id)
-        response_dict = json.loads(response_json.content)
+        with PipelineProfiler.profile(self.__profiler, 'fetch'):
+            response_json = self.__get_service.get_json_data_from_sensor_id(self.__sensor_id)
+        self.web_dataframe = self.__run_stage__('parse', [response_json.content],
+                                                lambda: self.__parse_samples__(response_json.content))
+
+    def __parse_samples__(self, content):
+        response_dict = json.loads(content)
         response_dataframe = pd.DataFrame.from_dict(response_dict)
-        response_dataframe['DateTime'] = (pd.to_datetime(response_dataframe['date'], 
-                                        infer_datetime_format=False, 
-                                        format='%d/%m/%Y %H:%M:%S'))
-        self.web_dataframe = response_dataframe[["DateTime","measuring", "latitude", "longitude"]]
+        response_dataframe['DateTime'] = DateTimeParser.parse(response_dataframe['date'], source='sensor/all')
+        return response_dataframe[["DateTime","measuring", "latitude", "longitude"]]
 
     def tag_and_prepare_data(self):
-        self.sensor_dataframe = self.web_dataframe
-        self.sensor_dataframe = ((self.sensor_dataframe.sort_values(by='DateTime', ascending=True)
-                                  .reset_index().drop(columns='index')))
-        self.sensor_dataframe.index = self.sensor_dataframe['DateTime']
-        self.sensor_dataframe = self.sensor_dataframe.drop(columns=['DateTime'])
-        
-        # Create series
-        self.sensor_dataframe = self.sensor_dataframe.resample('15T').mean()
+        if self.__compact:
+            self.web_dataframe = self.__compact_dataframe__(self.web_dataframe)
+
+        # Each stage is keyed by the key of the previous stage plus its own parameters
+        resample_key = self.__get_stage_key__('resample', [self.web_dataframe])
+        self.sensor_dataframe = self.__run_stage__('resample', resample_key, self.__resample__, rows=len(self.web_dataframe))
         self.raw_series = self.sensor_dataframe['measuring']
 
-        # Tag according to sensor limits
-        self.sensor_dataframe['Tag'] = (self.sensor_dataframe['measuring']
-                                        .apply(lambda v: self.__get_tags_from_series__(value=v,
-                                                                                       lower_limit=self.__lower_limit,
-                                                                                       upper_limit=self.__upper_limit)))
-        
-        # Calculate derivatives
-        self.sensor_dataframe['Diff'] = self.sensor_dataframe['measuring'].resample('15T').mean().diff() 
-        self.sensor_dataframe['Tag'] = (self.sensor_dataframe[['Tag', 'Diff']]
-                                        .apply(lambda df: self.__tag_data_with_diff__(tagged_df=df), axis=1))
-        self.sensor_dataframe['value'] = self.sensor_dataframe['measuring'].map(lambda v: 0.0409*v*self.__molar_mass__/1e3)
-        self.valid_differential_series = self.sensor_dataframe[self.sensor_dataframe['Tag'] == 'VALID']['Diff']
-        
+        # Tag according to sensor limits and derivatives
+        tag_key = self.__get_stage_key__('tag', [resample_key, self.__lower_limit, self.__upper_limit, self.__t_90,
+                                                 self.__t_90_value, self.__sampling_period, self.__molar_mass__])
+        self.sensor_dataframe = self.__run_stage__('tag', tag_key, lambda: self.__tag_dataframe__(self.sensor_dataframe),
+                                                   rows=len(self.sensor_dataframe))
+        if self.__compact:
+            self.sensor_dataframe = self.__compact_dataframe__(self.sensor_dataframe)
+        self.__set_derived_series__()
+
         # Separate valid dataframe
         valid_dataframe = (self.sensor_dataframe[self.sensor_dataframe['Tag'] == 'VALID'].drop(columns=['Tag']))
-        self.valid_series = valid_dataframe['measuring']
         
         # Calculate hourly statistics
-        self.sensor_dataframe_1hr = self.__get_hour_statistics__(valid_dataframe, self.sensor_dataframe.index.freq)
+        hour_statistics_key = self.__get_stage_key__('hour_statistics', [tag_key])
+        self.sensor_dataframe_1hr = self.__run_stage__('hour_statistics', hour_statistics_key, lambda: self.__get_hour_statistics__(
+            valid_dataframe, self.sensor_dataframe.index.freq), rows=len(valid_dataframe))
+        if self.__compact:
+            self.sensor_dataframe_1hr = self.__compact_dataframe__(self.sensor_dataframe_1hr)
+
+    def set_tagged_dataframe(self, sensor_dataframe):
+        """
+        Sets a sensor_dataframe tagged outside of tag_and_prepare_data, e.g. by StationProcessor,
+        and computes the derived series and sensor_dataframe_1hr from it
+        """
+        if self.__compact:
+            self.web_dataframe = self.__compact_dataframe__(self.web_dataframe)
+            sensor_dataframe = self.__compact_dataframe__(sensor_dataframe)
+        self.sensor_dataframe = sensor_dataframe
+        self.__set_derived_series__()
+        valid_dataframe = sensor_dataframe[sensor_dataframe['Tag'] == 'VALID'].drop(columns=['Tag'])
+        self.sensor_dataframe_1hr = self.__get_hour_statistics__(valid_dataframe, sensor_dataframe.index.freq)
+        if self.__compact:
+            self.sensor_dataframe_1hr = self.__compact_dataframe__(self.sensor_dataframe_1hr)
+
+    def __set_derived_series__(self):
+        self.raw_series = self.sensor_dataframe['measuring']
+        is_valid = (self.sensor_dataframe['Tag'] == 'VALID').to_numpy()
+        if self.__compact:
+            self.valid_mask = is_valid
+            self.valid_series, self.valid_differential_series = [], []
+        else:
+            valid_rows = self.sensor_dataframe[is_valid]
+            self.valid_series = valid_rows['measuring']
+            self.valid_differential_series = valid_rows['Diff']
+
+    def __compact_dataframe__(self, dataframe):
+        """
+        Casts the float columns to float32 and the 'Hour' and 'Count' columns to small integers.
+        The coordinate columns are dropped when they hold a single value, which is kept in coordinates.
+        """
+        coordinate_columns = [column for column in ['latitude', 'longitude'] if column in dataframe.columns]
+        if coordinate_columns:
+            coordinates = dataframe[coordinate_columns].to_numpy(dtype=np.float64)
+            is_constant = np.nanmin(coordinates, axis=0, initial=np.inf) == np.nanmax(coordinates, axis=0, initial=-np.inf)
+            if len(dataframe) > 0 and is_constant.all():
+                self.coordinates = dict(zip(coordinate_columns, np.nanmin(coordinates, axis=0).tolist()))
+                dataframe = dataframe.drop(columns=coordinate_columns)
+        dtypes = {column: np.float32 for column, dtype in dataframe.dtypes.items() if dtype == np.float64}
+        if 'Hour' in dataframe.columns: dtypes['Hour'] = np.int8
+        if 'Count' in dataframe.columns: dtypes['Count'] = np.int16
+        return dataframe.astype(dtypes)
+
+    def __resample__(self):
+        sensor_dataframe = self.web_dataframe
+        sensor_dataframe = ((sensor_dataframe.sort_values(by='DateTime', ascending=True)
+                             .reset_index().drop(columns='index')))
+        sensor_dataframe.index = sensor_dataframe['DateTime']
+        sensor_dataframe = sensor_dataframe.drop(columns=['DateTime'])
+        return sensor_dataframe.resample('15T').mean()
+
+    def __get_stage_key__(self, stage, inputs):
+        if self.__stage_cache is None: return None
+        return StageCache.fingerprint(stage, *inputs)
+
+    def __run_stage__(self, stage, key, compute, rows=None):
+        """
+        Runs a stage through the stage cache and the profiler, if any. key is either a
+        fingerprint or the list of inputs to fingerprint. rows defaults to the rows of the result.
+        """
+        with PipelineProfiler.profile(self.__profiler, stage, rows) as record:
+            if self.__stage_cache is None:
+                result = compute()
+            else:
+                if isinstance(key, list): key = self.__get_stage_key__(stage, key)
+                hits = self.__stage_cache.hits
+                result = self.__stage_cache.get_or_compute(stage, key, compute)
+                record['cached'] = self.__stage_cache.hits > hits
+            if record.get('rows') is None and hasattr(result, '__len__'): record['rows'] = len(result)
+            return result
+
+    def update_samples(self, end_date=None, start_date='2020-01-01', storage=None):
+        """
+        Incremental alternative to get_samples + tag_and_prepare_data.
+        Only the samples received since the last run are fetched, tagged and appended to
+        sensor_dataframe and sensor_dataframe_1hr, and to the store with save_to_store. The
+        samples of the hour still being filled are kept in a state file and are only appended
+        once the hour is complete. In a new session, the history appended by the previous runs
+        is read back from the store first. The first run, without a state file, fetches the
+        whole history of the sensor since start_date. The appended rows have the columns of a
+        full run, with the coordinates of the last samples that had them.
+        Parameters
+        ----------
+        end_date: String
+            The end date with the format YYYY-MM-DD. Defaults to today.
+        start_date: String
+            The first date fetched by the first run, with the format YYYY-MM-DD
+        storage: SensorDataStorage
+            The store of the history. Defaults to the shared store.
+
+        Returns
+        -------
+        new_dataframe : Pandas Dataframe
+            The 15 mins tagged rows appended in this run
+        """
+        with PipelineProfiler.profile(self.__profiler, 'update_samples') as stage:
+            new_dataframe = self.__update_samples__(end_date, start_date, storage or SensorDataStorage())
+            stage['rows'] = len(new_dataframe)
+            return new_dataframe
+
+    def __update_samples__(self, end_date, start_date, storage):
+        state = self.__load_state__()
+        end_date = end_date or pd.Timestamp.now().strftime('%Y-%m-%d')
+        if state is None:
+            state = {'last_timestamp': None, 'open_hour': None, 'previous_value': np.nan, 'open_samples': [],
+                     'coordinates': None}
+            samples = self.__get_service.get_samples_by_sensor_in_range(self.__sensor_id, start_date, end_date,
+                                                                        coordinates=True)
+        else:
+            if len(self.sensor_dataframe) == 0:
+                self.__load_history__(storage, state)
+            start_date = pd.Timestamp(state['last_timestamp']).strftime('%Y-%m-%d')
+            samples = self.__get_service.get_samples_by_sensor_in_range(self.__sensor_id, start_date, end_date,
+                                                                        coordinates=True)
+            samples = samples[samples.index > pd.Timestamp(state['last_timestamp'])]
+
+        open_samples = pd.DataFrame(state['open_samples'], columns=['date', 'measuring'])
+        open_samples = open_samples.set_index(DateTimeParser.parse(open_samples['date'])).drop(columns=['date'])
+        samples = pd.concat([open_samples, samples]).sort_index()
+        samples.index.name = 'DateTime'
+        # The samples without coordinates, the open samples of the state file and the samples of
+        # an API that does not send them, take the last known ones
+        coordinates = state.get('coordinates') or self.coordinates
+        if coordinates:
+            samples = samples.assign(**{column: samples.get(column, pd.Series(np.nan, index=samples.index)).fillna(value)
+                                        for column, value in coordinates.items()})
+        if samples.empty:
+            return samples
+
+        # Everything before the hour of the last sample is complete and can be appended
+        open_hour = samples.index[-1].floor('H')
+        first_bucket = pd.Timestamp(state['open_hour']) if state['open_hour'] else samples.index[0].floor('15T')
+        grid = pd.date_range(first_bucket, open_hour, freq='15T')
+        grid = grid[grid < open_hour]
+        new_dataframe = samples.resample('15T').mean().reindex(grid)
+        new_dataframe.index.name = 'DateTime'
+        new_dataframe = self.__tag_dataframe__(new_dataframe, previous_value=state['previous_value'])
+
+        if len(new_dataframe) > 0:
+            is_valid = new_dataframe['Tag'] == 'VALID'
+            valid_dataframe = new_dataframe.drop(columns=['Tag']).where(is_valid, np.nan)
+            new_dataframe_1hr = self.__get_hour_statistics__(valid_dataframe, new_dataframe.index.freq)
+            if self.__compact:
+                new_dataframe = self.__compact_dataframe__(new_dataframe)
+                new_dataframe_1hr = self.__compact_dataframe__(new_dataframe_1hr)
+            # Stored before the state file, so a run stopped in between appends the same rows again
+            self.save_to_store(storage, append=True, sensor_dataframe=new_dataframe, sensor_dataframe_1hr=new_dataframe_1hr)
+            self.sensor_dataframe = self.__append_rows__(self.sensor_dataframe, new_dataframe)
+            self.sensor_dataframe_1hr = self.__append_rows__(self.sensor_dataframe_1hr, new_dataframe_1hr)
+            self.__set_derived_series__()
+            state['previous_value'] = float(new_dataframe['measuring'].iloc[-1])
+
+        open_samples = samples[samples.index >= open_hour]
+        if {'latitude', 'longitude'} <= set(samples.columns):
+            known = samples[['latitude', 'longitude']].dropna()
+            if len(known) > 0: state['coordinates'] = {column: float(value) for column, value in known.iloc[-1].items()}
+        state['last_timestamp'] = samples.index[-1].isoformat()
+        state['open_hour'] = open_hour.isoformat()
+        state['open_samples'] = [[t.isoformat(), float(v)] for t, v in zip(open_samples.index, open_samples['measuring'])]
+        self.__save_state__(state)
+        return new_dataframe
+
+    def __load_history__(self, storage, state):
+        """
+        Reads back the rows appended to the store by the previous runs
+        """
+        try:
+            self.sensor_dataframe = storage.load('sensor_dataframe', self.__sensor_name)
+            self.sensor_dataframe_1hr = storage.load('sensor_dataframe_1hr', self.__sensor_name)
+        except FileNotFoundError:
+            return
+        if self.__compact and self.coordinates is None:
+            self.coordinates = state.get('coordinates')
+        if len(self.sensor_dataframe) > 0:
+            self.__set_derived_series__()
+
+    def __append_rows__(self, dataframe, new_rows):
+        if len(dataframe) == 0: return new_rows
+        return pd.concat([dataframe, new_rows])
+
+    def __get_state_path__(self):
+        return 'data/state/' + self.__sensor_name + 'state.json'
+
+    def __load_state__(self):
+        if not os.path.exists(self.__get_state_path__()): return None
+        with open(self.__get_state_path__()) as state_file:
+            return json.load(state_file)
+
+    def __save_state__(self, state):
+        if not os.path.exists('data/state/'):
+            os.makedirs('data/state/')
+        with open(self.__get_state_path__(), 'w') as state_file:
+            json.dump(state, state_file)
+
+    def __tag_dataframe__(self, dataframe, previous_value=np.nan):
+        """
+        Adds the 'Tag', 'Diff' and 'value' columns to a dataframe resampled to 15 mins.
+        previous_value is the 15 mins value preceding the first row, used for its derivative.
+        """
+        diff_values = np.diff(dataframe['measuring'].to_numpy(dtype=np.float64), prepend=previous_value)
+        max_diff_value = self.__sampling_period / self.__t_90 * self.__t_90_value
+        pipeline = TaggingPipeline([LimitRule(lower_limit=self.__lower_limit, upper_limit=self.__upper_limit),
+                                    DiffRule(max_diff_value=max_diff_value, diff_values=diff_values)])
+        tag_codes = pipeline.run(dataframe['measuring'])
+        dataframe['Tag'] = TaggingEngine.to_categorical(tag_codes, index=dataframe.index)
+        dataframe['Diff'] = diff_values
+        dataframe['value'] = 0.0409*dataframe['measuring']*self.__molar_mass__/1e3
+        return dataframe
 
     def __reset_index_to_date_time__(self, input_df):
         df = ((input_df.sort_values(by='DateTime', ascending=True)
@@ -69,67 +316,86 @@ class SensorData:
         df = input_df.drop(columns=['DateTime'])
         return df
     
-    def __get_tags_from_series__(self, value, lower_limit, upper_limit):
-        if (value <= -9000.0  or 
-            np.isnan(value))  : return 'MISSING' 
-        if value < lower_limit: return 'LTLL'
-        if value > upper_limit: return 'GTUL'
-        return 'VALID'
-    
-    def __tag_data_with_diff__(self, tagged_df):
-        current_tag = tagged_df[0]
-        value = tagged_df[1]
-        if ((current_tag != 'VALID') or (np.isnan(value))): return current_tag
-        max_diff_value = self.__sampling_period / self.__t_90 * self.__t_90_value
-        if ((value > max_diff_value) or (value < -max_diff_value)): return 'BADSPIKE'
-        return 'VALID'
-    
     def __get_hour_statistics__(self, valid_dataframe, original_freq):
-        resampled_dataframe = valid_dataframe.resample('H').mean()
-        resampled_dataframe['Hour'] = resampled_dataframe.index.hour
-        resampled_dataframe['Count'] = (valid_dataframe.resample('H').count()['measuring'])
-        resampled_dataframe['Std'] = (valid_dataframe.resample('H').std()['measuring'])
-        resampled_dataframe['% valid'] = (resampled_dataframe['Count']
-                                          .map(lambda c:
-                                               c / (pd.Timedelta("1 hour") / original_freq) * 100))
-        resampled_dataframe['Tag'] = (resampled_dataframe['% valid']
-                                        .map(lambda c: 'VALID' if c >= 75 else 'LOWSAMPLES'))
-        resampled_dataframe.index = resampled_dataframe.index.map(lambda t: t.replace(minute=30, second=0))
-        return resampled_dataframe
-
-    def calculate_and_tag_quantiles(self):
-        dataframe = self.sensor_dataframe_1hr[self.sensor_dataframe_1hr['Tag'] == 'VALID']
-        global_qtle_01 = dataframe.pivot(columns='Hour')['measuring'].quantile(q=0.01, axis='index', interpolation='lower').dropna()
-        global_qtle_99 = dataframe.pivot(columns='Hour')['measuring'].quantile(q=0.99, axis='index', interpolation='higher').dropna()
-        self.sensor_dataframe_1hr['GLOBAL_QTLE01'] = self.sensor_dataframe_1hr['Hour'].map(lambda hr: global_qtle_01[hr] if (not np.isnan(hr)) else np.nan)
-        self.sensor_dataframe_1hr['GLOBAL_QTLE99'] = self.sensor_dataframe_1hr['Hour'].map(lambda hr: global_qtle_99[hr] if (not np.isnan(hr)) else np.nan)
-        self.sensor_dataframe_1hr['Tag'] = (self.sensor_dataframe_1hr[['Tag', 'measuring', 'GLOBAL_QTLE01', 'GLOBAL_QTLE99']]
-                                            .apply(lambda df: self.__tag_by_quantiles__(tagged_df=df), axis=1))
-        
-    def __tag_by_quantiles__(self, tagged_df):
-        current_tag = tagged_df[0]
-        value = tagged_df[1]
-        quantile_01 = tagged_df[2]
-        quantile_99 = tagged_df[3]
-        if ((current_tag != 'VALID') or (np.isnan(value))): return current_tag
-        if value <= quantile_01: return 'LTQTLE01'
-        if value >= quantile_99: return 'GTQTLE99'
-        return 'VALID'
+        return HourlyAggregator.get_hour_statistics(valid_dataframe, original_freq)
+
+    def calculate_and_tag_quantiles(self, lower_quantile=0.01, upper_quantile=0.99, period=None):
+        """
+        Tags the valid hours lying on or beyond the quantiles of the valid hours with the same hour of day
+        Parameters
+        ----------
+        lower_quantile: Double
+            Hours lower or equal to this quantile are tagged as 'LTQTLE01'
+        upper_quantile: Double
+            Hours greater or equal to this quantile are tagged as 'GTQTLE99'
+        period: String
+            Optional pandas period, e.g. 'M'. The quantiles are then computed for every period
+            and hour of day and stored in 'QTLE01' and 'QTLE99' instead of 'GLOBAL_QTLE01'
+            and 'GLOBAL_QTLE99'.
+        """
+        with PipelineProfiler.profile(self.__profiler, 'calculate_and_tag_quantiles', rows=len(self.sensor_dataframe_1hr)):
+            hours = self.sensor_dataframe_1hr['Hour'].to_numpy(dtype=np.int64)
+            if period is None:
+                groups, group_count = hours, 24
+                columns = ['GLOBAL_QTLE01', 'GLOBAL_QTLE99']
+            else:
+                period_codes, periods = pd.factorize(self.sensor_dataframe_1hr.index.to_period(period))
+                groups, group_count = period_codes * 24 + hours, len(periods) * 24
+                columns = ['QTLE01', 'QTLE99']
+
+            is_valid = (self.sensor_dataframe_1hr['Tag'] == 'VALID').to_numpy()
+            valid_values = np.where(is_valid, self.sensor_dataframe_1hr['measuring'].to_numpy(dtype=np.float64), np.nan)
+            quantile_01 = TaggingEngine.get_quantiles_by_group(valid_values, groups, group_count, lower_quantile, 'lower')
+            quantile_99 = TaggingEngine.get_quantiles_by_group(valid_values, groups, group_count, upper_quantile, 'higher')
+            # The quantiles are values of 'measuring', so they are kept in its dtype (float32 in compact mode)
+            measuring_dtype = self.sensor_dataframe_1hr['measuring'].dtype
+            self.sensor_dataframe_1hr[columns[0]] = quantile_01[groups].astype(measuring_dtype)
+            self.sensor_dataframe_1hr[columns[1]] = quantile_99[groups].astype(measuring_dtype)
+
+            quantile_rule = QuantileRule(quantile_01=self.sensor_dataframe_1hr[columns[0]],
+                                         quantile_99=self.sensor_dataframe_1hr[columns[1]])
+            tag_codes = quantile_rule.apply(TaggingEngine.to_codes(self.sensor_dataframe_1hr['Tag']),
+                                            self.sensor_dataframe_1hr['measuring'])
+            self.sensor_dataframe_1hr['Tag'] = TaggingEngine.to_categorical(tag_codes, index=self.sensor_dataframe_1hr.index)
 
     def save_to_csv(self):
-        directory_path = 'data/output/'
+        with PipelineProfiler.profile(self.__profiler, 'save_to_csv', rows=len(self.sensor_dataframe) + len(self.sensor_dataframe_1hr)):
+            directory_path = 'data/output/'
 
-        if not os.path.exists(directory_path):
-            os.makedirs(directory_path)
+            if not os.path.exists(directory_path):
+                os.makedirs(directory_path)
 
-        processing_directory_path = '../data-processing/input/' 
-        self.sensor_dataframe.to_csv(directory_path + self.__sensor_name + 'sensor_dataframe.csv')
-        self.sensor_dataframe_1hr.to_csv(directory_path + self.__sensor_name + 'sensor_dataframe_1hr.csv')
-        self.sensor_dataframe.to_csv(processing_directory_path + self.__sensor_name + 'sensor_dataframe.csv')
-        self.sensor_dataframe_1hr.to_csv(processing_directory_path + self.__sensor_name + 'sensor_dataframe_1hr.csv')
+            processing_directory_path = '../data-processing/input/' 
+            self.sensor_dataframe.to_csv(directory_path + self.__sensor_name + 'sensor_dataframe.csv')
+            self.sensor_dataframe_1hr.to_csv(directory_path + self.__sensor_name + 'sensor_dataframe_1hr.csv')
+            self.sensor_dataframe.to_csv(processing_directory_path + self.__sensor_name + 'sensor_dataframe.csv')
+            self.sensor_dataframe_1hr.to_csv(processing_directory_path + self.__sensor_name + 'sensor_dataframe_1hr.csv')
 
     def read_from_csv(self):
-        directory_path = 'data/input/'
-        df = pd.read_csv(directory_path + self.__sensor_name + 'web_dataframe.csv')
-        self.web_dataframe = df.drop(df.columns[0], axis='columns')
-        self.web_dataframe['DateTime'] = (pd.to_datetime(df['DateTime'], infer_datetime_format=True))
\ No newline at end of file
+        with PipelineProfiler.profile(self.__profiler, 'read_from_csv') as stage:
+            directory_path = 'data/input/'
+            df = pd.read_csv(directory_path + self.__sensor_name + 'web_dataframe.csv')
+            self.web_dataframe = df.drop(df.columns[0], axis='columns')
+            self.web_dataframe['DateTime'] = DateTimeParser.parse(df['DateTime'], source=directory_path + self.__sensor_name)
+            stage['rows'] = len(self.web_dataframe)
+
+    def save_to_store(self, storage=None, append=False, sensor_dataframe=None, sensor_dataframe_1hr=None):
+        """
+        Saves sensor_dataframe and sensor_dataframe_1hr once in the shared parquet store,
+        which is read by the data-processing notebooks as well.
+        With append=True only the months of the saved rows are rewritten, and the saved rows
+        can be given instead of the whole sensor_dataframe and sensor_dataframe_1hr, e.g. the
+        rows appended by update_samples.
+        """
+        sensor_dataframe = self.sensor_dataframe if sensor_dataframe is None else sensor_dataframe
+        sensor_dataframe_1hr = self.sensor_dataframe_1hr if sensor_dataframe_1hr is None else sensor_dataframe_1hr
+        with PipelineProfiler.profile(self.__profiler, 'save_to_store', rows=len(sensor_dataframe) + len(sensor_dataframe_1hr)):
+            storage = storage or SensorDataStorage()
+            storage.save(sensor_dataframe, 'sensor_dataframe', self.__sensor_name, append=append)
+            storage.save(sensor_dataframe_1hr, 'sensor_dataframe_1hr', self.__sensor_name, append=append)
+
+    def read_from_store(self, storage=None):
+        with PipelineProfiler.profile(self.__profiler, 'read_from_store') as stage:
+            storage = storage or SensorDataStorage()
+            self.web_dataframe = storage.load('web_dataframe', self.__sensor_name).reset_index()
+            stage['rows'] = len(self.web_dataframe)
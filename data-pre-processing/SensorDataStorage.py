@@ -0,0 +1,108 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+class SensorDataStorage:
+    """
+    Columnar storage of the pipeline dataframes.
+    Each dataset is kept as compressed parquet files partitioned by sensor and month:
+
+        <root_path>/<dataset>/<sensor_name>/<YYYY-MM>.parquet
+
+    The DatetimeIndex, the dtypes and the categorical tags are stored with the data, so
+    nothing has to be parsed or inferred again when loading. The default root is reached
+    with the same relative path from data-pre-processing and data-processing, so both
+    stages read and write a single copy of the files.
+    """
+
+    def __init__(self, root_path='../data-store/', compression='zstd') -> None:
+        self.__root_path = root_path
+        self.__compression = compression
+
+    def save(self, dataframe, dataset, sensor_name, append=False):
+        """
+        Saves a dataframe with DatetimeIndex
+        Parameters
+        ----------
+        dataframe : Pandas Dataframe
+            The dataframe to store. It must have a DatetimeIndex.
+        dataset: String
+            The name of the dataset, e.g. 'sensor_dataframe' or 'sensor_dataframe_1hr'
+        sensor_name: String
+            The name of the sensor, used as partition key
+        append: Boolean
+            If False the previous data of the sensor is replaced. If True only the months
+            present in the dataframe are rewritten, with the new rows replacing stored rows
+            that have the same timestamp.
+        """
+        sensor_path = self.__get_sensor_path__(dataset, sensor_name)
+        if not append and os.path.exists(sensor_path):
+            for filename in os.listdir(sensor_path):
+                os.remove(os.path.join(sensor_path, filename))
+        if not os.path.exists(sensor_path):
+            os.makedirs(sensor_path)
+
+        for month, month_dataframe in dataframe.groupby(dataframe.index.to_period('M')):
+            month_path = os.path.join(sensor_path, str(month) + '.parquet')
+            if append and os.path.exists(month_path):
+                stored_dataframe = pd.read_parquet(month_path)
+                month_dataframe = pd.concat([stored_dataframe, month_dataframe])
+                month_dataframe = month_dataframe[~month_dataframe.index.duplicated(keep='last')].sort_index()
+            month_dataframe.to_parquet(month_path, compression=self.__compression)
+
+    def load(self, dataset, sensor_name, start_date=None, end_date=None, columns=None):
+        """
+        Loads a dataset of a sensor
+        Parameters
+        ----------
+        dataset: String
+            The name of the dataset
+        sensor_name: String
+            The name of the sensor
+        start_date: String
+            Optional first date to load, with the format YYYY-MM-DD
+        end_date: String
+            Optional last date to load, with the format YYYY-MM-DD
+        columns: list
+            Optional columns to load. The other columns are not read from the files.
+
+        Returns
+        -------
+        dataframe : Pandas Dataframe
+            The stored dataframe with its DatetimeIndex. Only the monthly files overlapping the
+            requested dates are read, into a single arrow table converted once to pandas.
+        """
+        sensor_path = self.__get_sensor_path__(dataset, sensor_name)
+        if not os.path.exists(sensor_path) or not os.listdir(sensor_path):
+            raise FileNotFoundError('No ' + dataset + ' stored for sensor ' + sensor_name)
+
+        first_month = pd.Period(start_date, freq='M') if start_date else None
+        last_month = pd.Period(end_date, freq='M') if end_date else None
+        month_files = []
+        for filename in sorted(os.listdir(sensor_path)):
+            month = pd.Period(filename.replace('.parquet', ''), freq='M')
+            if first_month is not None and month < first_month: continue
+            if last_month is not None and month > last_month: continue
+            month_files.append(os.path.join(sensor_path, filename))
+
+        if not month_files:
+            all_files = sorted(os.listdir(sensor_path))
+            return pd.read_parquet(os.path.join(sensor_path, all_files[0]), columns=columns).iloc[0:0]
+        tables = [pq.read_table(path, columns=columns, use_pandas_metadata=True) for path in month_files]
+        dataframe = pa.concat_tables(tables).to_pandas()
+        if start_date or end_date:
+            dataframe = dataframe.loc[start_date:end_date]
+        return dataframe
+
+    def list_sensors(self, dataset):
+        dataset_path = os.path.join(self.__root_path, dataset)
+        if not os.path.exists(dataset_path): return []
+        return sorted(os.listdir(dataset_path))
+
+    def get_size_on_disk(self, dataset, sensor_name):
+        sensor_path = self.__get_sensor_path__(dataset, sensor_name)
+        return sum(os.path.getsize(os.path.join(sensor_path, filename)) for filename in os.listdir(sensor_path))
+
+    def __get_sensor_path__(self, dataset, sensor_name):
+        return os.path.join(self.__root_path, dataset, sensor_name)
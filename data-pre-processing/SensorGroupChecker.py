@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+from HourlyAggregator import HourlyAggregator
+from TaggingEngine import TaggingEngine
+
+class SensorGroupChecker:
+    """
+    Consistency checks between the co-located sensors of a station that measure the same
+    pollutant, e.g. alpha_o3_1 and alpha_o3_2, over their hourly statistics
+    (sensor_dataframe_1hr).
+    Each sensor is divided by its median, so sensors with different gains can be compared,
+    and compared with the mean of the other sensors of its group, which is the other sensor
+    of a pair. For every hour, over the window of hours ending at it, are computed:
+      - the correlation between the sensor and the other sensors
+      - the ratio between their means
+      - the divergence, the relative change of the ratio from 1
+    The windowed sums of all the sensors of all the groups come from one cumulative sum
+    over a (hour, sensor) matrix, so the cost grows linearly with the number of hours and
+    of sensors, and the valid hours where the correlation is below min_correlation or the
+    divergence above max_divergence are tagged as 'PAIRDISAGREE'.
+    """
+
+    COLUMNS = ['Group correlation', 'Group ratio', 'Group divergence']
+
+    def __init__(self, window=24, min_valid_percentage=50, min_correlation=0.5, max_divergence=0.5) -> None:
+        """
+        Parameters
+        ----------
+        window : int
+            The number of hours of the window, ending at the checked hour
+        min_valid_percentage: Double
+            The windows with fewer hours where both the sensor and the other sensors are
+            valid have no statistics and do not tag the hour
+        min_correlation: Double
+            Hours whose window correlation is below are tagged
+        max_divergence: Double
+            Hours whose window ratio differs from 1 by more than this fraction are tagged
+        """
+        self.__window = window
+        self.__min_count = max(int(np.ceil(window * min_valid_percentage / 100)), 2)
+        self.__min_correlation = min_correlation
+        self.__max_divergence = max_divergence
+
+    def check(self, hourly_dataframes, groups):
+        """
+        Parameters
+        ----------
+        hourly_dataframes : dict
+            The sensor_dataframe_1hr of the sensors, by sensor name
+        groups: list
+            The groups of sensor names measuring the same pollutant, e.g.
+            [['alpha_o3_1_conc', 'alpha_o3_2_conc'], ['alpha_so2_1_conc', 'alpha_so2_2_conc']].
+            Groups with fewer than two sensors are not checked.
+
+        Returns
+        -------
+        checked_dataframes : dict
+            A copy of the sensor_dataframe_1hr of each sensor of the groups with the
+            'Group correlation', 'Group ratio' and 'Group divergence' columns, and the
+            disagreeing valid hours tagged as 'PAIRDISAGREE'
+        """
+        groups = [list(group) for group in groups if len(group) > 1]
+        names = [name for group in groups for name in group]
+        if len(set(names)) != len(names):
+            raise ValueError('A sensor can only be in one group')
+        if not names:
+            return {}
+        first_hour, values = SensorGroupChecker.__get_values__(hourly_dataframes, names)
+        group_of_sensor = np.repeat(np.arange(len(groups)), [len(group) for group in groups])
+        correlation, ratio = self.__get_statistics__(values, group_of_sensor)
+        divergence = ratio - 1
+
+        disagree_code = TaggingEngine.get_tag_code('PAIRDISAGREE')
+        valid_code = TaggingEngine.get_tag_code('VALID')
+        checked_dataframes = {}
+        for position, name in enumerate(names):
+            dataframe = hourly_dataframes[name]
+            rows = dataframe.index.asi8 // HourlyAggregator.HOUR.value - first_hour
+            statistics = [correlation[rows, position], ratio[rows, position], divergence[rows, position]]
+            # NaN statistics compare as False, so the hours without enough data keep their tag
+            disagrees = (statistics[0] < self.__min_correlation) | (np.abs(statistics[2]) > self.__max_divergence)
+            codes = TaggingEngine.to_codes(dataframe['Tag'])
+            codes[(codes == valid_code) & disagrees] = disagree_code
+            dataframe = dataframe.drop(columns=['Tag'] + SensorGroupChecker.COLUMNS, errors='ignore')
+            checked_dataframes[name] = pd.concat(
+                [dataframe, pd.DataFrame(dict(zip(SensorGroupChecker.COLUMNS, statistics)), index=dataframe.index),
+                 TaggingEngine.to_categorical(codes, index=dataframe.index)], axis=1)
+        return checked_dataframes
+
+    def __get_statistics__(self, values, group_of_sensor):
+        """
+        Returns the (hour, sensor) window correlation and ratio of each sensor with the mean
+        of the other sensors of its group
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            medians = np.nanmedian(np.where(np.isnan(values).all(axis=0), 1.0, values), axis=0)
+            values = values / np.where(medians != 0, medians, 1.0)
+        is_valid = ~np.isnan(values)
+        filled = np.where(is_valid, values, 0.0)
+
+        # The mean of the other sensors of the group, from the group sums minus the sensor itself
+        membership = np.zeros((len(group_of_sensor), group_of_sensor.max() + 1))
+        membership[np.arange(len(group_of_sensor)), group_of_sensor] = 1.0
+        group_sums = (filled @ membership)[:, group_of_sensor]
+        group_counts = (is_valid.astype(np.float64) @ membership)[:, group_of_sensor]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            others = (group_sums - filled) / (group_counts - is_valid)
+
+        is_pair = is_valid & ~np.isnan(others)
+        # Centered, so the cumulative sums of the products do not lose precision
+        with np.errstate(invalid='ignore'):
+            center_x = np.nanmean(np.where(is_pair, values, np.nan), axis=0)
+            center_y = np.nanmean(np.where(is_pair, others, np.nan), axis=0)
+        center_x, center_y = np.nan_to_num(center_x), np.nan_to_num(center_y)
+        x = np.where(is_pair, values - center_x, 0.0)
+        y = np.where(is_pair, others - center_y, 0.0)
+        sensor_count = values.shape[1]
+        window_sums = self.__get_window_sums__(np.hstack([is_pair, x, y, x * x, y * y, x * y]))
+        counts, sum_x, sum_y, sum_xx, sum_yy, sum_xy = (window_sums[:, start:start + sensor_count]
+                                                        for start in range(0, 6 * sensor_count, sensor_count))
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = sum_xy - sum_x * sum_y / counts
+            # The differences of cumulative sums can leave tiny negative variances
+            variance_x = np.maximum(sum_xx - sum_x ** 2 / counts, 0.0)
+            variance_y = np.maximum(sum_yy - sum_y ** 2 / counts, 0.0)
+            correlation = covariance / np.sqrt(variance_x * variance_y)
+            ratio = (sum_x + center_x * counts) / (sum_y + center_y * counts)
+        has_window = counts >= self.__min_count
+        return np.where(has_window, np.clip(correlation, -1.0, 1.0), np.nan), np.where(has_window, ratio, np.nan)
+
+    def __get_window_sums__(self, array):
+        """
+        The sums over the window of hours ending at each hour, as differences of cumulative sums
+        """
+        sums = np.zeros((len(array) + 1, array.shape[1]))
+        np.cumsum(array, axis=0, out=sums[1:])
+        window_sums = sums[1:].copy()
+        window_sums[self.__window:] -= sums[1:len(array) + 1 - self.__window]
+        return window_sums
+
+    def __get_values__(hourly_dataframes, names):
+        """
+        Returns the first hour of the grid and the (hour, sensor) valid measurings on a dense
+        grid of hours from the first to the last hour of any sensor
+        """
+        hour_ns = HourlyAggregator.HOUR.value
+        hours = [hourly_dataframes[name].index.asi8 // hour_ns for name in names]
+        non_empty = [sensor_hours for sensor_hours in hours if len(sensor_hours) > 0]
+        if not non_empty:
+            return 0, np.empty((0, len(names)))
+        first_hour = min(sensor_hours.min() for sensor_hours in non_empty)
+        hour_count = int(max(sensor_hours.max() for sensor_hours in non_empty) - first_hour) + 1
+        values = np.full((hour_count, len(names)), np.nan)
+        for position, name in enumerate(names):
+            dataframe = hourly_dataframes[name]
+            is_valid = (dataframe['Tag'] == 'VALID').to_numpy()
+            values[hours[position][is_valid] - first_hour, position] = dataframe['measuring'].to_numpy(dtype=np.float64)[is_valid]
+        return first_hour, values
@@ -0,0 +1,287 @@
+import os
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+
+class SensorPlotter:
+    """
+    Plotting backend of the SensorDataAnalysisService plots for long series. The figures
+    are built here and returned, the service only decides whether to return them.
+    Time series are decimated to the minimum and maximum of each pixel bucket, which keeps
+    the spikes and the envelope of the line with a few thousand points, and the hourly box
+    plots are drawn from per hour statistics computed in one sorted pass instead of a pivot
+    of the samples.
+    """
+
+    BOX_STATS_COLUMNS = ['label', 'count', 'mean', 'q1', 'med', 'q3', 'whislo', 'whishi', 'fliers']
+
+    def decimate(series, buckets=1000):
+        """
+        Parameters
+        ----------
+        series : Pandas Series
+            A series with DatetimeIndex
+        buckets: int
+            The number of time buckets, about the width of the axis in pixels
+
+        Returns
+        -------
+        decimated_series : Pandas Series
+            The samples with the minimum and the maximum of each bucket, in time order. Buckets
+            without valid samples get a NaN so the line is broken at the gaps, as in the
+            original plot. Series with up to 2 * buckets samples are returned unchanged.
+        """
+        if len(series) <= 2 * buckets:
+            return series
+        timestamps = series.index.asi8
+        values = series.to_numpy(dtype=np.float64)
+        first, last = timestamps.min(), timestamps.max()
+        # In float, as the nanoseconds times the buckets overflow int64 for series longer than a few months
+        bucket_width = (last - first + 1) / buckets
+        bucket_of_sample = ((timestamps - first) / bucket_width).astype(np.int64)
+
+        is_valid = ~np.isnan(values)
+        valid_positions = np.flatnonzero(is_valid)
+        # Sorted by bucket and then by value: the first sample of a bucket is its minimum and the last its maximum
+        order = valid_positions[np.lexsort((values[valid_positions], bucket_of_sample[valid_positions]))]
+        sorted_buckets = bucket_of_sample[order]
+        is_first = np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]]
+        is_last = np.r_[sorted_buckets[1:] != sorted_buckets[:-1], True]
+        kept_positions = np.union1d(order[is_first], order[is_last])
+
+        empty_buckets = np.setdiff1d(np.unique(bucket_of_sample), sorted_buckets)
+        gap_timestamps = first + ((empty_buckets + 0.5) * bucket_width).astype(np.int64)
+        kept_timestamps = np.concatenate([timestamps[kept_positions], gap_timestamps])
+        kept_values = np.concatenate([values[kept_positions], np.full(len(gap_timestamps), np.nan)])
+        time_order = np.argsort(kept_timestamps, kind='stable')
+        index = pd.DatetimeIndex(kept_timestamps[time_order])
+        # asi8 holds UTC nanoseconds, so a tz-aware index is rebuilt in UTC and converted back
+        if series.index.tz is not None:
+            index = index.tz_localize('UTC').tz_convert(series.index.tz)
+        return pd.Series(kept_values[time_order], index=index, name=series.name)
+
+    def get_hour_box_stats(df, whis=1.5):
+        """
+        Box plot statistics of 'measuring' per 'Hour', the same as matplotlib boxplot draws
+        for each column of df.pivot(columns='Hour')['measuring']
+        Parameters
+        ----------
+        df : Pandas Dataframe
+            A dataframe with the 'measuring' and 'Hour' columns
+        whis: Double
+            The whiskers reach the furthest samples within whis times the interquartile range
+
+        Returns
+        -------
+        box_stats : Pandas Dataframe
+            One row per hour with samples, with the BOX_STATS_COLUMNS. It can be computed once
+            and passed to the plots of the same data.
+        """
+        hours = df['Hour'].to_numpy(dtype=np.float64)
+        values = df['measuring'].to_numpy(dtype=np.float64)
+        is_present = ~np.isnan(hours) & ~np.isnan(values)
+        hours, values = hours[is_present].astype(np.int64), values[is_present]
+        if len(values) == 0:
+            return pd.DataFrame(columns=SensorPlotter.BOX_STATS_COLUMNS)
+
+        order = np.lexsort((values, hours))
+        hours, values = hours[order], values[order]
+        labels, starts, counts = np.unique(hours, return_index=True, return_counts=True)
+
+        def percentile(q):
+            # Linear interpolation between the closest ranks, as np.percentile
+            position = (counts - 1) * q / 100
+            lower = np.floor(position).astype(np.int64)
+            upper = np.minimum(lower + 1, counts - 1)
+            fraction = position - lower
+            return values[starts + lower] + fraction * (values[starts + upper] - values[starts + lower])
+
+        q1, med, q3 = percentile(25), percentile(50), percentile(75)
+        low_limit = q1 - whis * (q3 - q1)
+        high_limit = q3 + whis * (q3 - q1)
+        group = np.repeat(np.arange(len(labels)), counts)
+        is_inside = (values >= low_limit[group]) & (values <= high_limit[group])
+        whislo = np.minimum.reduceat(np.where(is_inside, values, np.inf), starts)
+        whishi = np.maximum.reduceat(np.where(is_inside, values, -np.inf), starts)
+        whislo = np.where(whislo > q1, q1, whislo)
+        whishi = np.where(whishi < q3, q3, whishi)
+
+        is_flier = (values < whislo[group]) | (values > whishi[group])
+        flier_groups = np.split(values[is_flier], np.cumsum(np.bincount(group[is_flier], minlength=len(labels)))[:-1])
+        return pd.DataFrame({'label': labels,
+                             'count': counts,
+                             'mean': np.add.reduceat(values, starts) / counts,
+                             'q1': q1, 'med': med, 'q3': q3,
+                             'whislo': whislo, 'whishi': whishi,
+                             # Repeated fliers are drawn on top of each other, so only the distinct values are kept
+                             'fliers': [np.unique(fliers) for fliers in flier_groups]},
+                            index=pd.Index(labels, name='Hour'))
+
+    def plot_series(ax, series, buckets=1000):
+        SensorPlotter.decimate(series, buckets).plot(ax=ax)
+
+    def plot_hour_box(ax, box_stats, title=None):
+        ax.bxp(box_stats[SensorPlotter.BOX_STATS_COLUMNS].to_dict('records'), positions=np.arange(1, len(box_stats) + 1),
+               showmeans=False)
+        if title is not None: ax.set_title(title)
+
+    def plot_mean_vs_std(df):
+        fig = plt.figure(figsize=(1.3*7,7))
+        # Long series are rasterized, so the saved images do not keep one vector marker per hour
+        plt.scatter(df['Std'], df['measuring'], c=df['% valid'], cmap='jet', rasterized=len(df) > 5000)
+        cax = plt.axes([0.95, 0.1, 0.05
+                        , 0.8])
+        cbar = plt.colorbar(orientation='vertical', cax=cax)
+        cbar.ax.tick_params(labelsize=11, length=0)
+        ticks = [np.int64(df['% valid'].min() + 1), 
+                np.int64((df['% valid'].max() - df['% valid'].min()) / 2),
+                np.int64(df['% valid'].max())]
+        cbar.set_ticks(np.array(ticks))
+        cbar.ax.tick_params(labelsize=15, length=0)
+        return fig
+
+    def plot_std_in_time(df):
+        fig = plt.figure(figsize=(1.3*7,7))
+        plt.scatter(df.index, df['Std'], c=df['% valid'], cmap='jet', rasterized=len(df) > 5000)
+        cax = plt.axes([0.95, 0.1, 0.05, 0.8])
+        cbar = plt.colorbar(orientation='vertical', cax=cax)
+        cbar.ax.tick_params(labelsize=11, length=0)
+        ticks = [np.int64(df['% valid'].min() + 1),
+                np.int64((df['% valid'].max() - df['% valid'].min()) / 2),
+                np.int64(df['% valid'].max())]
+        cbar.set_ticks(np.array(ticks))
+        cbar.ax.tick_params(labelsize=15, length=0)
+        return fig
+
+    def plot_box_hist(df, bins, box_stats=None, buckets=1000):
+        """
+        box_stats are the hourly box plot statistics of SensorPlotter.get_hour_box_stats, computed
+        from df when not given. The time series is decimated to buckets pixel buckets.
+        """
+        bottom, height = 0.1, 0.65
+        left, width = bottom, height*1.3
+        spacing = 0.005
+        
+        rect_ser = [left-width-spacing, bottom, width, height]
+        rect_box = [left, bottom, width, height]
+        rect_hist = [left + width + spacing, bottom, height/1.3, height]
+
+        fig = plt.figure(figsize=(5, 5/1.3))
+
+        ax_ser  = plt.axes(rect_ser)
+        ax_ser.tick_params(direction='in', top=True, right=True)
+        ax_ser.set_title('Serie temporal')
+
+        ax_box  = plt.axes(rect_box)
+        ax_box.tick_params(direction='in', labelleft=False)
+
+        ax_hist = plt.axes(rect_hist)
+        ax_hist.tick_params(direction='in', labelleft=False)
+        ax_hist.set_title('Histograma')
+
+        lim_max = df['measuring'].max()+df['measuring'].max()*10/100
+        lim_min = df['measuring'].min()-df['measuring'].min()*10/100
+
+        SensorPlotter.plot_series(ax_ser, df['measuring'], buckets)
+        ax_ser.set_ylim(lim_min, lim_max)
+
+        ax_hist.hist(df['measuring'], bins=bins, orientation='horizontal')
+        ax_hist.set_ylim(lim_min, lim_max)
+
+        if box_stats is None:
+            box_stats = SensorPlotter.get_hour_box_stats(df)
+        SensorPlotter.plot_hour_box(ax_box, box_stats, title='Comportamento médio no período')
+        ax_box.set_ylim(ax_hist.get_ylim())
+        return fig
+
+    def plot_box(df, box_stats=None, buckets=1000):
+        """
+        The same as plot_box_hist, without the histogram
+        """
+        bottom, height = 0.1, 0.65
+        left, width = bottom, height*1.3
+        spacing = 0.005
+        
+        rect_ser = [left-width-spacing, bottom, width, height]
+        rect_box = [left, bottom, width, height]
+
+        fig = plt.figure(figsize=(1.3*5,5))
+
+        ax_ser  = plt.axes(rect_ser)
+        ax_ser.tick_params(direction='in', top=True, right=True)
+        ax_ser.set_title('Série temporal')
+        ax_ser.set_xlabel("Data e hora")
+        ax_ser.set_ylabel("Leituras de concentração (ppb)")
+
+        ax_box  = plt.axes(rect_box)
+        ax_box.tick_params(direction='in', labelleft=False)
+
+        lim_max = df['measuring'].max()+df['measuring'].max()*10/100
+        lim_min = df['measuring'].min()-df['measuring'].min()*10/100
+
+        SensorPlotter.plot_series(ax_ser, df['measuring'], buckets)
+        ax_ser.set_ylim(lim_min, lim_max)
+
+        if box_stats is None:
+            box_stats = SensorPlotter.get_hour_box_stats(df)
+        SensorPlotter.plot_hour_box(ax_box, box_stats, title='Comportamento horário no período')
+        ax_box.set_ylim(lim_min, lim_max)
+        ax_box.set_xlabel("Horas do dia")
+        return fig
+
+    def render_sensor_figures(sensor_name, df, output_path, hour_df=None, bins=20, dpi=100):
+        """
+        Saves the figures of a sensor as png files and closes them
+        Parameters
+        ----------
+        sensor_name : String
+            The prefix of the file names
+        df : Pandas Dataframe
+            The valid samples with the 'measuring' and 'Hour' columns
+        hour_df: Pandas Dataframe
+            Optional hourly statistics with the 'measuring', 'Std' and '% valid' columns
+
+        Returns
+        -------
+        paths : list
+            The paths of the saved figures
+        """
+        plt.switch_backend('Agg')
+        box_stats = SensorPlotter.get_hour_box_stats(df)
+        figures = {'box_hist': SensorPlotter.plot_box_hist(df, bins, box_stats=box_stats),
+                   'box': SensorPlotter.plot_box(df, box_stats=box_stats)}
+        if hour_df is not None:
+            figures['mean_vs_std'] = SensorPlotter.plot_mean_vs_std(hour_df)
+            figures['std_in_time'] = SensorPlotter.plot_std_in_time(hour_df)
+
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+        paths = []
+        for figure_name, figure in figures.items():
+            paths.append(os.path.join(output_path, sensor_name + '_' + figure_name + '.png'))
+            figure.savefig(paths[-1], dpi=dpi, bbox_inches='tight')
+            plt.close(figure)
+        return paths
+
+    def render_figures(dataframes, output_path='data/output/figures/', hour_dataframes=None, bins=20, dpi=100, max_workers=None):
+        """
+        Renders the figures of several sensors in parallel, one process per sensor
+        Parameters
+        ----------
+        dataframes : dict
+            The valid samples of each sensor, by sensor name
+        hour_dataframes: dict
+            Optional hourly statistics of each sensor, by sensor name
+
+        Returns
+        -------
+        paths : dict
+            The paths of the saved figures of each sensor
+        """
+        hour_dataframes = hour_dataframes or {}
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {sensor_name: executor.submit(SensorPlotter.render_sensor_figures, sensor_name, df, output_path,
+                                                    hour_dataframes.get(sensor_name), bins, dpi)
+                       for sensor_name, df in dataframes.items()}
+            return {sensor_name: future.result() for sensor_name, future in futures.items()}
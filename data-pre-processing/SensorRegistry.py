@@ -0,0 +1,81 @@
+from SensorData import SensorData
+
+class SensorRegistry:
+    """
+    The parameters of every sensor of the monitoring stations, as typed in the
+    field-data-treatment notebooks. Sensors of the same station share the same
+    timeline and are processed together by StationProcessor.
+    The raw file is relative to the raw data directory of the station. Sensors without
+    a raw file are read from their input file, the web dataframe saved by the notebooks,
+    which defaults to 'data/input/<name>web_dataframe.csv'.
+    """
+
+    # Molar mass that cancels the ppb to ug/m3 conversion of the 'value' column
+    NO_CONVERSION = 1e3 / 0.0409
+
+    SENSORS = [
+        {'station': 'Diamante', 'pollutant': 'CO', 'sensor_id': 132, 'sensor_name': 'alpha_co_conc',
+         'raw_file': 'ISB_CO.CSV', 'lower_limit': 4.0, 'upper_limit': 1e6, 't_90': 30, 't_90_value': 10e3,
+         'molar_mass': 28.01},
+        {'station': 'Diamante', 'pollutant': 'NO2', 'sensor_id': 133, 'sensor_name': 'alpha_no2_conc',
+         'raw_file': 'ISB_NO2.CSV', 'lower_limit': 15.0, 'upper_limit': 20e3, 't_90': 80, 't_90_value': 2e3,
+         'molar_mass': 46.0055},
+        {'station': 'Diamante', 'pollutant': 'SO2', 'sensor_id': 134, 'sensor_name': 'alpha_so2_1_conc',
+         'raw_file': 'ISB_SO21.CSV', 'lower_limit': 15.0, 'upper_limit': 20e3, 't_90': 60, 't_90_value': 2e3,
+         'molar_mass': 64.066},
+        {'station': 'Diamante', 'pollutant': 'O3', 'sensor_id': 135, 'sensor_name': 'alpha_o3_1_conc',
+         'raw_file': 'ISB_O31.CSV', 'lower_limit': 15.0, 'upper_limit': 20e3, 't_90': 80, 't_90_value': 1e3,
+         'molar_mass': 48},
+        {'station': 'Diamante', 'pollutant': 'O3', 'sensor_id': 136, 'sensor_name': 'alpha_o3_2_conc',
+         'raw_file': 'ISB_O32.CSV', 'lower_limit': 15.0, 'upper_limit': 20e3, 't_90': 80, 't_90_value': 1e3,
+         'molar_mass': 48},
+        {'station': 'Diamante', 'pollutant': 'SO2', 'sensor_id': 137, 'sensor_name': 'alpha_so2_2_conc',
+         'raw_file': 'ISB_SO22.CSV', 'lower_limit': 15.0, 'upper_limit': 20e3, 't_90': 60, 't_90_value': 2e3,
+         'molar_mass': 64.066},
+        {'station': 'Diamante', 'pollutant': 'MP10', 'sensor_id': 140, 'sensor_name': 'alpha_pm_10_conc',
+         'raw_file': 'OPC_PM10.CSV', 'lower_limit': 0.0, 'upper_limit': 20e6, 't_90': 1, 't_90_value': 20e6,
+         'molar_mass': NO_CONVERSION},
+        {'station': 'Diamante', 'pollutant': 'PM2.5', 'sensor_id': 141, 'sensor_name': 'alha_pm_2_5_conc',
+         'raw_file': None, 'input_file': 'alha_pm_2_5_concweb_dataframe.csv', 'lower_limit': 0.0,
+         'upper_limit': 20e6, 't_90': 1, 't_90_value': 20e6, 'molar_mass': NO_CONVERSION},
+        {'station': 'Diamante', 'pollutant': 'PM1', 'sensor_id': 142, 'sensor_name': 'alpha_pm_1_conc',
+         'raw_file': 'OPC_PM1.CSV', 'lower_limit': 0.0, 'upper_limit': 20e6, 't_90': 1, 't_90_value': 20e6,
+         'molar_mass': NO_CONVERSION},
+        {'station': 'Diamante', 'pollutant': 'TEMPERATURE', 'sensor_id': 130, 'sensor_name': 'chamber_temp',
+         'raw_file': 'INT_TMP.CSV', 'lower_limit': -40.0, 'upper_limit': 85, 't_90': 30, 't_90_value': 10e3,
+         'molar_mass': 0.0},
+        {'station': 'Diamante', 'pollutant': 'HUMIDITY', 'sensor_id': 139, 'sensor_name': 'ambient_hum',
+         'raw_file': 'EXT_HUM.CSV', 'lower_limit': 0.0, 'upper_limit': 100, 't_90': 30, 't_90_value': 10e3,
+         'molar_mass': 0.0},
+    ]
+    RAW_DATA_DIRS = {'Diamante': 'data/raw-data-monit-fix-2022-2023-Diamante/'}
+    SAMPLING_PERIOD = 15 * 60
+
+    def get_sensor(sensor_name):
+        for sensor in SensorRegistry.SENSORS:
+            if sensor['sensor_name'] == sensor_name: return sensor
+        raise KeyError('Unknown sensor ' + sensor_name)
+
+    def get_sensors(station=None, pollutants=None):
+        """
+        Returns the sensors of a station, optionally only the ones of the given pollutants
+        """
+        return [sensor for sensor in SensorRegistry.SENSORS
+                if (station is None or sensor['station'] == station)
+                and (pollutants is None or sensor['pollutant'] in pollutants)]
+
+    def get_input_file(sensor):
+        """
+        The web dataframe file of a sensor without a raw file
+        """
+        return sensor.get('input_file') or 'data/input/' + sensor['sensor_name'] + 'web_dataframe.csv'
+
+    def create_sensor_data(sensor_name, get_service=None, compact=False):
+        """
+        Builds the SensorData of a registered sensor, in compact mode if compact is True
+        """
+        sensor = SensorRegistry.get_sensor(sensor_name)
+        return SensorData(sensor['sensor_id'], sensor_name=sensor_name, lower_limit=sensor['lower_limit'],
+                          upper_limit=sensor['upper_limit'], t_90=sensor['t_90'], t_90_value=sensor['t_90_value'],
+                          sampling_period=SensorRegistry.SAMPLING_PERIOD, get_service=get_service,
+                          molar_mass=sensor['molar_mass'], compact=compact)
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+class StageCache:
+    """
+    Content addressed disk cache of the results of the pipeline stages.
+    A result is stored under a key made from the fingerprint of the stage inputs and the
+    stage parameters, so a stage is only computed again when one of them changed.
+    The least recently used results are deleted when the cache grows over max_size_bytes.
+    """
+
+    def __init__(self, root_path='data/cache/', max_size_bytes=512 * 1024 ** 2) -> None:
+        self.__root_path = root_path
+        self.__max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(*parts):
+        """
+        Returns a hex digest of the given parts. Dataframes and series are hashed by content,
+        including the index, the column names and the dtypes.
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, (pd.DataFrame, pd.Series)):
+                digest.update(repr(list(part.dtypes.items()) if isinstance(part, pd.DataFrame) else [(part.name, part.dtype)]).encode())
+                digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+            elif isinstance(part, np.ndarray):
+                digest.update(repr((part.dtype, part.shape)).encode())
+                digest.update(np.ascontiguousarray(part).tobytes())
+            elif isinstance(part, bytes):
+                digest.update(part)
+            else:
+                digest.update(repr(part).encode())
+            digest.update(b'|')
+        return digest.hexdigest()
+
+    def get_or_compute(self, stage, key, compute):
+        """
+        Returns the cached result of the stage for the key, or computes and caches it
+        Parameters
+        ----------
+        stage : String
+            The name of the stage, used as prefix of the cache file
+        key: String
+            The fingerprint of the stage inputs and parameters
+        compute: function
+            Computes the result when it is not cached
+        """
+        path = os.path.join(self.__root_path, stage + '-' + key + '.pkl')
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as cache_file:
+                    result = pickle.load(cache_file)
+                os.utime(path)
+                self.hits += 1
+                return result
+            except (EOFError, pickle.UnpicklingError):
+                os.remove(path)
+
+        self.misses += 1
+        result = compute()
+        if not os.path.exists(self.__root_path):
+            os.makedirs(self.__root_path)
+        temporary_path = path + '.' + str(os.getpid()) + '.tmp'
+        with open(temporary_path, 'wb') as cache_file:
+            pickle.dump(result, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+        self.__evict__()
+        return result
+
+    def clear(self):
+        for path, _, _ in self.__list_files__():
+            os.remove(path)
+
+    def get_size_on_disk(self):
+        return sum(size for _, size, _ in self.__list_files__())
+
+    def __list_files__(self):
+        if not os.path.exists(self.__root_path): return []
+        files = []
+        for filename in os.listdir(self.__root_path):
+            if not filename.endswith('.pkl'): continue
+            status = os.stat(os.path.join(self.__root_path, filename))
+            files.append((os.path.join(self.__root_path, filename), status.st_size, status.st_mtime))
+        return files
+
+    def __evict__(self):
+        files = sorted(self.__list_files__(), key=lambda file: file[2])
+        total_size = sum(size for _, size, _ in files)
+        # The newest file is kept even if it alone is over the limit
+        for path, size, _ in files[:-1]:
+            if total_size <= self.__max_size_bytes: break
+            os.remove(path)
+            total_size -= size
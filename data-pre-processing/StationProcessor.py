@@ -0,0 +1,172 @@
+import datetime as dt
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from DateTimeParser import DateTimeParser
+from RawLogLoader import RawLogLoader
+from SensorRegistry import SensorRegistry
+from TaggingEngine import TaggingEngine, TaggingPipeline, LimitRule, DiffRule
+
+class StationProcessor:
+    """
+    Processes all the registered sensors of a station in one run.
+    The samples of the sensors are loaded in a process pool and aligned into one wide
+    array with a column per sensor on the 15 mins timeline of the station, so the
+    resampling, the tagging and the unit conversion are done once for the whole station.
+    The result of each sensor is the same as SensorData.tag_and_prepare_data.
+    """
+
+    RESAMPLING_PERIOD = pd.Timedelta('15 min')
+
+    def __init__(self, station, pollutants=None, raw_data_dir=None, max_workers=None, get_service=None, compact=False) -> None:
+        """
+        Parameters
+        ----------
+        station : String
+            The station of the sensors in the SensorRegistry
+        pollutants: list
+            Optional pollutants to process. All the sensors of the station are processed if None.
+        raw_data_dir: String
+            The directory of the raw logs. Defaults to the directory of the station in the registry.
+        max_workers: int
+            The number of processes loading the samples
+        get_service: GetSensorDataService
+            The service given to the created SensorData objects
+        compact: Boolean
+            Creates the SensorData objects in compact mode, to hold the whole station in memory
+        """
+        self.__sensors = SensorRegistry.get_sensors(station, pollutants)
+        self.__raw_data_dir = raw_data_dir or SensorRegistry.RAW_DATA_DIRS.get(station, '')
+        self.__max_workers = max_workers
+        self.__get_service = get_service
+        self.__compact = compact
+        self.missing_sensors = []
+
+    def load(self):
+        """
+        Returns the web dataframe of every sensor, loaded in parallel.
+        The sensors whose raw log or input file does not exist are skipped, listed in
+        missing_sensors and reported with a warning.
+        """
+        sensors = [sensor for sensor in self.__sensors if os.path.exists(self.get_input_path(sensor))]
+        self.missing_sensors = [sensor['sensor_name'] for sensor in self.__sensors if sensor not in sensors]
+        if self.missing_sensors:
+            warnings.warn('No input file for the sensors ' + ', '.join(self.missing_sensors) + ', which are skipped')
+        with ProcessPoolExecutor(max_workers=self.__max_workers) as executor:
+            jobs = [executor.submit(StationProcessor.load_samples, sensor, self.__raw_data_dir) for sensor in sensors]
+            return {sensor['sensor_name']: job.result() for sensor, job in zip(sensors, jobs)}
+
+    def get_input_path(self, sensor):
+        """
+        The raw log of a registered sensor, or its input file when it has no raw log
+        """
+        if sensor['raw_file'] is None: return SensorRegistry.get_input_file(sensor)
+        return self.__raw_data_dir + sensor['raw_file']
+
+    def run(self, web_dataframes=None):
+        """
+        Resamples, tags and computes the hourly statistics of all the sensors
+        Parameters
+        ----------
+        web_dataframes : dict
+            Optional sensor name -> web dataframe with 'DateTime' and value columns.
+            The samples are loaded with load() if not given.
+
+        Returns
+        -------
+        sensors : dict
+            Sensor name -> SensorData with web_dataframe, sensor_dataframe, sensor_dataframe_1hr
+            and the derived series filled, ready for calculate_and_tag_quantiles
+        """
+        if web_dataframes is None:
+            web_dataframes = self.load()
+        sensors = [sensor for sensor in self.__sensors if sensor['sensor_name'] in web_dataframes]
+        names = [sensor['sensor_name'] for sensor in sensors]
+        value_columns = {name: [column for column in web_dataframes[name].columns if column != 'DateTime'] for name in names}
+        columns = list(dict.fromkeys(column for name in names for column in value_columns[name]))
+        first_bucket, means, spans = self.__resample__([web_dataframes[name] for name in names],
+                                                       [value_columns[name] for name in names], columns)
+
+        # Tagging and conversion of the whole (bucket, sensor) measuring array at once
+        measuring = means[columns.index('measuring')]
+        diff_values = np.diff(measuring, axis=0, prepend=np.full((1, len(names)), np.nan))
+        lower_limits = np.array([sensor['lower_limit'] for sensor in sensors], dtype=np.float64)
+        upper_limits = np.array([sensor['upper_limit'] for sensor in sensors], dtype=np.float64)
+        max_diff_values = np.array([SensorRegistry.SAMPLING_PERIOD / (sensor['t_90'] / 2) * sensor['t_90_value']
+                                    for sensor in sensors], dtype=np.float64)
+        molar_masses = np.array([sensor['molar_mass'] for sensor in sensors], dtype=np.float64)
+        pipeline = TaggingPipeline([LimitRule(lower_limit=lower_limits, upper_limit=upper_limits),
+                                    DiffRule(max_diff_value=max_diff_values, diff_values=diff_values)])
+        tag_codes = pipeline.run(measuring, codes=np.full(measuring.shape, TaggingEngine.get_tag_code('VALID'), dtype=np.int8))
+        values = 0.0409 * measuring * molar_masses / 1e3
+
+        timeline = pd.DatetimeIndex((first_bucket + np.arange(measuring.shape[0])) * StationProcessor.RESAMPLING_PERIOD.value)
+        results = {}
+        for position, name in enumerate(names):
+            start, end = spans[position]
+            index = pd.DatetimeIndex(timeline[start:end], name='DateTime', freq='15T')
+            sensor_dataframe = pd.DataFrame({column: means[columns.index(column)][start:end, position]
+                                             for column in value_columns[name]}, index=index)
+            sensor_dataframe['Tag'] = TaggingEngine.to_categorical(tag_codes[start:end, position], index=index)
+            sensor_dataframe['Diff'] = diff_values[start:end, position]
+            sensor_dataframe['value'] = values[start:end, position]
+            results[name] = self.__create_sensor_data__(name, web_dataframes[name], sensor_dataframe)
+        return results
+
+    def load_samples(sensor, raw_data_dir):
+        """
+        Loads the web dataframe of a registered sensor from its raw log, or from its input
+        file when it has no raw log
+        """
+        if sensor['raw_file'] is None:
+            input_file = SensorRegistry.get_input_file(sensor)
+            dataframe = pd.read_csv(input_file)
+            dataframe = dataframe.drop(dataframe.columns[0], axis='columns')
+            dataframe['DateTime'] = DateTimeParser.parse(dataframe['DateTime'], source=input_file)
+            return dataframe
+        dataframe = RawLogLoader().load(raw_data_dir + sensor['raw_file'], start_date=dt.datetime(2020, 1, 1, 0, 0, 0),
+                                        end_date=dt.datetime.now(), value_dtype=np.float64)
+        return dataframe.rename(columns={'Value': 'measuring', 'Latitude': 'latitude', 'Longitude': 'longitude'})
+
+    def __resample__(self, web_dataframes, value_columns, columns):
+        """
+        Means of the samples of every sensor in 15 mins buckets, computed for all the
+        sensors with one np.bincount per column over (bucket, sensor) indexes.
+        Returns the first bucket, one (bucket, sensor) array per column and the
+        [start, end) rows of each sensor, from its first to its last sample.
+        """
+        period_ns = StationProcessor.RESAMPLING_PERIOD.value
+        buckets = [DateTimeParser.parse(dataframe['DateTime']).to_numpy().astype(np.int64) // period_ns
+                   for dataframe in web_dataframes]
+        if all(len(sensor_buckets) == 0 for sensor_buckets in buckets):
+            # No sensor returned samples, so every sensor gets empty frames
+            return 0, [np.empty((0, len(web_dataframes))) for _ in columns], [(0, 0)] * len(web_dataframes)
+        first_bucket = min(sensor_buckets.min() for sensor_buckets in buckets if len(sensor_buckets) > 0)
+        last_bucket = max(sensor_buckets.max() for sensor_buckets in buckets if len(sensor_buckets) > 0)
+        bucket_count = int(last_bucket - first_bucket) + 1
+        sensor_count = len(web_dataframes)
+
+        flat_buckets = np.concatenate([(sensor_buckets - first_bucket) * sensor_count + position
+                                       for position, sensor_buckets in enumerate(buckets)])
+        means = []
+        for column in columns:
+            column_values = np.concatenate([dataframe[column].to_numpy(dtype=np.float64) if column in sensor_columns
+                                            else np.full(len(dataframe), np.nan)
+                                            for dataframe, sensor_columns in zip(web_dataframes, value_columns)])
+            is_present = ~np.isnan(column_values)
+            counts = np.bincount(flat_buckets, weights=is_present, minlength=bucket_count * sensor_count)
+            sums = np.bincount(flat_buckets, weights=np.where(is_present, column_values, 0.0), minlength=bucket_count * sensor_count)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means.append(np.where(counts > 0, sums / counts, np.nan).reshape(bucket_count, sensor_count))
+
+        spans = [(int(sensor_buckets.min() - first_bucket), int(sensor_buckets.max() - first_bucket) + 1)
+                 if len(sensor_buckets) > 0 else (0, 0) for sensor_buckets in buckets]
+        return first_bucket, means, spans
+
+    def __create_sensor_data__(self, name, web_dataframe, sensor_dataframe):
+        sensor_data = SensorRegistry.create_sensor_data(name, get_service=self.__get_service, compact=self.__compact)
+        sensor_data.web_dataframe = web_dataframe
+        sensor_data.set_tagged_dataframe(sensor_dataframe)
+        return sensor_data
@@ -0,0 +1,237 @@
+import pandas as pd
+import numpy as np
+
+class TaggingEngine:
+    """
+    Array based tagging of sensor samples.
+    Every rule works over the whole series at once with boolean masks instead of
+    calling a python function for each sample. Rules only change the tag of
+    samples that are still 'VALID', so they can be chained in any declared order.
+    """
+
+    # No rule sets 'STABILIZING' or 'REBASE'; they are categories so the notebooks can assign them to the Tag column
+    TAGS = ['MISSING', 'LTLL', 'GTUL', 'BADSPIKE', 'VALID', 'LOWSAMPLES',
+            'LTQTLE01', 'GTQTLE99', 'STABILIZING', 'REBASE', 'PAIRDISAGREE']
+    MISSING_VALUE = -9000.0
+
+    def get_tag_code(tag):
+        return TaggingEngine.TAGS.index(tag)
+
+    def valid_codes(length):
+        return np.full(length, TaggingEngine.get_tag_code('VALID'), dtype=np.int8)
+
+    def to_categorical(codes, index=None):
+        """
+        Builds the categorical 'Tag' column from an array of tag codes
+        """
+        tags = pd.Categorical.from_codes(np.asarray(codes, dtype=np.int8), categories=TaggingEngine.TAGS)
+        return pd.Series(tags, index=index, name='Tag')
+
+    def to_codes(tags):
+        """
+        Converts an array of tag names into tag codes. Unknown tags get the code -1
+        """
+        if isinstance(tags, pd.Series) and isinstance(tags.dtype, pd.CategoricalDtype) \
+                and list(tags.cat.categories) == TaggingEngine.TAGS:
+            return tags.cat.codes.to_numpy(dtype=np.int8, copy=True)
+        return pd.Categorical(np.asarray(tags, dtype=object), categories=TaggingEngine.TAGS).codes.astype(np.int8)
+
+    def update_tags(tags, codes):
+        """
+        Returns a copy of the tag names with the tags whose code was changed by a rule replaced.
+        Tags unknown to the engine are kept as they are.
+        """
+        tags = tags if isinstance(tags, pd.Series) else pd.Series(tags, dtype=object)
+        codes = np.asarray(codes, dtype=np.int8)
+        changed = codes != TaggingEngine.to_codes(tags)
+        updated = tags.astype(object).to_numpy(copy=True)
+        updated[changed] = np.asarray(TaggingEngine.TAGS, dtype=object)[codes[changed]]
+        return pd.Series(updated, index=tags.index, name=tags.name)
+
+    def get_tags_from_values(values, lower_limit, upper_limit, codes=None):
+        """
+        Tags an array of samples according to the sensor limits
+        Parameters
+        ----------
+        values : array like
+            The measurings of the sensor.
+        lower_limit: Double
+            Values below this limit are tagged as 'LTLL'
+        upper_limit: Double
+            Values above this limit are tagged as 'GTUL'
+        codes: numpy array
+            The current tag codes of the samples. All samples are considered 'VALID' if not given.
+
+        Returns
+        -------
+        codes : numpy array
+            The tag codes (positions in TaggingEngine.TAGS) of each sample
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if codes is None: codes = TaggingEngine.valid_codes(len(values))
+        is_valid = np.asarray(codes) == TaggingEngine.get_tag_code('VALID')
+        conditions = [is_valid & (np.isnan(values) | (values <= TaggingEngine.MISSING_VALUE)),
+                      is_valid & (values < lower_limit),
+                      is_valid & (values > upper_limit)]
+        choices = [TaggingEngine.get_tag_code('MISSING'),
+                   TaggingEngine.get_tag_code('LTLL'),
+                   TaggingEngine.get_tag_code('GTUL')]
+        return np.select(conditions, choices, default=codes).astype(np.int8)
+
+    def tag_data_with_diff(codes, diff_values, max_diff_value):
+        """
+        Tags as 'BADSPIKE' the valid samples whose derivative is out of [-max_diff_value, max_diff_value]
+        Parameters
+        ----------
+        codes : numpy array
+            The current tag codes of the samples
+        diff_values: array like
+            The difference between each sample and the previous one
+        max_diff_value: Double
+            The maximum absolute difference accepted between two samples
+
+        Returns
+        -------
+        codes : numpy array
+            The updated tag codes
+        """
+        codes = np.asarray(codes, dtype=np.int8)
+        diff_values = np.asarray(diff_values, dtype=np.float64)
+        is_valid = codes == TaggingEngine.get_tag_code('VALID')
+        is_spike = (diff_values > max_diff_value) | (diff_values < -max_diff_value)
+        return np.select([is_valid & is_spike], [TaggingEngine.get_tag_code('BADSPIKE')], default=codes).astype(np.int8)
+
+    def tag_by_quantiles(codes, values, quantile_01, quantile_99):
+        """
+        Tags the valid samples lying on or beyond the given quantiles
+        Parameters
+        ----------
+        codes : numpy array
+            The current tag codes of the samples
+        values : array like
+            The measurings of the sensor.
+        quantile_01: Double or array like
+            Values lower or equal to this quantile are tagged as 'LTQTLE01'
+        quantile_99: Double or array like
+            Values greater or equal to this quantile are tagged as 'GTQTLE99'
+
+        Returns
+        -------
+        codes : numpy array
+            The updated tag codes
+        """
+        codes = np.asarray(codes, dtype=np.int8)
+        values = np.asarray(values, dtype=np.float64)
+        is_valid = (codes == TaggingEngine.get_tag_code('VALID')) & ~np.isnan(values)
+        conditions = [is_valid & (values <= np.asarray(quantile_01, dtype=np.float64)),
+                      is_valid & (values >= np.asarray(quantile_99, dtype=np.float64))]
+        choices = [TaggingEngine.get_tag_code('LTQTLE01'),
+                   TaggingEngine.get_tag_code('GTQTLE99')]
+        return np.select(conditions, choices, default=codes).astype(np.int8)
+
+    def get_quantiles_by_group(values, groups, group_count, quantile, interpolation='lower'):
+        """
+        Quantile of the values of every group, computed with a single sort
+        Parameters
+        ----------
+        values : array like
+            The values. NaN values are ignored.
+        groups: array like
+            The integer group of each value, between 0 and group_count - 1. Negative groups are ignored.
+        group_count: int
+            The number of groups
+        quantile: Double
+            The quantile, between 0 and 1
+        interpolation: String
+            'lower', 'higher' or 'linear', as in pandas quantile
+
+        Returns
+        -------
+        quantiles : numpy array
+            The quantile of each group, NaN for groups without values
+        """
+        values = np.asarray(values, dtype=np.float64)
+        groups = np.asarray(groups, dtype=np.int64)
+        keep = ~np.isnan(values) & (groups >= 0)
+        values, groups = values[keep], groups[keep]
+        sorted_values = values[np.lexsort((values, groups))]
+        sizes = np.bincount(groups, minlength=group_count)
+        starts = np.cumsum(sizes) - sizes
+        positions = quantile * np.maximum(sizes - 1, 0)
+        lower = starts + np.floor(positions).astype(np.int64)
+        higher = starts + np.ceil(positions).astype(np.int64)
+        quantiles = np.full(group_count, np.nan)
+        has_values = sizes > 0
+        if interpolation == 'lower':
+            quantiles[has_values] = sorted_values[lower[has_values]]
+        elif interpolation == 'higher':
+            quantiles[has_values] = sorted_values[higher[has_values]]
+        elif interpolation == 'linear':
+            fraction = (positions - np.floor(positions))[has_values]
+            lower_values = sorted_values[lower[has_values]]
+            quantiles[has_values] = lower_values + (sorted_values[higher[has_values]] - lower_values) * fraction
+        else:
+            raise ValueError('Unknown interpolation ' + interpolation)
+        return quantiles
+
+
+class LimitRule:
+    def __init__(self, lower_limit, upper_limit) -> None:
+        self.lower_limit = lower_limit
+        self.upper_limit = upper_limit
+
+    def apply(self, codes, values):
+        return TaggingEngine.get_tags_from_values(values, self.lower_limit, self.upper_limit, codes=codes)
+
+
+class DiffRule:
+    def __init__(self, max_diff_value, diff_values=None) -> None:
+        """
+        Derivative rule. The differences are taken between consecutive values
+        if diff_values is not given, so the values must be regularly sampled.
+        """
+        self.max_diff_value = max_diff_value
+        self.diff_values = diff_values
+
+    def apply(self, codes, values):
+        diff_values = self.diff_values
+        if diff_values is None:
+            diff_values = np.diff(np.asarray(values, dtype=np.float64), prepend=np.nan)
+        return TaggingEngine.tag_data_with_diff(codes, diff_values, self.max_diff_value)
+
+
+class QuantileRule:
+    def __init__(self, quantile_01, quantile_99) -> None:
+        self.quantile_01 = quantile_01
+        self.quantile_99 = quantile_99
+
+    def apply(self, codes, values):
+        return TaggingEngine.tag_by_quantiles(codes, values, self.quantile_01, self.quantile_99)
+
+
+class TaggingPipeline:
+    """
+    Runs a list of rules over the same series, in the declared order
+    """
+    def __init__(self, rules) -> None:
+        self.rules = list(rules)
+
+    def run(self, values, codes=None):
+        """
+        Parameters
+        ----------
+        values : array like
+            The measurings of the sensor.
+        codes: numpy array
+            The current tag codes of the samples. All samples are considered 'VALID' if not given.
+
+        Returns
+        -------
+        codes : numpy array
+            The tag codes after all the rules were applied
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if codes is None: codes = TaggingEngine.valid_codes(len(values))
+        for rule in self.rules:
+            codes = rule.apply(codes, values)
+        return codes
@@ -0,0 +1,125 @@
+"""
+Runs the model search of the *_reference_and_sensor_data_with_temp notebooks, the
+GridSearchCV and cross_validate loop over the feature subsets, and CalibrationSearch on
+the same small synthetic station, and checks that both give the same best parameters and
+test scores. CalibrationSearch is timed with an empty cache and again with the cache
+written by the first run.
+
+The features are built like in the notebooks: two sensors, the same sensors with the
+temperature effect removed, and the temperature. The grids are cut down from the notebooks
+so the notebook loop runs in a few minutes.
+
+Run from the data-pre-processing directory:
+    python benchmarks/calibration_search_benchmark.py --days 30
+"""
+import argparse
+import os
+import sys
+import tempfile
+import warnings
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import GridSearchCV, cross_validate, train_test_split
+from sklearn.neighbors import KNeighborsRegressor
+from sklearn.neural_network import MLPRegressor
+from sklearn.pipeline import Pipeline
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..', '..', 'data-processing'))
+from CalibrationSearch import CalibrationSearch
+from synthetic_streams import make_hourly_station, time_call
+
+VARIABLES_NAMES = ['measuring 1', 'measuring 2', 'measuring 1 no Temp', 'measuring 2 no Temp', 'temperature']
+
+MODELS = {
+    'MLP Regression': (
+        ('mlp_regressor', MLPRegressor(solver='lbfgs', max_iter=200, random_state=42)), {
+            'mlp_regressor__hidden_layer_sizes': [(4,), (10,), (4, 4)],
+            'mlp_regressor__alpha': [0.001, 0.1]
+        }
+    ),
+    'Multilinear Regression': (
+        ('linear_regressor', LinearRegression()), { }
+    ),
+    'KNN Regression': (
+        ('knn_regressor', KNeighborsRegressor()), {
+            'knn_regressor__n_neighbors': [3, 5, 9, 15],
+            'knn_regressor__weights': ['uniform', 'distance'],
+            'knn_regressor__p': [1, 2]
+        }
+    ),
+    'Random Forests Regression': (
+        ('random_forest_regressor', RandomForestRegressor(random_state=42)), {
+            'random_forest_regressor__n_estimators': [10, 20],
+            'random_forest_regressor__max_depth': [None, 5]
+        }
+    )
+}
+
+
+def make_features(days):
+    """
+    Returns the X and y of the notebooks, the reference being a third sensor of the station
+    """
+    _, truth, _ = make_hourly_station(days, 3, 0.0)
+    temperature = truth['chamber_temp']
+    columns = [truth['sensor_0'], truth['sensor_1'],
+               truth['sensor_0'] - 3 * (temperature - 22), truth['sensor_1'] - 3 * (temperature - 22),
+               temperature]
+    return np.column_stack(columns), truth['sensor_2']
+
+
+def notebook_search(feature_subsets, X_train, y_train, X, y, cv):
+    results = {}
+    for features_set, subset in feature_subsets.items():
+        model_results = {}
+        for model_name, (model, param_grid) in MODELS.items():
+            grid_search = GridSearchCV(Pipeline([model]), param_grid, cv=cv, scoring='r2', n_jobs=-1)
+            grid_search.fit(X_train[:, subset], y_train)
+            cross_validation = cross_validate(grid_search.best_estimator_, X[:, subset], y, cv=cv,
+                                              scoring=['r2', 'neg_root_mean_squared_error', 'neg_mean_absolute_error'])
+            model_results[model_name] = {'Best Parameters': grid_search.best_params_,
+                                         'Test R2': cross_validation['test_r2'],
+                                         'Test RMSE': cross_validation['test_neg_root_mean_squared_error'],
+                                         'Test MAE': cross_validation['test_neg_mean_absolute_error']}
+        results[features_set] = model_results
+    return results
+
+
+def check_identical(expected, results):
+    for features_set, model_results in expected.items():
+        for model_name, expected_result in model_results.items():
+            result = results[features_set][model_name]
+            pair = features_set + model_name
+            assert result['Best Parameters'] == expected_result['Best Parameters'], pair
+            for metric in ['Test R2', 'Test RMSE', 'Test MAE']:
+                assert np.array_equal(result[metric], expected_result[metric]), pair + ' ' + metric
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--cv', type=int, default=10)
+    parser.add_argument('--max-workers', type=int, default=None)
+    args = parser.parse_args()
+    # The MLP grid does not always converge in max_iter on unscaled features, like in the notebooks
+    warnings.filterwarnings('ignore', category=ConvergenceWarning)
+
+    X, y = make_features(args.days)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, random_state=42)
+    feature_subsets = CalibrationSearch.get_feature_subsets(VARIABLES_NAMES, 4)
+    print(f'{len(X)} hours, {len(feature_subsets)} feature subsets, {len(MODELS)} models')
+
+    expected, notebook_seconds = time_call(notebook_search, feature_subsets, X_train, y_train, X, y, args.cv)
+    print(f'{"notebook loop":<28}{notebook_seconds:>10.3f}')
+
+    with tempfile.TemporaryDirectory() as cache_path:
+        search = CalibrationSearch(MODELS, cache_path=cache_path, cv=args.cv, max_workers=args.max_workers)
+        for label in ['CalibrationSearch', 'CalibrationSearch cached']:
+            results, seconds = time_call(search.run, feature_subsets, X_train, y_train, X, y)
+            check_identical(expected, results)
+            print(f'{label:<28}{seconds:>10.3f}')
+    print('best parameters and test scores identical')
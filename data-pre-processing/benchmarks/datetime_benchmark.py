@@ -0,0 +1,47 @@
+"""
+Times the timestamp parsing of the raw monitoring logs, comparing the previous
+pandas calls with DateTimeParser.
+
+Run from the data-pre-processing directory:
+    python benchmarks/datetime_benchmark.py
+"""
+import glob
+import os
+import sys
+import warnings
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from DateTimeParser import DateTimeParser
+from synthetic_streams import time_call
+
+warnings.simplefilter('ignore')
+
+
+if __name__ == '__main__':
+    rows = []
+    for path in sorted(glob.glob('data/raw-data-monit-fix-*/**/*.CSV', recursive=True)):
+        dataframe, read_time = time_call(pd.read_csv, path)
+        columns = DateTimeParser.DATE_TIME_COLUMNS
+        assembled, assemble_time = time_call(pd.to_datetime, dataframe[columns])
+        components, components_time = time_call(DateTimeParser.from_components, dataframe, columns)
+        assert assembled.equals(components), path
+
+        text = assembled.dt.strftime('%d/%m/%Y %H:%M:%S')
+        inferred, inferred_time = time_call(pd.to_datetime, text, dayfirst=True)
+        parsed, parsed_time = time_call(DateTimeParser.parse, text, source=path)
+        assert inferred.equals(parsed), path
+
+        rows.append({'file': path.replace('data/', ''),
+                     'rows': len(dataframe),
+                     'read_csv (s)': read_time,
+                     'assemble (s)': assemble_time,
+                     'components (s)': components_time,
+                     'inferred text (s)': inferred_time,
+                     'explicit text (s)': parsed_time})
+
+    results = pd.DataFrame(rows).set_index('file')
+    print(results.round(4).to_string())
+    print()
+    print(results.sum().round(4).to_string())
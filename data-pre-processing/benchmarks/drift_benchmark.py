@@ -0,0 +1,53 @@
+"""
+Times DriftDetector on a synthetic 15 mins series with known level shifts and a
+temperature effect, over the whole series at once and in daily updates with a state file,
+and reports how many of the true change points were found and the error of beta.
+
+Run from the data-pre-processing directory:
+    python benchmarks/drift_benchmark.py --days 365 --shifts 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+from DriftDetector import DriftDetector
+from synthetic_streams import make_shifted_series, time_call
+
+
+def get_recall(found, truth, tolerance=pd.Timedelta('6H')):
+    if len(found) == 0: return 0
+    return sum(np.abs(found - change_point).min() <= tolerance for change_point in truth)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--shifts', type=int, default=8)
+    parser.add_argument('--beta', type=float, default=4.0)
+    parser.add_argument('--penalty', type=float, default=30)
+    args = parser.parse_args()
+
+    sensor_dataframe, temperature, truth = make_shifted_series(args.days, args.shifts, args.beta)
+    print(f'{args.days} days, {len(sensor_dataframe)} samples, {len(truth)} true change points, beta {args.beta}')
+    print(f'{"run":<24}{"seconds":>10}{"found":>8}{"true":>8}{"beta":>8}')
+
+    detector = DriftDetector(penalty=args.penalty)
+    _, seconds = time_call(detector.update, sensor_dataframe, temperature)
+    print(f'{"whole series":<24}{seconds:>10.3f}{len(detector.change_points):>8}'
+          f'{get_recall(detector.change_points, truth):>8}{detector.beta:>8.2f}')
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        state_path = os.path.join(state_dir, 'drift.json')
+        day_seconds = []
+        for day in range(1, args.days + 1):
+            detector = DriftDetector(penalty=args.penalty, state_path=state_path)
+            _, seconds = time_call(detector.update, sensor_dataframe.iloc[:day * 96], temperature)
+            day_seconds.append(seconds)
+    print(f'{"daily updates (mean)":<24}{np.mean(day_seconds):>10.3f}{len(detector.change_points):>8}'
+          f'{get_recall(detector.change_points, truth):>8}{detector.beta:>8.2f}')
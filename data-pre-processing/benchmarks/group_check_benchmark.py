@@ -0,0 +1,68 @@
+"""
+Times SensorGroupChecker on synthetic groups of co-located sensors, one of each group
+drifting away from the others after a random hour, against pandas rolling windows
+computed pair by pair, and reports the disagreeing hours found before and after the drift.
+
+Run from the data-pre-processing directory:
+    python benchmarks/group_check_benchmark.py --days 365 --groups 20 --group-size 3
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+from SensorGroupChecker import SensorGroupChecker
+from synthetic_streams import make_sensor_groups, time_call
+
+
+def pandas_rolling(dataframes, groups, window):
+    """
+    The same statistics with pandas rolling windows, one pair of sensor and other sensors at a time
+    """
+    statistics = {}
+    for group in groups:
+        wide = pd.DataFrame({name: dataframes[name]['measuring'].where(dataframes[name]['Tag'] == 'VALID')
+                             for name in group})
+        wide = wide / wide.median()
+        for name in group:
+            others = wide.drop(columns=name).mean(axis=1)
+            is_pair = wide[name].notna() & others.notna()
+            x, y = wide[name].where(is_pair), others.where(is_pair)
+            statistics[name] = (x.rolling(window, min_periods=window // 2).corr(y),
+                                x.rolling(window, min_periods=window // 2).sum() / y.rolling(window, min_periods=window // 2).sum())
+    return statistics
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--group-size', type=int, default=2)
+    parser.add_argument('--window', type=int, default=24)
+    args = parser.parse_args()
+
+    dataframes, groups, drift_starts = make_sensor_groups(args.days, args.groups, args.group_size)
+    print(f'{args.days} days, {args.groups} groups of {args.group_size} sensors')
+
+    checked, seconds = time_call(SensorGroupChecker(window=args.window).check, dataframes, groups)
+    print(f'SensorGroupChecker      {seconds:.3f} s')
+
+    statistics, seconds = time_call(pandas_rolling, dataframes, groups, args.window)
+    print(f'pandas rolling by pair  {seconds:.3f} s')
+
+    max_difference = max(np.nanmax(np.abs(checked[name][column].to_numpy() - expected.to_numpy()))
+                         for name, expecteds in statistics.items()
+                         for column, expected in zip(['Group correlation', 'Group ratio'], expecteds))
+    print(f'largest difference from pandas: {max_difference:.2e}')
+
+    before, after = 0, 0
+    for group, drift_start in zip(groups, drift_starts):
+        is_tagged = (checked[group[0]]['Tag'] == 'PAIRDISAGREE').to_numpy()
+        is_after = checked[group[0]].index >= drift_start
+        before += is_tagged[~is_after].mean() / len(groups)
+        after += is_tagged[is_after].mean() / len(groups)
+    print(f'drifting sensors tagged: {before:.1%} of the hours before the drift, {after:.1%} after')
@@ -0,0 +1,48 @@
+"""
+Compares HourlyAggregator.get_hour_statistics with the three resample passes and
+per-row maps previously used by SensorData.__get_hour_statistics__.
+
+Run from the data-pre-processing directory:
+    python benchmarks/hour_statistics_benchmark.py --days 365
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from HourlyAggregator import HourlyAggregator
+from synthetic_streams import make_valid_dataframe, time_call
+
+
+def resample_hour_statistics(valid_dataframe, original_freq):
+    resampled_dataframe = valid_dataframe.resample('H').mean()
+    resampled_dataframe['Hour'] = resampled_dataframe.index.hour
+    resampled_dataframe['Count'] = (valid_dataframe.resample('H').count()['measuring'])
+    resampled_dataframe['Std'] = (valid_dataframe.resample('H').std()['measuring'])
+    resampled_dataframe['% valid'] = (resampled_dataframe['Count']
+                                      .map(lambda c:
+                                           c / (pd.Timedelta("1 hour") / original_freq) * 100))
+    resampled_dataframe['Tag'] = (resampled_dataframe['% valid']
+                                    .map(lambda c: 'VALID' if c >= 75 else 'LOWSAMPLES'))
+    resampled_dataframe.index = resampled_dataframe.index.map(lambda t: t.replace(minute=30, second=0))
+    return resampled_dataframe
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+
+    valid_dataframe = make_valid_dataframe(args.days)
+    freq = pd.tseries.frequencies.to_offset('15T')
+    resampled, resample_time = time_call(resample_hour_statistics, valid_dataframe, freq)
+    aggregated, aggregate_time = time_call(HourlyAggregator.get_hour_statistics, valid_dataframe, freq)
+
+    aggregated['Tag'] = aggregated['Tag'].astype(object)
+    pd.testing.assert_frame_equal(resampled, aggregated, rtol=1e-9)
+    print(f'hours:       {len(aggregated)}')
+    print(f'resample:    {resample_time:.3f} s')
+    print(f'single pass: {aggregate_time:.3f} s')
+    print(f'speed-up:    {resample_time / aggregate_time:.1f}x')
@@ -0,0 +1,75 @@
+"""
+Times HourlyImputer on a synthetic station and measures the error of the filled hours.
+The station has co-located sensors driven by a shared daily cycle and a shared weather
+signal plus a temperature sensor. Valid hours are hidden at random and in long gaps,
+tagged as 'LOWSAMPLES', and filled by HourlyImputer, by the median of the same hour of
+the day and by sklearn's KNNImputer, which scans all the rows for every gap.
+
+Run from the data-pre-processing directory:
+    python benchmarks/imputation_benchmark.py --days 1095 --sensors 8
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+from HourlyImputer import HourlyImputer
+from synthetic_streams import make_hourly_station, time_call
+
+
+def hour_median_fill(dataframes):
+    filled = {}
+    for name, dataframe in dataframes.items():
+        medians = dataframe['measuring'].groupby(dataframe['Hour']).median()
+        filled[name] = dataframe['measuring'].fillna(dataframe['Hour'].map(medians)).to_numpy()
+    return filled
+
+
+def knn_imputer_fill(dataframes, n_neighbors):
+    from sklearn.impute import KNNImputer
+    wide = pd.DataFrame({name: dataframe['measuring'] for name, dataframe in dataframes.items()})
+    angle = 2 * np.pi * wide.index.hour / 24
+    features = (wide - wide.mean()) / wide.std()
+    features['sin'], features['cos'] = np.sin(angle), np.cos(angle)
+    imputed = KNNImputer(n_neighbors=n_neighbors).fit_transform(features.to_numpy())[:, :len(wide.columns)]
+    return {name: imputed[:, position] * wide[name].std() + wide[name].mean() for position, name in enumerate(wide.columns)}
+
+
+def get_rmse(filled, truth, hidden):
+    errors = np.concatenate([(filled[name] - truth[name])[hidden[name]] for name in truth])
+    return np.sqrt(np.nanmean(errors ** 2)), np.isnan(errors).sum()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--sensors', type=int, default=6)
+    parser.add_argument('--gap-rate', type=float, default=0.1)
+    parser.add_argument('--n-neighbors', type=int, default=5)
+    parser.add_argument('--algorithm', default='kd_tree')
+    parser.add_argument('--knn-imputer', action='store_true', help='also time sklearn KNNImputer, which is slow')
+    args = parser.parse_args()
+
+    dataframes, truth, hidden = make_hourly_station(args.days, args.sensors, args.gap_rate)
+    gap_hours = sum(is_gap.sum() for is_gap in hidden.values())
+    print(f'{args.days} days, {len(dataframes)} sensors, {gap_hours} gap hours')
+    print(f'{"method":<28}{"seconds":>10}{"rmse":>10}{"unfilled":>10}')
+
+    imputer = HourlyImputer(n_neighbors=args.n_neighbors, algorithm=args.algorithm)
+    imputed, seconds = time_call(imputer.impute, dataframes)
+    rmse, unfilled = get_rmse({name: dataframe['measuring'].to_numpy() for name, dataframe in imputed.items()},
+                              truth, hidden)
+    print(f'{"HourlyImputer":<28}{seconds:>10.3f}{rmse:>10.2f}{unfilled:>10}')
+
+    filled, seconds = time_call(hour_median_fill, dataframes)
+    rmse, unfilled = get_rmse(filled, truth, hidden)
+    print(f'{"median of the hour":<28}{seconds:>10.3f}{rmse:>10.2f}{unfilled:>10}')
+
+    if args.knn_imputer:
+        filled, seconds = time_call(knn_imputer_fill, dataframes, args.n_neighbors)
+        rmse, unfilled = get_rmse(filled, truth, hidden)
+        print(f'{"sklearn KNNImputer":<28}{seconds:>10.3f}{rmse:>10.2f}{unfilled:>10}')
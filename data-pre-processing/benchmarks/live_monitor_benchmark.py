@@ -0,0 +1,167 @@
+"""
+Replays synthetic 1 minute sensor streams through LiveMonitor against a local fake of the
+Renovar API and reports the time of each poll cycle. The fake API serves the last sample
+of every sensor up to a simulated clock, which advances one minute per cycle, so the
+monitor sees every sample of the streams. Its closed 15 mins and hourly aggregates are
+then compared with the batch SensorData pipeline run on the same streams, and the run
+fails (exit code 1) when they differ.
+
+Run from the data-pre-processing directory:
+    python benchmarks/live_monitor_benchmark.py --days 2 --sensors 4 --delay 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+from GetSensorDataService import GetSensorDataService
+from LiveMonitor import LiveMonitor
+from SensorData import SensorData
+from synthetic_streams import make_sensor_stream
+
+# Parameters of the NO2 sensor of the Diamante station
+SENSOR = {'lower_limit': 15.0, 'upper_limit': 20e3, 't_90': 80, 't_90_value': 2e3}
+
+
+class FakeRenovarApi:
+    """
+    Serves /sample/sensor/last/<sensor id> from in memory streams, up to the simulated clock
+    """
+
+    def __init__(self, streams, delay=0.0) -> None:
+        self.clock = None
+        # Per sensor id overrides of the answer delay and of the strftime format of the dates
+        self.delays = {}
+        self.date_formats = {}
+        self.__streams = {sensor_id: (stream['DateTime'].to_numpy().astype(np.int64), stream['measuring'].to_numpy())
+                          for sensor_id, stream in streams.items()}
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # The headers and the body are written separately, which Nagle would delay by the ACK timeout
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                sensor_id = self.path.rsplit('/', 1)[1]
+                if not self.path.startswith('/sample/sensor/last/') or not api.has_sensor(sensor_id):
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                sensor_delay = api.delays.get(int(sensor_id), delay)
+                if sensor_delay: time.sleep(sensor_delay)
+                body = json.dumps(api.get_last_sample(int(sensor_id))).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def has_sensor(self, sensor_id):
+        return sensor_id.isdigit() and int(sensor_id) in self.__streams
+
+    def get_last_sample(self, sensor_id):
+        timestamps, values = self.__streams[sensor_id]
+        position = np.searchsorted(timestamps, self.clock, side='right') - 1
+        timestamp = pd.Timestamp(int(timestamps[position]))
+        date = (timestamp.strftime(self.date_formats[sensor_id]) if sensor_id in self.date_formats
+                else np.datetime64(timestamp.value, 'ns').astype('datetime64[s]').astype(str))
+        return {'date': date, 'measuring': float(values[position])}
+
+
+async def replay(monitor, api, clock, max_workers):
+    cycle_seconds = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for now in clock:
+            api.clock = now
+            start = time.perf_counter()
+            await monitor.poll(executor)
+            cycle_seconds.append(time.perf_counter() - start)
+    return np.array(cycle_seconds)
+
+
+def get_batch_dataframes(stream):
+    sensor_data = SensorData(133, sensor_name='synthetic', sampling_period=15 * 60, get_service=None,
+                             molar_mass=46.0055, **SENSOR)
+    sensor_data.web_dataframe = stream.copy()
+    sensor_data.tag_and_prepare_data()
+    return sensor_data.sensor_dataframe, sensor_data.sensor_dataframe_1hr
+
+
+def compare(live, batch, columns):
+    """
+    Returns the number of rows of the common indexes where any of the columns differ
+    """
+    index = live.index.intersection(batch.index)
+    live, batch = live.loc[index], batch.loc[index]
+    differs = np.zeros(len(index), dtype=bool)
+    for column in columns:
+        if column == 'Tag':
+            differs |= live[column].astype(str).to_numpy() != batch[column].astype(str).to_numpy()
+        else:
+            live_values, batch_values = live[column].to_numpy(dtype=np.float64), batch[column].to_numpy(dtype=np.float64)
+            differs |= ~np.isclose(live_values, batch_values, rtol=1e-9, atol=1e-9, equal_nan=True)
+    return int(differs.sum()), len(index)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--sensors', type=int, default=4)
+    parser.add_argument('--gap-rate', type=float, default=0.05)
+    parser.add_argument('--spike-rate', type=float, default=0.001)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds the fake API takes to answer')
+    parser.add_argument('--max-workers', type=int, default=8)
+    args = parser.parse_args()
+
+    streams = {sensor_id: make_sensor_stream(args.days, gap_rate=args.gap_rate, spike_rate=args.spike_rate, seed=sensor_id)
+               for sensor_id in range(args.sensors)}
+    api = FakeRenovarApi(streams, delay=args.delay)
+    service = GetSensorDataService('127.0.0.1', api.server.server_address[1], pool_size=args.max_workers)
+    sensors = [dict(SENSOR, sensor_id=sensor_id, sensor_name='synthetic_' + str(sensor_id)) for sensor_id in streams]
+    # Large enough to keep all the buckets and hours of the replay
+    monitor = LiveMonitor(service, sensors, max_workers=args.max_workers, bucket_capacity=args.days * 24 * 4 + 8,
+                          hour_capacity=args.days * 24 + 2)
+
+    first = min(stream['DateTime'].iloc[0] for stream in streams.values())
+    clock = first.value + np.arange(args.days * 24 * 60) * 60 * 10 ** 9
+    try:
+        cycle_seconds = asyncio.run(replay(monitor, api, clock, args.max_workers))
+    finally:
+        api.server.shutdown()
+
+    print(f'{len(cycle_seconds)} cycles of {args.sensors} sensors, fake API delay {args.delay:.3f} s')
+    print(f'cycle seconds: mean {cycle_seconds.mean():.4f}  p99 {np.percentile(cycle_seconds, 99):.4f}  '
+          f'max {cycle_seconds.max():.4f}')
+    print(f'alerts: {len(monitor.alerts)}')
+
+    mismatches = 0
+    for sensor_id, stream in streams.items():
+        sensor_dataframe, sensor_dataframe_1hr = get_batch_dataframes(stream)
+        sensor_name = 'synthetic_' + str(sensor_id)
+        bucket_differences, buckets = compare(monitor.get_aggregates(sensor_name, '15min'), sensor_dataframe,
+                                              ['measuring', 'Tag'])
+        hour_differences, hours = compare(monitor.get_aggregates(sensor_name, '1hr'), sensor_dataframe_1hr,
+                                          ['measuring', 'Count', 'Std', '% valid', 'Tag'])
+        print(f'{sensor_name}: {bucket_differences}/{buckets} buckets and {hour_differences}/{hours} hours '
+              'differ from the batch pipeline')
+        mismatches += bucket_differences + hour_differences
+    if mismatches:
+        sys.exit(1)
@@ -0,0 +1,164 @@
+"""
+Checks of the edge cases of LiveMonitor against the local fake of the Renovar API of
+live_monitor_benchmark.py: the same last sample polled again, a sensor going stale, a
+sensor answering after the timeout, malformed and failed responses, and a long outage
+closing thousands of buckets in one add_sample. Each check prints PASS or FAIL and the
+run fails (exit code 1) when any check fails.
+
+Run from the data-pre-processing directory:
+    python benchmarks/live_monitor_checks.py
+"""
+import asyncio
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+from GetSensorDataService import GetSensorDataService
+from LiveMonitor import LiveMonitor, LiveSensorState
+from live_monitor_benchmark import SENSOR, FakeRenovarApi
+from synthetic_streams import make_sensor_stream
+
+MINUTE_NS = 60 * 10 ** 9
+
+
+def make_monitor(sensor_ids, **options):
+    """
+    Returns a fake API serving two days of stream per sensor id, with its clock on the first
+    sample, and a LiveMonitor polling it
+    """
+    streams = {sensor_id: make_sensor_stream(2, gap_rate=0.0, spike_rate=0.0, seed=sensor_id) for sensor_id in sensor_ids}
+    api = FakeRenovarApi(streams)
+    api.clock = min(stream['DateTime'].iloc[0] for stream in streams.values()).value
+    service = GetSensorDataService('127.0.0.1', api.server.server_address[1], timeout=5, retries=0)
+    sensors = [dict(SENSOR, sensor_id=sensor_id, sensor_name='synthetic_' + str(sensor_id)) for sensor_id in sensor_ids]
+    return api, LiveMonitor(service, sensors, **options)
+
+
+def poll(monitor, executor):
+    asyncio.run(monitor.poll(executor))
+
+
+def get_alerts(monitor, alert):
+    return [record for record in monitor.alerts if record['alert'] == alert]
+
+
+def check_repeated_last_sample(executor):
+    records = []
+    api, monitor = make_monitor([0], on_record=records.append)
+    try:
+        poll(monitor, executor)
+        assert len(records) == 1, records
+        # Same clock, so the API answers the same last sample
+        poll(monitor, executor)
+        poll(monitor, executor)
+        assert len(records) == 1, 'the repeated sample produced records'
+        assert len(monitor.alerts) == 0, list(monitor.alerts)
+        api.clock += MINUTE_NS
+        poll(monitor, executor)
+        assert len(records) == 2, records
+    finally:
+        api.server.shutdown()
+
+
+def check_stale(executor):
+    api, monitor = make_monitor([0], stale_after=0.2)
+    try:
+        poll(monitor, executor)
+        time.sleep(0.3)
+        poll(monitor, executor)
+        poll(monitor, executor)
+        assert len(get_alerts(monitor, 'STALE')) == 1, 'a stale sensor must be reported once'
+        assert monitor.states['synthetic_0'].is_stale
+        api.clock += MINUTE_NS
+        poll(monitor, executor)
+        assert not monitor.states['synthetic_0'].is_stale, 'a new sample must clear the stale state'
+        time.sleep(0.3)
+        poll(monitor, executor)
+        assert len(get_alerts(monitor, 'STALE')) == 2, 'a sensor stale again must be reported again'
+    finally:
+        api.server.shutdown()
+
+
+def check_timeout(executor):
+    api, monitor = make_monitor([0, 1], timeout=0.2)
+    api.delays[1] = 1.0
+    try:
+        start = time.perf_counter()
+        poll(monitor, executor)
+        seconds = time.perf_counter() - start
+        assert seconds < 0.8, f'the cycle waited {seconds:.2f} s for the slow sensor'
+        errors = get_alerts(monitor, 'ERROR')
+        assert [error['sensor_id'] for error in errors] == [1], errors
+        assert 'TimeoutError' in errors[0]['message'], errors[0]
+        assert monitor.states['synthetic_0'].last_timestamp is not None, 'the fast sensor was not updated'
+        assert monitor.states['synthetic_1'].last_timestamp is None
+    finally:
+        api.server.shutdown()
+
+
+def check_errors(executor):
+    api, monitor = make_monitor([0, 1])
+    # Sensor 2 is not known by the API, which answers 404
+    monitor.states['synthetic_2'] = LiveSensorState(dict(SENSOR, sensor_id=2, sensor_name='synthetic_2'), 15 * 60)
+    try:
+        for _ in range(2):
+            poll(monitor, executor)
+            api.clock += MINUTE_NS
+        # The date format of a sensor changes, then the sensor answers garbage dates
+        api.date_formats[0] = '%d/%m/%Y %H:%M'
+        asyncio.run(monitor.run(cycles=1))
+        api.clock += MINUTE_NS
+        api.date_formats[1] = 'not a date'
+        asyncio.run(monitor.run(cycles=2))
+
+        errors = get_alerts(monitor, 'ERROR')
+        assert {error['sensor_id'] for error in errors} == {1, 2}, errors
+        assert sum(error['sensor_id'] == 2 for error in errors) == 5, 'every poll of the unknown sensor is an error'
+        assert sum(error['sensor_id'] == 1 for error in errors) == 2, 'every garbage date is an error'
+        # The sensor whose date format changed kept being monitored
+        assert monitor.states['synthetic_0'].last_timestamp == api.clock, 'the sensor with the new date format was not updated'
+    finally:
+        api.server.shutdown()
+
+
+def check_long_outage(executor, days=60):
+    state = LiveSensorState(dict(SENSOR, sensor_id=0, sensor_name='synthetic_0'), 15 * 60,
+                            bucket_capacity=4 * 24 * 7, hour_capacity=24 * 30)
+    first = pd.Timestamp('2023-01-01 00:00').value
+    state.add_sample(first, 500.0)
+    start = time.perf_counter()
+    records = state.add_sample(first + days * 24 * 60 * MINUTE_NS, 500.0)
+    seconds = time.perf_counter() - start
+
+    buckets = [record for record in records if record['period'] == '15min']
+    hours = [record for record in records if record['period'] == '1hr']
+    assert len(buckets) == days * 24 * 4, len(buckets)
+    assert len(hours) == days * 24, len(hours)
+    assert buckets[0]['Tag'] == 'VALID' and all(record['Tag'] == 'MISSING' for record in buckets[1:])
+    assert all(record['Tag'] == 'LOWSAMPLES' for record in hours)
+    # The ring buffers keep only their capacity, the most recent rows
+    assert len(state.buckets) == 4 * 24 * 7 and len(state.hours) == 24 * 30
+    assert state.buckets.to_dataframe().index[-1] == pd.Timestamp(first + (days * 24 * 4 - 1) * 15 * MINUTE_NS)
+    print(f'    {len(buckets)} buckets and {len(hours)} hours closed in {seconds:.3f} s')
+
+
+if __name__ == '__main__':
+    checks = [check_repeated_last_sample, check_stale, check_timeout, check_errors, check_long_outage]
+    failures = 0
+    executor = ThreadPoolExecutor(max_workers=8)
+    for check in checks:
+        try:
+            check(executor)
+            print(f'PASS {check.__name__}')
+        except Exception:
+            failures += 1
+            print(f'FAIL {check.__name__}')
+            traceback.print_exc()
+    executor.shutdown(wait=False, cancel_futures=True)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,156 @@
+"""
+Times the SensorData pipeline on synthetic 1 minute sensor streams and compares the
+results with a stored baseline. The run fails (exit code 1) when a step is slower than
+its baseline by more than the threshold.
+
+Run from the data-pre-processing directory:
+    python benchmarks/pipeline_benchmark.py --days 365 --sensors 2 --save-baseline
+    python benchmarks/pipeline_benchmark.py --days 365 --sensors 2 --threshold 0.25
+
+The baseline is kept per configuration (days, gap rate, spike rate and sensor count)
+in benchmarks/pipeline_baseline.json, which has one for the default configuration. A
+configuration without a baseline also fails the run unless --save-baseline is given. The
+timings depend on the machine, so a baseline should be saved on the machine where the
+comparison runs.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+from GetSensorDataService import GetSensorDataService
+from SensorData import SensorData
+from synthetic_streams import make_sensor_stream, time_call, write_raw_log
+
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, 'pipeline_baseline.json')
+STEPS = ['get_data_from_file (cold)', 'get_data_from_file (warm, CSV removed)', 'get_data_from_file (warm)',
+         'tag_and_prepare_data', '__get_hour_statistics__', 'calculate_and_tag_quantiles', 'save_to_csv', 'read_from_csv']
+
+
+def create_sensor_data(sensor_name, get_service):
+    # Parameters of the NO2 sensor of the Diamante station
+    return SensorData(133, sensor_name=sensor_name, lower_limit=15.0, upper_limit=20e3, t_90=80, t_90_value=2e3,
+                      sampling_period=15 * 60, get_service=get_service, molar_mass=46.0055)
+
+
+def run_sensor(sensor_name, raw_path, service):
+    """
+    Runs every step once for a sensor and returns the seconds taken by each one
+    """
+    timings = {}
+    cache_path = raw_path + '.cache'
+    if os.path.exists(cache_path): shutil.rmtree(cache_path)
+    _, timings['get_data_from_file (cold)'] = time_call(service.get_data_from_file, raw_path, sensor_name)
+    # The cache is warm but the web dataframe CSV has to be written again
+    os.remove(os.path.join('data/input', sensor_name + 'web_dataframe.csv'))
+    _, timings['get_data_from_file (warm, CSV removed)'] = time_call(service.get_data_from_file, raw_path, sensor_name)
+    web_dataframe, timings['get_data_from_file (warm)'] = time_call(service.get_data_from_file, raw_path, sensor_name)
+
+    sensor_data = create_sensor_data(sensor_name, service)
+    sensor_data.web_dataframe = web_dataframe.copy()
+    _, timings['tag_and_prepare_data'] = time_call(sensor_data.tag_and_prepare_data)
+
+    valid_dataframe = sensor_data.sensor_dataframe[sensor_data.sensor_dataframe['Tag'] == 'VALID'].drop(columns=['Tag'])
+    _, timings['__get_hour_statistics__'] = time_call(sensor_data.__get_hour_statistics__, valid_dataframe,
+                                                      sensor_data.sensor_dataframe.index.freq)
+    _, timings['calculate_and_tag_quantiles'] = time_call(sensor_data.calculate_and_tag_quantiles)
+    _, timings['save_to_csv'] = time_call(sensor_data.save_to_csv)
+    _, timings['read_from_csv'] = time_call(sensor_data.read_from_csv)
+    return timings
+
+
+def run(days, gap_rate, spike_rate, sensors, repeat):
+    """
+    Returns the best of repeat runs of each step, summed over the sensors
+    """
+    working_dir = os.getcwd()
+    # save_to_csv also writes to '../data-processing/input/', so that layout is recreated
+    root = tempfile.mkdtemp()
+    run_dir = os.path.join(root, 'data-pre-processing')
+    for path in ['data/input', 'data/output', 'data/raw']:
+        os.makedirs(os.path.join(run_dir, path))
+    os.makedirs(os.path.join(root, 'data-processing', 'input'))
+    try:
+        os.chdir(run_dir)
+        raw_paths = []
+        for sensor in range(sensors):
+            stream = make_sensor_stream(days, gap_rate=gap_rate, spike_rate=spike_rate, seed=sensor)
+            raw_paths.append(os.path.join('data/raw', 'SENSOR_' + str(sensor) + '.CSV'))
+            write_raw_log(stream, raw_paths[-1])
+
+        service = GetSensorDataService('localhost', 8080)
+        best = {step: np.inf for step in STEPS}
+        for _ in range(repeat):
+            totals = {step: 0.0 for step in STEPS}
+            for sensor, raw_path in enumerate(raw_paths):
+                for step, seconds in run_sensor('synthetic_' + str(sensor), raw_path, service).items():
+                    totals[step] += seconds
+            best = {step: min(best[step], totals[step]) for step in STEPS}
+        return best
+    finally:
+        os.chdir(working_dir)
+        shutil.rmtree(root)
+
+
+def get_configuration_key(args):
+    return 'days={} gap_rate={} spike_rate={} sensors={}'.format(args.days, args.gap_rate, args.spike_rate, args.sensors)
+
+
+def load_baselines(path):
+    if not os.path.exists(path): return {}
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--gap-rate', type=float, default=0.05)
+    parser.add_argument('--spike-rate', type=float, default=0.001)
+    parser.add_argument('--sensors', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='accepted slowdown over the baseline, as a fraction')
+    parser.add_argument('--min-seconds', type=float, default=0.005,
+                        help='slowdowns shorter than this are ignored, as they are within the timer noise')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    timings = run(args.days, args.gap_rate, args.spike_rate, args.sensors, args.repeat)
+    key = get_configuration_key(args)
+    baselines = load_baselines(args.baseline)
+    baseline = baselines.get(key)
+
+    print(key)
+    print(f'{"step":<40}{"seconds":>10}{"baseline":>10}{"ratio":>8}')
+    regressions = []
+    for step in STEPS:
+        if baseline is None or step not in baseline:
+            print(f'{step:<40}{timings[step]:>10.3f}{"-":>10}{"-":>8}')
+            continue
+        ratio = timings[step] / baseline[step]
+        flag = ''
+        if ratio > 1 + args.threshold and timings[step] - baseline[step] > args.min_seconds:
+            regressions.append(step)
+            flag = '  SLOWER'
+        print(f'{step:<40}{timings[step]:>10.3f}{baseline[step]:>10.3f}{ratio:>8.2f}{flag}')
+
+    if args.save_baseline:
+        baselines[key] = timings
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+        print('baseline saved to ' + args.baseline)
+    elif baseline is None or any(step not in baseline for step in STEPS):
+        # Without a baseline there is nothing to gate on, which must not pass silently
+        print('no baseline for this configuration, run with --save-baseline to store one')
+        sys.exit(1)
+    if regressions and not args.save_baseline:
+        print(f'{len(regressions)} step(s) slower than the baseline by more than {args.threshold:.0%}')
+        sys.exit(1)
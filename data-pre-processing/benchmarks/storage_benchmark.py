@@ -0,0 +1,54 @@
+"""
+Compares the CSV round-trip of the pipeline outputs with SensorDataStorage,
+on the sensor_dataframe files found in data/output/.
+
+Run from the data-pre-processing directory:
+    python benchmarks/storage_benchmark.py
+"""
+import glob
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from SensorDataStorage import SensorDataStorage
+from TaggingEngine import TaggingEngine
+from synthetic_streams import time_call
+
+
+def read_csv(path):
+    dataframe = pd.read_csv(path, index_col='DateTime', parse_dates=['DateTime'])
+    dataframe['Tag'] = pd.Categorical(dataframe['Tag'], categories=TaggingEngine.TAGS)
+    return dataframe
+
+
+if __name__ == '__main__':
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        storage = SensorDataStorage(root_path=directory)
+        for path in sorted(glob.glob('data/output/*sensor_dataframe*.csv')):
+            name = os.path.basename(path).replace('.csv', '')
+            dataframe, csv_load = time_call(read_csv, path)
+            csv_path = os.path.join(directory, name + '.csv')
+            _, csv_save = time_call(dataframe.to_csv, csv_path)
+            _, store_save = time_call(storage.save, dataframe, 'benchmark', name)
+            loaded, store_load = time_call(storage.load, 'benchmark', name)
+            pd.testing.assert_frame_equal(dataframe, loaded, check_freq=False)
+            measuring, columns_load = time_call(storage.load, 'benchmark', name, columns=['measuring', 'Tag'])
+            pd.testing.assert_frame_equal(dataframe[['measuring', 'Tag']], measuring, check_freq=False)
+            rows.append({'file': name,
+                         'rows': len(dataframe),
+                         'csv save (s)': csv_save,
+                         'csv load (s)': csv_load,
+                         'store save (s)': store_save,
+                         'store load (s)': store_load,
+                         'store load 2 columns (s)': columns_load,
+                         'csv (kB)': os.path.getsize(csv_path) / 1e3,
+                         'store (kB)': storage.get_size_on_disk('benchmark', name) / 1e3})
+
+    results = pd.DataFrame(rows).set_index('file')
+    print(results.round(3).to_string())
+    print()
+    print(results.sum().round(3).to_string())
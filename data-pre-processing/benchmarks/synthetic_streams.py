@@ -0,0 +1,205 @@
+"""
+Synthetic data and the timer shared by the benchmarks.
+A 1 minute sensor stream has a daily cycle, noise, gaps of missing samples and spikes, and
+can be written in the layout of the raw monitoring logs read by get_data_from_file. The
+other generators build the 15 mins and hourly tagged frames taken by the later stages.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from TaggingEngine import TaggingEngine
+
+
+def make_sensor_stream(days, gap_rate=0.05, spike_rate=0.001, seed=0, start='2022-01-01',
+                       mean_value=500.0, amplitude=200.0, noise=20.0, spike_size=1e5, mean_gap_minutes=60):
+    """
+    Returns a web dataframe with 'DateTime', 'measuring', 'latitude' and 'longitude' columns
+    Parameters
+    ----------
+    days : int
+        The length of the stream
+    gap_rate: Double
+        The fraction of the minutes without samples. The missing minutes come in gaps of
+        mean_gap_minutes on average.
+    spike_rate: Double
+        The fraction of the samples with a spike of +-spike_size added
+    seed: int
+        The seed of the random generator, so a configuration always gives the same stream
+    """
+    rng = np.random.default_rng(seed)
+    minutes = days * 24 * 60
+    index = pd.date_range(start, periods=minutes, freq='1T')
+    minute_of_day = np.arange(minutes) % (24 * 60)
+    measuring = (mean_value + amplitude * np.sin(2 * np.pi * minute_of_day / (24 * 60))
+                 + np.cumsum(rng.normal(0, noise / 10, minutes)) * 0.01 + rng.normal(0, noise, minutes))
+
+    is_spike = rng.random(minutes) < spike_rate
+    measuring[is_spike] += rng.choice([-spike_size, spike_size], is_spike.sum())
+
+    # Gaps: random starts with geometric lengths, marked with +1/-1 edges and a cumulative sum
+    gap_count = int(gap_rate * minutes / mean_gap_minutes)
+    edges = np.zeros(minutes + 1, dtype=np.int64)
+    gap_starts = rng.integers(0, minutes, gap_count)
+    gap_ends = np.minimum(gap_starts + rng.geometric(1 / mean_gap_minutes, gap_count), minutes)
+    np.add.at(edges, gap_starts, 1)
+    np.add.at(edges, gap_ends, -1)
+    is_present = np.cumsum(edges[:-1]) == 0
+
+    return pd.DataFrame({'DateTime': index[is_present],
+                         'measuring': measuring[is_present],
+                         'latitude': -28.456899,
+                         'longitude': -48.972999})
+
+
+def write_raw_log(stream, path, sensor_id=133):
+    """
+    Writes a stream with the columns of the raw logs (ISB_NO2.CSV, ...)
+    """
+    date_time = pd.DatetimeIndex(stream['DateTime'])
+    raw_log = pd.DataFrame({'Year': date_time.year, 'Month': date_time.month, 'Day': date_time.day,
+                            'Hour': date_time.hour, 'Minute': date_time.minute, 'Second': date_time.second,
+                            'Latitude': stream['latitude'].to_numpy(), 'Longitude': stream['longitude'].to_numpy(),
+                            'Altitude': 20.0, 'Device': 16, 'DeviceSt': 0.0, ' SensorID': sensor_id,
+                            'Value': stream['measuring'].round(2).to_numpy()})
+    raw_log.to_csv(path, index=False, float_format='%.6f')
+
+
+def time_call(function, *args, **kwargs):
+    """
+    Returns the result of the call and the seconds it took
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def get_daily_cycle(index, peak_hour):
+    """
+    A sine of period one day over a DatetimeIndex, with its maximum at peak_hour + 6
+    """
+    return np.sin(2 * np.pi * (index.hour.to_numpy() - peak_hour) / 24)
+
+
+def make_tagged_dataframe(index, measuring, is_gap, gap_tag, **columns):
+    """
+    Returns a dataframe with the 'measuring' and categorical 'Tag' columns, the gap samples
+    being NaN and tagged as gap_tag, plus the extra columns
+    """
+    codes = np.where(is_gap, TaggingEngine.get_tag_code(gap_tag), TaggingEngine.get_tag_code('VALID'))
+    dataframe = pd.DataFrame({'measuring': np.where(is_gap, np.nan, measuring)}, index=index)
+    for column, values in columns.items():
+        dataframe[column] = values
+    dataframe['Tag'] = TaggingEngine.to_categorical(codes, index=index)
+    return dataframe
+
+
+def make_valid_dataframe(days, seed=0):
+    """
+    Returns the valid 15 mins samples of a sensor, with 20 % of them removed, in the layout of
+    the dataframe passed to the hourly statistics
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2022-01-01', periods=days * 96, freq='15T', name='DateTime')
+    dataframe = pd.DataFrame({'measuring': rng.normal(500, 200, len(index)),
+                              'latitude': -28.456899, 'longitude': -48.972999}, index=index)
+    dataframe['Diff'] = dataframe['measuring'].diff()
+    dataframe['value'] = 0.0409*dataframe['measuring']*46.0055/1e3
+    return dataframe[rng.random(len(index)) > 0.2]
+
+
+def make_raw_series(days, seed=0):
+    """
+    Returns 15 mins measurings with missing samples, -9999.0 error values and spikes
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2022-01-01', periods=days * 96, freq='15T')
+    values = rng.normal(500, 200, len(index))
+    values[rng.random(len(index)) < 0.05] = np.nan
+    values[rng.random(len(index)) < 0.01] = -9999.0
+    spikes = rng.random(len(index)) < 0.01
+    values[spikes] += rng.choice([-1, 1], spikes.sum()) * 5e3
+    return pd.DataFrame({'measuring': values}, index=index)
+
+
+def make_shifted_series(days, shifts, beta, seed=0):
+    """
+    Returns a tagged 15 mins sensor dataframe with level shifts and a linear temperature
+    effect, the temperature and the times of the true change points
+    """
+    rng = np.random.default_rng(seed)
+    samples = days * 96
+    index = pd.date_range('2022-01-01', periods=samples, freq='15T', name='DateTime')
+    temperature = (22 + 6 * get_daily_cycle(index, 14) + np.cumsum(rng.normal(0, 0.05, samples))
+                   + rng.normal(0, 0.5, samples))
+    change_points = np.sort(rng.choice(np.arange(96 * 7, samples - 96 * 7, 96 * 7), shifts, replace=False))
+    levels = np.concatenate([[300.0], 300.0 + rng.choice([-1, 1], shifts) * rng.uniform(40, 120, shifts)])
+    baseline = levels[np.searchsorted(change_points, np.arange(samples), side='right')]
+    measuring = (baseline + 30 * get_daily_cycle(index, 8) + beta * (temperature - temperature.mean())
+                 + rng.normal(0, 10, samples))
+    sensor_dataframe = make_tagged_dataframe(index, measuring, rng.random(samples) < 0.05, 'MISSING')
+    return sensor_dataframe, pd.Series(temperature, index=index), index[change_points]
+
+
+def make_hourly_station(days, sensors, gap_rate, seed=0):
+    """
+    Returns the hourly dataframes of co-located sensors driven by a shared daily cycle and
+    weather signal plus a temperature sensor, with 'measuring', 'value', 'Hour' and 'Tag'
+    columns, the true measuring of every sensor and its hidden hours, tagged as 'LOWSAMPLES'
+    """
+    rng = np.random.default_rng(seed)
+    hours = days * 24
+    index = pd.date_range('2022-01-01 00:30', periods=hours, freq='1H', name='DateTime')
+    daily = get_daily_cycle(index, 8)
+    weather = np.cumsum(rng.normal(0, 0.1, hours))
+    weather = (weather - weather.mean()) / weather.std()
+    temperature = 22 + 6 * get_daily_cycle(index, 14) + 2 * weather + rng.normal(0, 0.5, hours)
+
+    truth = {'chamber_temp': temperature}
+    for sensor in range(sensors):
+        gain, offset = rng.uniform(50, 150), rng.uniform(200, 600)
+        truth['sensor_' + str(sensor)] = (offset + gain * (daily + weather) + 3 * (temperature - 22)
+                                          + rng.normal(0, 10, hours))
+
+    dataframes = {}
+    hidden = {}
+    for name, values in truth.items():
+        # Random hours and gaps of up to a few days
+        is_gap = rng.random(hours) < gap_rate / 2
+        for start in rng.integers(0, hours, int(gap_rate / 2 * hours / 36)):
+            is_gap[start:start + rng.integers(6, 72)] = True
+        dataframes[name] = make_tagged_dataframe(index, values, is_gap, 'LOWSAMPLES',
+                                                 value=np.where(is_gap, np.nan, values * 2), Hour=index.hour)
+        hidden[name] = is_gap
+    return dataframes, truth, hidden
+
+
+def make_sensor_groups(days, group_count, group_size, seed=0):
+    """
+    Returns the hourly dataframes of groups of co-located sensors with different gains, the
+    first sensor of each group drifting away from the others after a random hour, the groups
+    of sensor names and the first drifting hour of each group
+    """
+    rng = np.random.default_rng(seed)
+    hours = days * 24
+    index = pd.date_range('2022-01-01 00:30', periods=hours, freq='1H', name='DateTime')
+    daily = get_daily_cycle(index, 8)
+    dataframes, groups, drift_starts = {}, [], []
+    for group in range(group_count):
+        signal = 1 + 0.5 * daily + 0.3 * np.cumsum(rng.normal(0, 0.05, hours))
+        drift_start = int(rng.integers(hours // 4, 3 * hours // 4))
+        names = []
+        for sensor in range(group_size):
+            values = rng.uniform(20, 200) * (signal + rng.normal(0, 0.05, hours))
+            if sensor == 0:
+                values[drift_start:] *= 1 + np.linspace(0, 3, hours - drift_start)
+            name = 'group_' + str(group) + '_sensor_' + str(sensor)
+            dataframes[name] = make_tagged_dataframe(index, values, rng.random(hours) < 0.05, 'LOWSAMPLES')
+            names.append(name)
+        groups.append(names)
+        drift_starts.append(index[drift_start])
+    return dataframes, groups, drift_starts
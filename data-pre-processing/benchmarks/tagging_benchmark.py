@@ -0,0 +1,75 @@
+"""
+Compares the array based TaggingEngine against the row-wise apply tagging
+previously used by SensorData.tag_and_prepare_data.
+
+Run from the data-pre-processing directory:
+    python benchmarks/tagging_benchmark.py --days 365
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from TaggingEngine import TaggingEngine, TaggingPipeline, LimitRule, DiffRule
+from synthetic_streams import make_raw_series, time_call
+
+
+def get_tags_from_series(value, lower_limit, upper_limit):
+    if (value <= -9000.0  or 
+        np.isnan(value))  : return 'MISSING' 
+    if value < lower_limit: return 'LTLL'
+    if value > upper_limit: return 'GTUL'
+    return 'VALID'
+
+
+def tag_data_with_diff(tagged_df, max_diff_value):
+    current_tag = tagged_df.iloc[0]
+    value = tagged_df.iloc[1]
+    if ((current_tag != 'VALID') or (np.isnan(value))): return current_tag
+    if ((value > max_diff_value) or (value < -max_diff_value)): return 'BADSPIKE'
+    return 'VALID'
+
+
+def row_wise_tagging(dataframe, lower_limit, upper_limit, max_diff_value, molar_mass):
+    df = dataframe.copy()
+    df['Tag'] = df['measuring'].apply(lambda v: get_tags_from_series(value=v,
+                                                                     lower_limit=lower_limit,
+                                                                     upper_limit=upper_limit))
+    df['Diff'] = df['measuring'].diff()
+    df['Tag'] = df[['Tag', 'Diff']].apply(lambda row: tag_data_with_diff(row, max_diff_value), axis=1)
+    df['value'] = df['measuring'].map(lambda v: 0.0409*v*molar_mass/1e3)
+    return df
+
+
+def array_tagging(dataframe, lower_limit, upper_limit, max_diff_value, molar_mass):
+    df = dataframe.copy()
+    diff_series = df['measuring'].diff()
+    pipeline = TaggingPipeline([LimitRule(lower_limit=lower_limit, upper_limit=upper_limit),
+                                DiffRule(max_diff_value=max_diff_value, diff_values=diff_series)])
+    tag_codes = pipeline.run(df['measuring'])
+    df['Tag'] = TaggingEngine.to_categorical(tag_codes, index=df.index)
+    df['Diff'] = diff_series
+    df['value'] = 0.0409*df['measuring']*molar_mass/1e3
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+
+    params = dict(lower_limit=15.0, upper_limit=5e3, max_diff_value=2e3, molar_mass=46.0055)
+    dataframe = make_raw_series(args.days)
+    row_wise, row_wise_time = time_call(row_wise_tagging, dataframe, *params.values())
+    array, array_time = time_call(array_tagging, dataframe, *params.values())
+
+    assert (row_wise['Tag'] == array['Tag'].astype(str)).all(), 'Tags differ'
+    pd.testing.assert_series_equal(row_wise['value'], array['value'])
+    print(array['Tag'].value_counts().to_string())
+    print(f'samples:   {len(dataframe)}')
+    print(f'row-wise:  {row_wise_time:.3f} s')
+    print(f'array:     {array_time:.3f} s')
+    print(f'speed-up:  {row_wise_time / array_time:.1f}x')
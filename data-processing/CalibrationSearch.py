@@ -0,0 +1,247 @@
+import hashlib
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+import numpy as np
+import sklearn
+from sklearn.base import clone
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import KFold, ParameterGrid
+from sklearn.pipeline import Pipeline
+
+class CalibrationSearch:
+    """
+    Grid search of calibration models over feature subsets.
+    The search of every (feature subset, model) pair is split into one job per
+    cross-validation fold, and all the jobs run in a single process pool. Each job
+    result is pickled in a cache directory under a hash of its data, model, parameters
+    and fold, so a re-run only fits what changed. Optionally, pairs whose score after the
+    first folds is far below the best subset of the same model are not searched further.
+
+    The models are given as in the calibration notebooks:
+
+        {'KNN Regression': (('knn_regressor', KNeighborsRegressor()), {'knn_regressor__n_neighbors': [3, 5]})}
+
+    With cv folds and no early stopping the best parameters and the test scores are the
+    same as GridSearchCV(cv=cv, scoring='r2') followed by cross_validate(cv=cv).
+    """
+
+    def __init__(self, models, cache_path='output/calibration-cache/', cv=10, max_workers=None,
+                 early_stop_folds=None, early_stop_margin=0.1) -> None:
+        """
+        Parameters
+        ----------
+        models : dict
+            Model name -> ((step name, estimator), parameter grid)
+        cache_path: String
+            The directory of the cached job results. No cache is used if None.
+        cv: int
+            The number of cross-validation folds
+        max_workers: int
+            The number of worker processes. All the cores are used if None.
+        early_stop_folds: int
+            The number of folds evaluated before weak pairs are dropped. No early stopping if None.
+        early_stop_margin: Double
+            Pairs whose best mean R2 is lower than the best subset of the same model minus this
+            margin are dropped.
+        """
+        self.__models = models
+        self.__cache_path = cache_path
+        self.__cv = cv
+        self.__max_workers = max_workers
+        self.__early_stop_folds = early_stop_folds
+        self.__early_stop_margin = early_stop_margin
+
+    def get_feature_subsets(variables_names, reference_count, exclusive_names=['measuring 1', 'measuring 2']):
+        """
+        Builds the feature subsets of the calibration notebooks
+        Parameters
+        ----------
+        variables_names : list
+            The names of the columns of X
+        reference_count: int
+            Only subsets with at least one of the first reference_count variables are kept
+        exclusive_names: list
+            A subset does not take two variables whose names contain the same one of these names
+
+        Returns
+        -------
+        feature_subsets : dict
+            Subset key ('name | name | ') -> list of column indexes
+        """
+        feature_subsets = {}
+        for size in range(1, len(variables_names) + 1):
+            for index_tuple in combinations(range(len(variables_names)), size):
+                if not any(index < reference_count for index in index_tuple): continue
+                key = ''
+                index_list = []
+                for index in index_tuple:
+                    name = variables_names[index]
+                    if any(exclusive in key and exclusive in name for exclusive in exclusive_names): continue
+                    index_list.append(index)
+                    key = key + name + ' | '
+                feature_subsets[key] = index_list
+        return feature_subsets
+
+    def run(self, feature_subsets, X_train, y_train, X, y):
+        """
+        Searches the best parameters of every model for every feature subset
+        Parameters
+        ----------
+        feature_subsets : dict
+            Subset key -> list of column indexes of X
+        X_train, y_train: array like
+            The data of the grid search
+        X, y: array like
+            The data of the cross validation of the best model of each pair
+
+        Returns
+        -------
+        results : dict
+            results[subset key][model name] holds 'Best Model', 'Best Parameters', 'Test R2',
+            'Test RMSE', 'Test MAE' (negated like in cross_validate) and 'Stopped'. Pairs
+            stopped early have no best model and their scores are None.
+        """
+        X_train, y_train = np.asarray(X_train, dtype=np.float64), np.asarray(y_train, dtype=np.float64)
+        X, y = np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        pairs = [(subset_key, model_name) for subset_key in feature_subsets for model_name in self.__models]
+        search_folds = list(KFold(n_splits=self.__cv).split(X_train))
+        validation_folds = list(KFold(n_splits=self.__cv).split(X))
+
+        with ProcessPoolExecutor(max_workers=self.__max_workers) as executor:
+            # Grid search, optionally stopping weak pairs after the first folds
+            first_folds = self.__cv if self.__early_stop_folds is None else min(self.__early_stop_folds, self.__cv)
+            scores = {pair: {} for pair in pairs}
+            self.__collect__(executor, scores, self.__get_search_jobs__(pairs, range(first_folds), feature_subsets, X_train, y_train, search_folds))
+            stopped = self.__get_stopped_pairs__(scores) if first_folds < self.__cv else set()
+            active_pairs = [pair for pair in pairs if pair not in stopped]
+            self.__collect__(executor, scores, self.__get_search_jobs__(active_pairs, range(first_folds, self.__cv), feature_subsets, X_train, y_train, search_folds))
+
+            best_params = {}
+            for subset_key, model_name in active_pairs:
+                candidates = list(ParameterGrid(self.__models[model_name][1]))
+                # Like GridSearchCV, ties are resolved by the first candidate
+                best_params[(subset_key, model_name)] = candidates[int(np.argmax(np.mean(list(scores[(subset_key, model_name)].values()), axis=0)))]
+
+            # Refit on the training data and cross validation of the best model of each pair
+            jobs = {}
+            for pair in active_pairs:
+                subset = feature_subsets[pair[0]]
+                jobs[pair + ('refit',)] = self.__submit__(executor, 'refit', pair[1], best_params[pair], X_train[:, subset], y_train)
+                for fold, (train, test) in enumerate(validation_folds):
+                    jobs[pair + (fold,)] = self.__submit__(executor, 'validate', pair[1], best_params[pair],
+                                                           X[:, subset], y, train, test)
+            outputs = {key: job.result() for key, job in jobs.items()}
+
+        results = {}
+        for subset_key, model_name in pairs:
+            pair = (subset_key, model_name)
+            if pair in stopped:
+                result = {'Best Model': None, 'Best Parameters': None, 'Test R2': None,
+                          'Test RMSE': None, 'Test MAE': None, 'Stopped': True}
+            else:
+                metrics = [outputs[pair + (fold,)] for fold in range(self.__cv)]
+                result = {'Best Model': outputs[pair + ('refit',)],
+                          'Best Parameters': best_params[pair],
+                          'Test R2': np.array([metric[0] for metric in metrics]),
+                          'Test RMSE': np.array([metric[1] for metric in metrics]),
+                          'Test MAE': np.array([metric[2] for metric in metrics]),
+                          'Stopped': False}
+            results.setdefault(subset_key, {})[model_name] = result
+        return results
+
+    def summarize(results):
+        """
+        Returns the 'Mean' and 'Std' of the test RMSE, R2 and MAE of every pair, as the
+        rmse_by_features, r2_by_features and mae_by_features dicts of the notebooks.
+        Stopped pairs are left out.
+        """
+        summaries = []
+        for metric in ['Test RMSE', 'Test R2', 'Test MAE']:
+            summary = {}
+            for subset_key, model_results in results.items():
+                summary[subset_key] = {model_name: {'Mean': result[metric].mean(), 'Std': result[metric].std()}
+                                       for model_name, result in model_results.items() if not result['Stopped']}
+            summaries.append(summary)
+        return tuple(summaries)
+
+    def __get_search_jobs__(self, pairs, folds, feature_subsets, X_train, y_train, search_folds):
+        for subset_key, model_name in pairs:
+            subset = feature_subsets[subset_key]
+            for fold in folds:
+                train, test = search_folds[fold]
+                yield (subset_key, model_name), fold, ('search', model_name, self.__models[model_name][1],
+                                                        X_train[:, subset], y_train, train, test)
+
+    def __collect__(self, executor, scores, jobs):
+        submitted = [(pair, fold, self.__submit__(executor, *arguments)) for pair, fold, arguments in jobs]
+        for pair, fold, job in submitted:
+            scores[pair][fold] = job.result()
+
+    def __get_stopped_pairs__(self, scores):
+        best_by_pair = {pair: np.max(np.mean(list(pair_scores.values()), axis=0)) for pair, pair_scores in scores.items()}
+        stopped = set()
+        for model_name in self.__models:
+            model_pairs = [pair for pair in best_by_pair if pair[1] == model_name]
+            leader = max(best_by_pair[pair] for pair in model_pairs)
+            stopped.update(pair for pair in model_pairs if best_by_pair[pair] < leader - self.__early_stop_margin)
+        return stopped
+
+    def __submit__(self, executor, kind, model_name, params, X, y, train=None, test=None):
+        step = self.__models[model_name][0]
+        X, y = np.ascontiguousarray(X), np.ascontiguousarray(y)
+        cache_file = None
+        if self.__cache_path is not None:
+            key = CalibrationSearch.__get_cache_key__(kind, step, params, X, y, train, test)
+            cache_file = os.path.join(self.__cache_path, key + '.pkl')
+        return executor.submit(CalibrationSearch.__run_job__, cache_file, kind, step, params, X, y, train, test)
+
+    def __get_cache_key__(kind, step, params, X, y, train, test):
+        estimator_params = {name: value for name, value in step[1].get_params(deep=True).items()
+                            if not hasattr(value, 'get_params')}
+        digest = hashlib.sha256()
+        for part in [kind, sklearn.__version__, step[0], type(step[1]).__name__,
+                     sorted(estimator_params.items(), key=lambda item: item[0]),
+                     sorted(params.items(), key=lambda item: item[0]) if isinstance(params, dict)
+                     else [sorted(candidate.items()) for candidate in ParameterGrid(params)]]:
+            digest.update(repr(part).encode())
+        for array in [X, y, train, test]:
+            if array is not None:
+                digest.update(str(array.shape).encode())
+                digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def __run_job__(cache_file, kind, step, params, X, y, train, test):
+        """
+        Runs one job in a worker. 'search' returns the R2 of every candidate of the grid on one
+        fold, 'validate' the (R2, -RMSE, -MAE) of the given parameters on one fold and 'refit'
+        the pipeline fitted on all the data.
+        """
+        if cache_file is not None and os.path.exists(cache_file):
+            with open(cache_file, 'rb') as file:
+                return pickle.load(file)
+
+        pipeline = Pipeline([step])
+        if kind == 'search':
+            output = np.array([r2_score(y[test], clone(pipeline).set_params(**candidate).fit(X[train], y[train]).predict(X[test]))
+                               for candidate in ParameterGrid(params)])
+        elif kind == 'validate':
+            y_pred = clone(pipeline).set_params(**params).fit(X[train], y[train]).predict(X[test])
+            output = (r2_score(y[test], y_pred),
+                      -np.sqrt(mean_squared_error(y[test], y_pred)),
+                      -mean_absolute_error(y[test], y_pred))
+        elif kind == 'refit':
+            output = clone(pipeline).set_params(**params).fit(X, y)
+        else:
+            raise ValueError('Unknown job ' + kind)
+
+        if cache_file is not None:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            # Written under a temporary name so other workers never read a partial file
+            temporary_file = cache_file + '.' + str(os.getpid()) + '.tmp'
+            with open(temporary_file, 'wb') as file:
+                pickle.dump(output, file)
+            os.replace(temporary_file, cache_file)
+        return output
+
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+class SensorAligner:
+    """
+    Aligns any number of sensor series and the reference data on a shared time grid.
+    Each series is matched to the grid by an as-of search on its sorted timestamps: a grid
+    time takes the nearest sample of the series within the tolerance. Every series is a
+    single np.searchsorted over the grid, so the cost grows linearly with the number of
+    series and with the length of the grid.
+    """
+
+    def __init__(self, freq='1H', tolerance='15min', offset=None) -> None:
+        """
+        Parameters
+        ----------
+        freq : String
+            The period of the grid
+        tolerance: String
+            The maximum distance between a grid time and the sample matched to it
+        offset: String
+            The offset of the grid times from the start of each period, e.g. '30min' for the
+            HH:30 indexes of the hourly statistics. When None it is taken from the first
+            timestamp of the reference, or of the first series without reference.
+        """
+        self.__freq = pd.Timedelta(freq).value
+        self.__tolerance = pd.Timedelta(tolerance).value
+        self.__offset = None if offset is None else pd.Timedelta(offset).value
+
+    def align(self, dataframes, reference=None, how='inner', coalesce=None):
+        """
+        Parameters
+        ----------
+        dataframes : list
+            The sensor Dataframes or Series, with DatetimeIndex. Their column names must be distinct.
+        reference: Pandas Series or Dataframe
+            Optional reference data, with DatetimeIndex
+        how: String
+            'inner' keeps the grid times matched by the reference and by at least one sensor,
+            'outer' keeps the grid times matched by any series
+        coalesce: dict
+            Optional columns to merge, as {new column: [columns by priority]}. The new column
+            takes the first non null value of its columns, which are dropped.
+
+        Returns
+        -------
+        aligned_dataframe : Pandas Dataframe
+            The columns of the sensors, the coalesced columns and the reference columns, indexed
+            by the grid times that were kept
+        """
+        frames = [dataframe.to_frame() if isinstance(dataframe, pd.Series) else dataframe for dataframe in dataframes]
+        reference_frame = reference.to_frame() if isinstance(reference, pd.Series) else reference
+        all_frames = frames + ([reference_frame] if reference_frame is not None else [])
+        columns = [column for frame in all_frames for column in frame.columns]
+        if len(set(columns)) != len(columns):
+            raise ValueError('The aligned series have repeated column names')
+
+        sorted_frames = [SensorAligner.__get_sorted__(frame) for frame in all_frames]
+        timestamps = [frame_timestamps for frame_timestamps, _ in sorted_frames]
+        grid = self.__get_grid__(timestamps, reference_frame is not None)
+        positions = [SensorAligner.match(grid, frame_timestamps, self.__tolerance) for frame_timestamps in timestamps]
+
+        sensor_matched = np.zeros(len(grid), dtype=bool)
+        for frame_positions in positions[:len(frames)]:
+            sensor_matched |= frame_positions >= 0
+        if how == 'outer':
+            keep = sensor_matched | (positions[-1] >= 0 if reference_frame is not None else False)
+        elif how == 'inner':
+            keep = sensor_matched & (positions[-1] >= 0) if reference_frame is not None else sensor_matched
+        else:
+            raise ValueError("how must be 'inner' or 'outer'")
+
+        data = {}
+        for frame, (_, order), frame_positions in zip(all_frames, sorted_frames, positions):
+            kept_positions = frame_positions[keep]
+            is_matched = kept_positions >= 0
+            rows = order[kept_positions[is_matched]]
+            for column in frame.columns:
+                values = frame[column].to_numpy()
+                # Unmatched grid times are NaN, so integer and boolean columns become float
+                aligned = np.full(len(kept_positions), np.nan, dtype=np.float64 if values.dtype.kind in 'iubf' else object)
+                aligned[is_matched] = values[rows]
+                data[column] = aligned
+
+        index = pd.DatetimeIndex(grid[keep], name=all_frames[0].index.name if all_frames else None)
+        if all_frames and all_frames[0].index.tz is not None:
+            index = index.tz_localize('UTC').tz_convert(all_frames[0].index.tz)
+        aligned_dataframe = pd.DataFrame(data, index=index)
+        for column, source_columns in (coalesce or {}).items():
+            first_valid = SensorAligner.coalesce(aligned_dataframe[source_columns].to_numpy(dtype=np.float64))
+            aligned_dataframe = aligned_dataframe.drop(columns=source_columns)
+            aligned_dataframe[column] = first_valid
+        if reference_frame is not None:
+            # The reference columns stay after the sensor and coalesced columns
+            aligned_dataframe = aligned_dataframe[[column for column in aligned_dataframe.columns if column not in reference_frame.columns]
+                                                  + list(reference_frame.columns)]
+        return aligned_dataframe
+
+    def match(grid, timestamps, tolerance):
+        """
+        Returns the position in timestamps of the nearest sample to each grid time, or -1 when
+        the nearest sample is further than tolerance. Both arrays are sorted int64 nanoseconds.
+        On a tie the earlier sample is taken.
+        """
+        if len(timestamps) == 0:
+            return np.full(len(grid), -1, dtype=np.int64)
+        after = np.searchsorted(timestamps, grid, side='left')
+        before = after - 1
+        after_distance = np.where(after < len(timestamps), timestamps[np.minimum(after, len(timestamps) - 1)] - grid, np.iinfo(np.int64).max)
+        before_distance = np.where(before >= 0, grid - timestamps[np.maximum(before, 0)], np.iinfo(np.int64).max)
+        positions = np.where(after_distance < before_distance, after, before)
+        distances = np.minimum(after_distance, before_distance)
+        return np.where(distances <= tolerance, positions, -1)
+
+    def coalesce(values):
+        """
+        Returns the first non NaN value of each row of a 2D array, NaN when the row has none
+        """
+        is_valid = ~np.isnan(values)
+        first = np.argmax(is_valid, axis=1)
+        return np.where(is_valid.any(axis=1), values[np.arange(len(values)), first], np.nan)
+
+    def __get_grid__(self, timestamps, has_reference):
+        present = [frame_timestamps for frame_timestamps in timestamps if len(frame_timestamps)]
+        if not present:
+            return np.empty(0, dtype=np.int64)
+        offset = self.__offset
+        if offset is None:
+            anchor = timestamps[-1] if has_reference and len(timestamps[-1]) else present[0]
+            offset = int(anchor[0] % self.__freq)
+        first = min(frame_timestamps[0] for frame_timestamps in present) - self.__tolerance
+        last = max(frame_timestamps[-1] for frame_timestamps in present) + self.__tolerance
+        first = (first - offset) // self.__freq * self.__freq + offset
+        return np.arange(first, last + 1, self.__freq, dtype=np.int64)
+
+    def __get_sorted__(frame):
+        """
+        Returns the sorted int64 timestamps of a frame and the row order that sorts them
+        """
+        timestamps = frame.index.asi8
+        if frame.index.is_monotonic_increasing:
+            return timestamps, np.arange(len(timestamps))
+        order = np.argsort(timestamps, kind='stable')
+        return timestamps[order], order
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+
+class EarthEngineClient:
+    """
+    Cliente do Google Earth Engine. Todos os pontos são enviados em uma única
+    FeatureCollection e a média diária de cada ponto é calculada no servidor para todo o
+    intervalo de datas, com uma única chamada getInfo por lote de dias.
+    """
+
+    def __init__(self, scale=1, initialize=True) -> None:
+        import ee
+        if initialize: ee.Initialize()
+        self.__ee = ee
+        self.__scale = scale
+
+    def get_daily_means(self, collection_name, band, sites, start_date, days):
+        """
+        Parameters
+        ----------
+        collection_name : String
+            A coleção do GEE, por exemplo 'COPERNICUS/S5P/OFFL/L3_NO2'
+        band: String
+            A banda da coleção, por exemplo 'NO2_column_number_density'
+        sites: list
+            Lista de (id, longitude, latitude) dos pontos
+        start_date: date
+            O primeiro dia
+        days: int
+            O número de dias a partir de start_date
+
+        Returns
+        -------
+        rows : list
+            Lista de [data 'YYYY-MM-dd', id, valor] para os pontos e dias com imagens
+        """
+        ee = self.__ee
+        points = ee.FeatureCollection([ee.Feature(ee.Geometry.Point([longitude, latitude]), {'id': site_id})
+                                       for site_id, longitude, latitude in sites])
+        start = ee.Date.fromYMD(start_date.year, start_date.month, start_date.day)
+        collection = ee.ImageCollection(collection_name).filterDate(start, start.advance(days, 'day')).select(band)
+
+        def reduce_day(offset):
+            day = start.advance(offset, 'day')
+            image = collection.filterDate(day, day.advance(1, 'day')).mean()
+            date = day.format('YYYY-MM-dd')
+            means = image.reduceRegions(collection=points, reducer=ee.Reducer.first().setOutputs(['value']), scale=self.__scale)
+            return means.map(lambda feature: feature.set('date', date))
+
+        # Dias sem imagens não têm a banda e são descartados pelo filtro
+        means = ee.FeatureCollection(ee.List.sequence(0, days - 1).map(reduce_day)).flatten()
+        means = means.filter(ee.Filter.notNull(['value']))
+        return means.reduceColumns(ee.Reducer.toList(3), ['date', 'id', 'value']).get('list').getInfo()
+
+
+class SentinelExtractor:
+    """
+    Extração em lote das médias diárias de um produto Sentinel 5-P nos pontos de estudo.
+    Os dias já obtidos são guardados em cache_path, um arquivo por dia, e só os dias
+    ausentes são pedidos ao cliente. O cliente pode ser trocado, por exemplo por um
+    cliente falso local para testes, desde que tenha o método get_daily_means.
+    """
+
+    def __init__(self, client, cache_path='cache-sentinel/', batch_days=30, settled_days=14) -> None:
+        """
+        batch_days é o número de dias pedidos em cada chamada, para que o resultado fique abaixo
+        do limite de elementos do getInfo. Dias sem dados só são guardados no cache depois de
+        settled_days, pois os produtos recentes ainda podem ser publicados.
+        """
+        self.__client = client
+        self.__cache_path = cache_path
+        self.__batch_days = batch_days
+        self.__settled_days = settled_days
+
+    def extract(self, collection_name, band, sites, start_date, end_date):
+        """
+        Parameters
+        ----------
+        collection_name : String
+            A coleção do GEE
+        band: String
+            A banda da coleção
+        sites: Pandas Dataframe
+            Os pontos, com as colunas 'id', 'Local', 'Longitude' e 'Latitude'
+        start_date, end_date: date
+            O primeiro e o último dia, inclusive
+
+        Returns
+        -------
+        dataframe : Pandas Dataframe
+            Uma linha por dia e ponto com as colunas 'date', 'id', 'Local', 'lon', 'lat' e a banda.
+            Dias sem imagem têm valor NaN.
+        """
+        site_list = [(int(site_id), float(longitude), float(latitude))
+                     for site_id, longitude, latitude in zip(sites['id'], sites['Longitude'], sites['Latitude'])]
+        cache_dir = self.__get_cache_dir__(collection_name, band, site_list)
+        days = pd.date_range(start_date, end_date, freq='D').date
+        values = {day: self.__load_day__(cache_dir, day) for day in days}
+
+        missing_days = [day for day in days if values[day] is None]
+        for batch_start, batch_length in self.__get_batches__(missing_days):
+            rows = self.__client.get_daily_means(collection_name, band, site_list, batch_start, batch_length)
+            batch_values = {batch_start + datetime.timedelta(days=offset): {} for offset in range(batch_length)}
+            for date, site_id, value in rows:
+                batch_values[datetime.date.fromisoformat(date)][int(site_id)] = value
+            for day, day_values in batch_values.items():
+                values[day] = day_values
+                self.__save_day__(cache_dir, day, day_values)
+
+        site_ids = np.array([site[0] for site in site_list])
+        band_values = np.array([[values[day].get(site_id, np.nan) for site_id in site_ids] for day in days],
+                               dtype=np.float64).reshape(len(days), len(site_ids))
+        return pd.DataFrame({'date': np.repeat(days, len(site_ids)),
+                             'id': np.tile(site_ids, len(days)),
+                             'Local': np.tile(sites['Local'].to_numpy(), len(days)),
+                             'lon': np.tile([site[1] for site in site_list], len(days)),
+                             'lat': np.tile([site[2] for site in site_list], len(days)),
+                             band: band_values.ravel()})
+
+    def __get_batches__(self, missing_days):
+        """
+        Agrupa os dias ausentes em intervalos contíguos de até batch_days dias
+        """
+        batches = []
+        for day in missing_days:
+            if batches and day == batches[-1][0] + datetime.timedelta(days=batches[-1][1]) and batches[-1][1] < self.__batch_days:
+                batches[-1][1] += 1
+            else:
+                batches.append([day, 1])
+        return [tuple(batch) for batch in batches]
+
+    def __get_cache_dir__(self, collection_name, band, site_list):
+        # Os pontos fazem parte da chave, então mudar local_ratao.csv não reutiliza dados de outros pontos
+        sites_key = hashlib.sha256(json.dumps(site_list).encode()).hexdigest()[:16]
+        return os.path.join(self.__cache_path, collection_name.replace('/', '_'), band, sites_key)
+
+    def __load_day__(self, cache_dir, day):
+        path = os.path.join(cache_dir, day.isoformat() + '.json')
+        if not os.path.exists(path): return None
+        with open(path) as cache_file:
+            return {int(site_id): value for site_id, value in json.load(cache_file).items()}
+
+    def __save_day__(self, cache_dir, day, day_values):
+        if not day_values and (datetime.date.today() - day).days < self.__settled_days: return
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        with open(os.path.join(cache_dir, day.isoformat() + '.json'), 'w') as cache_file:
+            json.dump(day_values, cache_file)
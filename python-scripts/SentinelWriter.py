@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import hashlib
+import json
+import os
+import pandas as pd
+
+
+class SentinelWriter:
+    """
+    Armazenamento colunar, somente de acréscimo, das séries diárias do Sentinel 5-P.
+    Cada lote extraído é gravado em um arquivo parquet novo, particionado por mês:
+
+        <root_path>/<YYYY-MM>/<extração>_<primeiro dia>_<último dia>.parquet
+
+    com uma linha por dia e ponto ('date', 'id', 'Local', 'lon', 'lat') e uma coluna por
+    poluente. Depois de cada lote o último dia gravado é salvo em checkpoint.json, então
+    uma extração interrompida continua do dia seguinte ao último lote completo.
+    """
+
+    POLLUTANTS = {'NO2': ('COPERNICUS/S5P/OFFL/L3_NO2', 'NO2_column_number_density'),
+                  'SO2': ('COPERNICUS/S5P/OFFL/L3_SO2', 'SO2_column_number_density'),
+                  'CO': ('COPERNICUS/S5P/OFFL/L3_CO', 'CO_column_number_density'),
+                  'O3': ('COPERNICUS/S5P/OFFL/L3_O3', 'O3_column_number_density')}
+    SITE_COLUMNS = ['date', 'id', 'Local', 'lon', 'lat']
+
+    def __init__(self, root_path='DADOS_SENTINEL/', compression='zstd') -> None:
+        self.__root_path = root_path
+        self.__compression = compression
+
+    def write_range(self, extractor, sites, start_date, end_date, pollutants=('NO2', 'SO2', 'CO', 'O3'), chunk_days=30):
+        """
+        Extrai e grava todos os poluentes no mesmo passo, lote a lote, retomando do checkpoint
+        Parameters
+        ----------
+        extractor : SentinelExtractor
+            O extrator das médias diárias
+        sites: Pandas Dataframe
+            Os pontos, com as colunas 'id', 'Local', 'Longitude' e 'Latitude'
+        start_date, end_date: date
+            O primeiro e o último dia, inclusive
+        pollutants: list or tuple
+            Os poluentes de POLLUTANTS
+        chunk_days: int
+            O número de dias de cada lote gravado
+
+        Returns
+        -------
+        first_day : date
+            O primeiro dia extraído, posterior a start_date quando a extração foi retomada do
+            checkpoint e posterior a end_date quando todo o intervalo já estava gravado
+        """
+        run_key = self.__get_run_key__(sites, pollutants)
+        last_day = self.get_checkpoint(run_key)
+        first_day = start_date if last_day is None else max(start_date, last_day + datetime.timedelta(days=1))
+
+        chunk_start = first_day
+        while chunk_start <= end_date:
+            chunk_end = min(chunk_start + datetime.timedelta(days=chunk_days - 1), end_date)
+            chunk = None
+            for pollutant in pollutants:
+                collection_name, band = SentinelWriter.POLLUTANTS[pollutant]
+                values = extractor.extract(collection_name, band, sites, chunk_start, chunk_end)
+                if chunk is None:
+                    chunk = values[SentinelWriter.SITE_COLUMNS].copy()
+                chunk[pollutant] = values[band].to_numpy()
+            self.append(chunk, name=self.__get_run_name__(run_key))
+            self.__save_checkpoint__(run_key, chunk_end)
+            chunk_start = chunk_end + datetime.timedelta(days=1)
+        return first_day
+
+    def append(self, dataframe, name='lote'):
+        """
+        Grava as linhas de um lote, um arquivo novo por mês do lote. Gravar de novo o mesmo
+        intervalo de dias com o mesmo nome substitui o arquivo anterior, sem duplicar linhas.
+        """
+        dataframe = dataframe.assign(date=pd.to_datetime(dataframe['date']))
+        for month, month_dataframe in dataframe.groupby(dataframe['date'].dt.to_period('M')):
+            month_path = os.path.join(self.__root_path, str(month))
+            if not os.path.exists(month_path):
+                os.makedirs(month_path)
+            filename = (name + '_' + month_dataframe['date'].min().strftime('%Y-%m-%d') + '_'
+                        + month_dataframe['date'].max().strftime('%Y-%m-%d') + '.parquet')
+            temporary_path = os.path.join(month_path, filename + '.tmp')
+            month_dataframe.reset_index(drop=True).to_parquet(temporary_path, compression=self.__compression)
+            os.replace(temporary_path, os.path.join(month_path, filename))
+
+    def read(self, start_date=None, end_date=None, pollutants=None):
+        """
+        Lê as séries gravadas
+        Parameters
+        ----------
+        start_date, end_date: date
+            Intervalo opcional. Só os meses que se sobrepõem ao intervalo são lidos.
+        pollutants: list
+            Poluentes opcionais a ler
+
+        Returns
+        -------
+        dataframe : Pandas Dataframe
+            Uma linha por dia e ponto. Quando o mesmo dia foi gravado por extrações com
+            poluentes diferentes, os valores de cada poluente são reunidos na mesma linha.
+        """
+        if not os.path.exists(self.__root_path):
+            return pd.DataFrame(columns=SentinelWriter.SITE_COLUMNS)
+        first_month = pd.Period(start_date, freq='M') if start_date else None
+        last_month = pd.Period(end_date, freq='M') if end_date else None
+        paths = []
+        for month in sorted(os.listdir(self.__root_path)):
+            month_path = os.path.join(self.__root_path, month)
+            if not os.path.isdir(month_path): continue
+            if first_month is not None and pd.Period(month, freq='M') < first_month: continue
+            if last_month is not None and pd.Period(month, freq='M') > last_month: continue
+            paths += [os.path.join(month_path, filename) for filename in sorted(os.listdir(month_path))
+                      if filename.endswith('.parquet')]
+        if not paths:
+            return pd.DataFrame(columns=SentinelWriter.SITE_COLUMNS)
+
+        columns = None if pollutants is None else SentinelWriter.SITE_COLUMNS + list(pollutants)
+        dataframe = pd.concat([pd.read_parquet(path, columns=columns) for path in paths], ignore_index=True)
+        if start_date: dataframe = dataframe[dataframe['date'] >= pd.Timestamp(start_date)]
+        if end_date: dataframe = dataframe[dataframe['date'] <= pd.Timestamp(end_date)]
+        # groupby last keeps the last non null value of each column
+        return dataframe.groupby(['date', 'id'], as_index=False, sort=True).last()
+
+    def get_checkpoint(self, run_key):
+        checkpoints = self.__load_checkpoints__()
+        if run_key not in checkpoints: return None
+        return datetime.date.fromisoformat(checkpoints[run_key])
+
+    def __get_run_key__(self, sites, pollutants):
+        # Extrações com outros pontos ou poluentes têm o seu próprio checkpoint
+        site_ids = ','.join(str(site_id) for site_id in sites['id'])
+        return '|'.join(pollutants) + '|' + site_ids
+
+    def __get_run_name__(self, run_key):
+        return hashlib.sha256(run_key.encode()).hexdigest()[:8]
+
+    def __load_checkpoints__(self):
+        path = os.path.join(self.__root_path, 'checkpoint.json')
+        if not os.path.exists(path): return {}
+        with open(path) as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def __save_checkpoint__(self, run_key, last_day):
+        checkpoints = self.__load_checkpoints__()
+        checkpoints[run_key] = last_day.isoformat()
+        if not os.path.exists(self.__root_path):
+            os.makedirs(self.__root_path)
+        path = os.path.join(self.__root_path, 'checkpoint.json')
+        with open(path + '.tmp', 'w') as checkpoint_file:
+            json.dump(checkpoints, checkpoint_file, indent=2)
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,157 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# The store is shared with the sensor pipelines, so the reference data is saved with the same storage class
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data-pre-processing'))
+from SensorDataStorage import SensorDataStorage
+
+class ReferenceStationData:
+    """
+    Ingest of the hourly exports of the reference air quality stations (Qar_VilaMoema_*.csv).
+    The export is parsed once with explicit dtypes and decimal handling, the gas columns are
+    converted to ppb in one vectorized step from the MOLAR_MASSES table and both frames are
+    published in the SensorDataStorage, where the data-processing notebooks read them.
+    """
+
+    STATION_NAME = 'Vila_Moema'
+    DATASET = 'reference_dataframe'
+    DATASET_PPB = 'reference_dataframe_ppb'
+    DATE_TIME_COLUMN = 'Data e Hora'
+    DATE_TIME_FORMAT = '%d/%m/%Y %H:%M:%S'
+    # Molar volume factor of the conversion ppb = ug/m3 / (0.0409 * molar mass), at 25 °C and 1 atm
+    MOLAR_VOLUME_FACTOR = 0.0409
+    MOLAR_MASSES = {'Óxidos de Nitrogênio': 46.0055,  # As NO2
+                    'Dióxido de Nitrogênio': 46.0055,
+                    'Monóxido de Nitrogênio': 30.006,
+                    'Dióxido de Enxofre': 64.066,
+                    'Ozônio': 48.0,
+                    'Monóxido de Carbono': 28.010}
+    # The units of the columns of the Vila Moema export, for the CSV copy that has no unit line
+    EXPORT_UNITS = {'Monóxido de Carbono': 'ppm', **{column: 'µg/m³' for column in MOLAR_MASSES
+                                                     if column != 'Monóxido de Carbono'}}
+    CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data-processing', 'input',
+                            'ref_air_quality_data_Vila_Moema.csv')
+
+    def load(path):
+        """
+        Parses a station export
+        Parameters
+        ----------
+        path : String
+            The path of the ';' separated export with ',' decimals. The column names are in
+            the first line, followed by metadata lines without date and time; the last one has
+            the units of the columns, e.g. 'Valor [µg/m³]'.
+
+        Returns
+        -------
+        dataframe : Pandas Dataframe
+            One float64 column per pollutant, in the units of the export, with a sorted
+            DatetimeIndex named 'DateTime'.
+        units : dict
+            The unit of each column, e.g. {'Ozônio': 'µg/m³', 'Monóxido de Carbono': 'ppm'}
+        """
+        columns, metadata_lines = ReferenceStationData.__read_header__(path)
+        value_columns = columns[1:]
+        units = dict(zip(value_columns, [field.strip().replace('Valor [', '').rstrip(']')
+                                         for field in metadata_lines[-1][1:]])) if metadata_lines else {}
+
+        dataframe = pd.read_csv(path, sep=';', decimal=',', header=0, skiprows=range(1, len(metadata_lines) + 1),
+                                encoding='utf-8', dtype={column: np.float64 for column in value_columns},
+                                na_values=['', '-'])
+        dataframe.index = pd.DatetimeIndex(pd.to_datetime(dataframe.pop(ReferenceStationData.DATE_TIME_COLUMN),
+                                                          format=ReferenceStationData.DATE_TIME_FORMAT), name='DateTime')
+        return dataframe.sort_index(kind='stable'), units
+
+    def to_ppb(dataframe, units):
+        """
+        Converts the gas columns to ppb. ug/m3 columns are divided by 0.0409 times the molar
+        mass of MOLAR_MASSES and ppm columns are multiplied by 1e3. The particulate columns,
+        without molar mass, are kept in ug/m3.
+        """
+        factors = np.ones(len(dataframe.columns))
+        for position, column in enumerate(dataframe.columns):
+            unit = units.get(column)
+            if unit == 'ppm':
+                factors[position] = 1e3
+            elif unit == 'ppb':
+                factors[position] = 1.0
+            elif column in ReferenceStationData.MOLAR_MASSES:
+                if unit != 'µg/m³':
+                    raise ValueError('Unknown unit ' + str(unit) + ' of ' + column)
+                factors[position] = 1 / (ReferenceStationData.MOLAR_VOLUME_FACTOR * ReferenceStationData.MOLAR_MASSES[column])
+        return pd.DataFrame(dataframe.to_numpy(dtype=np.float64) * factors, index=dataframe.index, columns=dataframe.columns)
+
+    def save(dataframe, ppb_dataframe, storage=None, station_name=STATION_NAME):
+        """
+        Saves the frame in the units of the export (DATASET) and in ppb (DATASET_PPB) to the
+        storage, replacing the data stored for the station
+        """
+        storage = storage or SensorDataStorage(ReferenceStationData.__get_default_store_path__())
+        storage.save(dataframe, ReferenceStationData.DATASET, station_name)
+        storage.save(ppb_dataframe, ReferenceStationData.DATASET_PPB, station_name)
+
+    def publish(path, storage=None, station_name=STATION_NAME):
+        """
+        Parses an export, converts it and saves both frames
+
+        Returns
+        -------
+        dataframe, ppb_dataframe : Pandas Dataframe
+            The saved frames
+        """
+        dataframe, units = ReferenceStationData.load(path)
+        ppb_dataframe = ReferenceStationData.to_ppb(dataframe, units)
+        ReferenceStationData.save(dataframe, ppb_dataframe, storage, station_name)
+        return dataframe, ppb_dataframe
+
+    def read(columns=None, ppb=False, start_date=None, end_date=None, storage=None, station_name=STATION_NAME,
+             csv_path=CSV_PATH):
+        """
+        Reads the published reference data
+        Parameters
+        ----------
+        columns: list or String
+            Optional column or columns to return
+        ppb: Boolean
+            If True the gas columns are in ppb, otherwise in the units of the export
+        start_date, end_date: String
+            Optional dates with the format YYYY-MM-DD
+        csv_path: String
+            The CSV copy of the export read when nothing was published to the storage for the
+            station, e.g. on a fresh checkout before field-data-treatment-Diamante_REF.ipynb is run.
+            Its columns are in the units of EXPORT_UNITS.
+        """
+        storage = storage or SensorDataStorage(ReferenceStationData.__get_default_store_path__())
+        dataset = ReferenceStationData.DATASET_PPB if ppb else ReferenceStationData.DATASET
+        try:
+            dataframe = storage.load(dataset, station_name, start_date, end_date)
+        except FileNotFoundError:
+            if csv_path is None or not os.path.exists(csv_path): raise
+            dataframe = ReferenceStationData.__read_csv__(csv_path, ppb, start_date, end_date)
+        return dataframe if columns is None else dataframe[columns]
+
+    def __read_csv__(path, ppb, start_date, end_date):
+        dataframe = pd.read_csv(path, index_col='DateTime', parse_dates=['DateTime'],
+                                dtype=np.float64).sort_index(kind='stable')
+        if ppb:
+            dataframe = ReferenceStationData.to_ppb(dataframe, ReferenceStationData.EXPORT_UNITS)
+        return dataframe.loc[start_date:end_date]
+
+    def __read_header__(path):
+        """
+        Returns the column names and the split metadata lines that follow them
+        """
+        with open(path, encoding='utf-8') as export_file:
+            columns = export_file.readline().rstrip('\r\n').split(';')
+            metadata_lines = []
+            for line in export_file:
+                fields = line.rstrip('\r\n').split(';')
+                if fields[0].strip(): break
+                metadata_lines.append(fields)
+        return columns, metadata_lines
+
+    def __get_default_store_path__():
+        # The same store as the default of SensorDataStorage, independent of the working directory
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data-store')